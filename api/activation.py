@@ -0,0 +1,69 @@
+import secrets
+
+from django.db import transaction
+
+from . import models
+from . import outbox
+from . import passwords
+from . import user_cache
+
+
+def generate_password():
+    return secrets.token_urlsafe(9)
+
+
+def activate_students(queryset):
+    """
+    Ativa em lote os alunos inativos do queryset com senhas provisórias.
+
+    Os hashes são calculados fora da transação, no pool de processos; dentro
+    dela as linhas são travadas e só as que continuam inativas são gravadas com
+    um único `bulk_update`, junto com os emails de boas-vindas na outbox.
+    """
+    candidates = list(
+        queryset.filter(role=models.CustomUser.ALUNO, is_active=False).only('id', 'uuid', 'email')
+    )
+
+    if not candidates:
+        return {'ativados': [], 'sem_email': []}
+
+    raw_passwords = [generate_password() for _ in candidates]
+    encoded_passwords = passwords.make_passwords(raw_passwords)
+
+    with transaction.atomic():
+        still_inactive = set(
+            models.CustomUser.objects
+            .select_for_update()
+            .filter(pk__in=[user.pk for user in candidates], is_active=False)
+            .values_list('pk', flat=True)
+        )
+
+        activated = []
+        emails = []
+
+        for user, raw_password, encoded_password in zip(candidates, raw_passwords, encoded_passwords):
+            if user.pk not in still_inactive:
+                continue
+
+            user.password = encoded_password
+            user.prev_password = None
+            user.is_active = True
+            user.is_password_changed = False
+            activated.append(user)
+
+            if user.email:
+                emails.append((outbox.ACTIVATION_SUBJECT, user.email, outbox.activation_content(raw_password)))
+
+        models.CustomUser.objects.bulk_update(
+            activated, ['password', 'prev_password', 'is_active', 'is_password_changed'], batch_size=500
+        )
+        outbox.queue_emails(emails, sensivel=True)
+
+        # bulk_update não dispara post_save, então o cache é limpo manualmente
+        activated_ids = [user.pk for user in activated]
+        transaction.on_commit(lambda: user_cache.invalidate_user(*activated_ids))
+
+    return {
+        'ativados': [str(user.uuid) for user in activated],
+        'sem_email': [str(user.uuid) for user in activated if not user.email],
+    }
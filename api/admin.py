@@ -69,3 +69,22 @@ class CustomTurmaAdmin(admin.ModelAdmin):
 @admin.register(models.CustomUserDisciplina)
 class CustomUserDisciplinaModel(admin.ModelAdmin):
     list_display = ('custom_user', 'disciplina', 'falta', 'nota')
+
+
+@admin.register(models.Pendencias)
+class PendenciasAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'status', 'custom_user', 'criado_em', 'atualizado_em')
+    list_filter = ('status',)
+
+
+@admin.register(models.EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('destinatario', 'assunto', 'status', 'tentativas', 'proxima_tentativa_em', 'enviado_em')
+    list_filter = ('status',)
+    exclude = ('conteudo',)
+    readonly_fields = ('conteudo_exibido',)
+
+    @admin.display(description='Conteúdo')
+    def conteudo_exibido(self, obj):
+        # A senha provisória não aparece no admin nem enquanto o email está na fila
+        return '[conteúdo sensível oculto]' if obj.conteudo_sensivel else obj.conteudo
@@ -0,0 +1,75 @@
+"""
+`APIView` com handlers `async def`, executados direto no event loop do ASGI.
+
+O DRF 3.15 só despacha views síncronas, então sob o Daphne cada requisição
+ocupava uma thread do pool enquanto esperava o conector do bot. Aqui o
+`dispatch` é assíncrono: negociação de conteúdo, permissões e throttling do
+DRF não fazem I/O e rodam no próprio loop; a autenticação usa o
+`aauthenticate` da classe quando ele existe (ver `CachedJWTAuthentication`) e
+só cai em `sync_to_async` para classes que não o implementam.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, views
+
+
+class AsyncAPIView(views.APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+
+            # `options` e `http_method_not_allowed` continuam síncronos
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """Equivalente assíncrono de `Request._authenticate`."""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
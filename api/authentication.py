@@ -0,0 +1,126 @@
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import user_cache
+
+
+def get_token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Autenticação JWT que resolve o `CustomUser` pelo `user_cache.get_auth_user`
+    (LRU do processo e Redis) em vez de um `SELECT` a cada requisição.
+
+    Alterações feitas por `save()` invalidam o cache via signal; em outros
+    processos o LRU pode servir a versão anterior por até
+    `AUTH_USER_CACHE['LRU_TIMEOUT']` segundos.
+
+    Nas views assíncronas (`aauthenticate`) um acerto no LRU é resolvido no
+    próprio event loop; só o Redis ou o banco passam por `sync_to_async`.
+    """
+
+    def get_user(self, validated_token):
+        user = user_cache.get_auth_user(get_token_user_id(validated_token))
+
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user = user_cache.get_lru_auth_user(get_token_user_id(validated_token))
+
+        # A verificação de revogação lê `password`, que não fica no cache
+        if user is None or api_settings.CHECK_REVOKE_TOKEN:
+            return await sync_to_async(self.get_user)(validated_token)
+
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+class CurrentUserJWTAuthentication(CachedJWTAuthentication):
+    """
+    Autenticação JWT que resolve o usuário pelo payload em cache do
+    `user_cache`, caindo no `CachedJWTAuthentication` apenas quando o cache
+    está vazio.
+    """
+
+    def get_user(self, validated_token):
+        payload = user_cache.get_current_user_payload(get_token_user_id(validated_token))
+
+        if payload is None:
+            payload = user_cache.set_current_user_payload(super().get_user(validated_token))
+
+        if not payload['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user_cache.CachedCurrentUser(payload)
+
+    async def aget_user(self, validated_token):
+        return await sync_to_async(self.get_user)(validated_token)
+
+
+class JWTQueryStringAuthMiddleware(BaseMiddleware):
+    """
+    Autentica conexões WebSocket pelo access token em `?token=`, já que o
+    navegador não envia o cabeçalho Authorization no handshake. Sem token (ou
+    com token inválido) mantém o `scope['user']` definido pelas camadas
+    anteriores.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+
+        if token:
+            user = await self.get_user(token[0])
+
+            if user is not None:
+                scope = dict(scope, user=user)
+
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        authentication = CachedJWTAuthentication()
+
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed, TokenError):
+            return None
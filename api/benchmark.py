@@ -0,0 +1,244 @@
+"""
+Benchmark dos pontos de entrada REST e WebSocket (comando `benchmark`).
+
+Por padrão as requisições vão direto para a aplicação ASGI no mesmo processo
+(`httpx.ASGITransport` e `WebsocketCommunicator`), sem servidor nem rede, o que
+deixa os números comparáveis entre commits. Com `base_url` as cenas HTTP vão
+para um servidor já em execução (que deve ter `SERVER_TIMING_METRICS=true`
+para que as contagens de banco e Redis apareçam).
+
+Consultas ao banco e comandos Redis por requisição vêm do cabeçalho
+`Server-Timing` (ver `api.metrics`).
+"""
+import asyncio
+import math
+import re
+import statistics
+import time
+
+import httpx
+
+
+HTTP_SCENARIOS = {
+    'token': ('POST', '/api/token/', False),
+    'current_user': ('GET', '/api/user/current/', True),
+    'bot_intent_names': ('GET', '/api/bot/intent/names', True),
+    'bot_response_names': ('GET', '/api/bot/response/names/', True),
+    'bot_stories': ('GET', '/api/bot/stories/', True),
+    'bot_message': ('POST', '/api/bot/message/', True),
+}
+WS_SCENARIOS = ('ws_chat', )
+SCENARIOS = (*HTTP_SCENARIOS, *WS_SCENARIOS)
+
+_SERVER_TIMING_COUNT = re.compile(r'(?P<name>[\w-]+)[^,]*?desc="(?P<count>\d+)')
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+
+    # Nearest-rank: o menor valor com pelo menos `percent`% das amostras até ele
+    values = sorted(values)
+
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def parse_server_timing(header):
+    """Extrai as contagens `db` e `redis` de um cabeçalho `Server-Timing`."""
+    counts = {match['name']: int(match['count']) for match in _SERVER_TIMING_COUNT.finditer(header or '')}
+
+    return counts.get('db'), counts.get('redis')
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def _summary(values):
+    if not values:
+        return None
+
+    return {'mean': round(statistics.fmean(values), 2), 'max': max(values)}
+
+
+class ScenarioResult:
+    def __init__(self, name, concurrency):
+        self.name = name
+        self.concurrency = concurrency
+        self.latencies = []
+        self.status_codes = {}
+        self.errors = 0
+        self.db_queries = []
+        self.redis_commands = []
+        self.elapsed = 0.0
+
+    def add(self, latency, status_code=None, db_queries=None, redis_commands=None):
+        self.latencies.append(latency * 1000)
+
+        if status_code is not None:
+            self.status_codes[str(status_code)] = self.status_codes.get(str(status_code), 0) + 1
+
+            if status_code >= 400:
+                self.errors += 1
+
+        if db_queries is not None:
+            self.db_queries.append(db_queries)
+
+        if redis_commands is not None:
+            self.redis_commands.append(redis_commands)
+
+    def as_dict(self):
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'status_codes': self.status_codes,
+            'concurrency': self.concurrency,
+            'elapsed_s': round(self.elapsed, 3),
+            'throughput_rps': round(len(self.latencies) / self.elapsed, 2) if self.elapsed else None,
+            'latency_ms': {
+                'p50': _round(percentile(self.latencies, 50)),
+                'p95': _round(percentile(self.latencies, 95)),
+                'p99': _round(percentile(self.latencies, 99)),
+                'mean': _round(statistics.fmean(self.latencies)) if self.latencies else None,
+                'max': _round(max(self.latencies, default=None)),
+            },
+            'db_queries_per_request': _summary(self.db_queries),
+            'redis_commands_per_request': _summary(self.redis_commands),
+        }
+
+
+async def _run_workers(result, total, concurrency, make_worker):
+    remaining = iter(range(total))
+    started = time.perf_counter()
+
+    await asyncio.gather(*(make_worker(index, remaining) for index in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+
+    return result
+
+
+async def run_http_scenario(client, name, total, concurrency, access_token, credentials):
+    method, path, authenticated = HTTP_SCENARIOS[name]
+    headers = {'Authorization': f'Bearer {access_token}'} if authenticated else {}
+    body = {
+        'token': credentials,
+        'bot_message': {'sender': 'benchmark', 'message': 'Qual o horário da secretaria?'},
+    }.get(name)
+    result = ScenarioResult(name, concurrency)
+
+    async def worker(index, remaining):
+        for _ in remaining:
+            started = time.perf_counter()
+
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+            except httpx.HTTPError:
+                result.add(time.perf_counter() - started)
+                result.errors += 1
+                continue
+
+            result.add(
+                time.perf_counter() - started,
+                response.status_code,
+                *parse_server_timing(response.headers.get('server-timing')),
+            )
+
+    return await _run_workers(result, total, concurrency, worker)
+
+
+async def run_ws_chat_scenario(application, total, concurrency, access_token):
+    """
+    Cada worker abre uma conexão em uma sala própria e mede o tempo entre o
+    envio de uma mensagem e o recebimento dela de volta pelo grupo da sala.
+    O token é de um admin, que pode entrar em qualquer sala.
+    """
+    from channels.testing import WebsocketCommunicator
+
+    result = ScenarioResult('ws_chat', concurrency)
+
+    async def worker(index, remaining):
+        communicator = WebsocketCommunicator(
+            application, f'/ws/chat/benchmark{index}/?token={access_token}', headers=[(b'origin', b'http://localhost')]
+        )
+        connected, _ = await communicator.connect()
+
+        if not connected:
+            result.errors += 1
+            return
+
+        try:
+            for sequence in remaining:
+                message = f'benchmark {index}-{sequence}'
+                started = time.perf_counter()
+                await communicator.send_json_to({'message': message})
+
+                # Respostas do bot chegam pela mesma conexão e são descartadas
+                while True:
+                    frame = await communicator.receive_json_from(timeout=30)
+
+                    if not frame.get('bot') and frame.get('message') == message:
+                        break
+
+                result.add(time.perf_counter() - started)
+        finally:
+            await communicator.disconnect()
+
+    return await _run_workers(result, total, concurrency, worker)
+
+
+async def _obtain_token(client, credentials):
+    response = await client.post('/api/token/', json=credentials)
+    response.raise_for_status()
+
+    return response.json()['access']
+
+
+async def _close_loop_connections():
+    """Fecha as conexões assíncronas presas ao event loop antes de ele terminar."""
+    from channels.layers import get_channel_layer
+
+    from chat import history
+    from services import bot_connector
+
+    loop = asyncio.get_running_loop()
+    layer = get_channel_layer()
+
+    if hasattr(layer, 'close_pools'):
+        await layer.close_pools()
+
+    if (connection := history._async_connections.pop(loop, None)) is not None:
+        await connection.aclose()
+
+    if (client := bot_connector._async_clients.pop(loop, None)) is not None:
+        await client.aclose()
+
+
+async def run_benchmark(scenarios, total, concurrency, credentials, base_url=None, application=None):
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=60)
+    else:
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url='http://localhost', timeout=60
+        )
+
+    results = {}
+
+    async with client:
+        access_token = await _obtain_token(client, credentials)
+
+        for name in scenarios:
+            if name in WS_SCENARIOS:
+                if base_url:
+                    results[name] = {'skipped': 'cenários WebSocket rodam apenas em processo'}
+                    continue
+
+                result = await run_ws_chat_scenario(application, total, concurrency, access_token)
+            else:
+                result = await run_http_scenario(client, name, total, concurrency, access_token, credentials)
+
+            results[name] = result.as_dict()
+
+    if not base_url:
+        await _close_loop_connections()
+
+    return results
@@ -0,0 +1,337 @@
+"""
+Importação e exportação em lote dos dados de treinamento do bot.
+
+O pacote tem o formato
+
+    {"nlu": [{"intent": ..., "examples": ...}],
+     "responses": {"utter_...": [{"text": ...}]},
+     "stories": [{"story": ..., "steps": [{"intent": ...}, {"action": ...}]}]}
+
+A importação valida cada item (itens inválidos ou repetidos, e intents com
+exemplos iguais aos de outra intent, entram no relatório sem interromper o
+resto) e envia intents, depois respostas, depois
+stories ao conector, com no máximo `BOT_BUNDLE_CONCURRENCY` chamadas
+simultâneas. Itens que já existem no conector são atualizados.
+
+A exportação busca a primeira página de intents e de respostas, lê
+`total_pages` e busca as demais em paralelo, gerando o JSON aos pedaços à
+medida que as páginas chegam, na ordem. Se uma página falhar depois que a
+resposta começou, o JSON é fechado com a chave `erro` e sem `stories`, para
+que o arquivo incompleto não passe por um pacote válido.
+
+`all_intents` usa a mesma busca paralela para montar um único snapshot com
+todas as intents, guardado no namespace `intents` do cache do conector: a
+próxima escrita de intent o descarta.
+"""
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+
+from services.bot_connector import AsyncIntentManipulation, AsyncResponseManipulation, AsyncStoriesManipulation
+from services.connector_cache import aget_or_build
+
+from . import serializers
+from .example_conflicts import DUPLICADO, ExampleIndex
+
+
+logger = logging.getLogger(__name__)
+
+class ConnectorUnavailable(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'Conector do bot respondeu {status_code}')
+        self.status_code = status_code
+
+
+class BundleImportReport:
+    def __init__(self):
+        self.total = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.itens = []
+        # (tipo, nome, dados) aceitos pelo conector, para o índice de busca
+        self.changes = []
+
+    def add(self, tipo, nome, resultado, status_code=None, erros=None):
+        self.total += 1
+
+        match resultado:
+            case 'criado':
+                self.criados += 1
+            case 'atualizado':
+                self.atualizados += 1
+            case _:
+                self.total_erros += 1
+
+        item = {'tipo': tipo, 'nome': nome, 'resultado': resultado}
+
+        if status_code is not None:
+            item['status'] = status_code
+
+        if erros is not None:
+            item['erros'] = erros
+
+        self.itens.append(item)
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'criados': self.criados,
+            'atualizados': self.atualizados,
+            'total_erros': self.total_erros,
+            'itens': self.itens,
+        }
+
+
+def _validate_items(tipo, items, serializer_class, name_field, report):
+    valid = {}
+
+    for item in items:
+        serializer = serializer_class(data=item)
+
+        if not serializer.is_valid():
+            report.add(tipo, item.get(name_field), 'erro', erros=serializer.errors)
+        elif serializer.validated_data[name_field] in valid:
+            report.add(tipo, serializer.validated_data[name_field], 'erro', erros={name_field: ['Repetido no pacote.']})
+        else:
+            valid[serializer.validated_data[name_field]] = serializer.validated_data
+
+    return valid
+
+
+async def _existing_names():
+    intents, responses, stories = AsyncIntentManipulation(), AsyncResponseManipulation(), AsyncStoriesManipulation()
+    intent_names, response_names, all_stories = await asyncio.gather(
+        intents.get_all_intents_names(),
+        responses.get_all_responses_names(),
+        stories.get_all_stories(),
+    )
+
+    for resource in (intents, responses, stories):
+        if resource.last_status_code != 200:
+            raise ConnectorUnavailable(resource.last_status_code)
+
+    return (
+        set(intent_names['data']),
+        set(response_names.json()['data']),
+        {story['story'] for story in all_stories.json()['data']},
+    )
+
+
+async def _send(semaphore, report, tipo, nome, dados, existe, create, update):
+    async with semaphore:
+        res = await (update() if existe else create())
+
+    if res.status_code == (200 if existe else 201):
+        report.add(tipo, nome, 'atualizado' if existe else 'criado', res.status_code)
+        report.changes.append((tipo, nome, dados))
+    else:
+        report.add(tipo, nome, 'erro', res.status_code)
+
+
+async def _duplicated_examples(intents, check_examples):
+    """
+    Exemplos repetidos de cada intent do pacote: contra as intents que o pacote
+    não substitui (via `check_examples`) e entre as intents do próprio pacote.
+    """
+    bundle_index = ExampleIndex()
+
+    for name, data in intents.items():
+        bundle_index.set_intent(name, data['examples'])
+
+    found = {}
+
+    for name, data in intents.items():
+        conflitos = [
+            {**conflito, 'intents': others}
+            for conflito in await check_examples(name, data['examples'])
+            if conflito['tipo'] == DUPLICADO and (others := [other for other in conflito['intents'] if other not in intents])
+        ]
+        conflitos += [conflito for conflito in bundle_index.conflicts(name, data['examples']) if conflito['tipo'] == DUPLICADO]
+
+        if conflitos:
+            found[name] = conflitos
+
+    return found
+
+
+async def import_bundle(bundle, concurrency=None, check_examples=None):
+    """
+    Importa um pacote já validado por `TrainingBundleSerializer` e devolve o
+    relatório. Com `check_examples` (ver `training_index.check_examples`),
+    intents com exemplos repetidos não são enviadas.
+    """
+    report = BundleImportReport()
+    intents = _validate_items('intent', bundle['nlu'], serializers.BundleIntentSerializer, 'intent', report)
+
+    if check_examples is not None:
+        for name, conflitos in (await _duplicated_examples(intents, check_examples)).items():
+            report.add('intent', name, 'erro', 409, erros={'conflitos': conflitos})
+            del intents[name]
+    responses = _validate_items(
+        'response',
+        [{'name': name, 'texts': texts} for name, texts in bundle['responses'].items()],
+        serializers.BundleResponseSerializer,
+        'name',
+        report,
+    )
+    stories = _validate_items('story', bundle['stories'], serializers.StoryContentSerializer, 'story', report)
+
+    intent_names, response_names, story_names = await _existing_names()
+    semaphore = asyncio.Semaphore(concurrency or settings.BOT_BUNDLE_CONCURRENCY)
+    manipulation = AsyncIntentManipulation()
+
+    # Respostas e stories dependem das intents, então cada tipo vai em uma etapa
+    await asyncio.gather(*(
+        _send(
+            semaphore, report, 'intent', name, data['examples'], name in intent_names,
+            lambda data=data: manipulation.create_intent(dict(data)),
+            lambda name=name, data=data: manipulation.edit_intent_examples(name, {'examples': data['examples']}),
+        )
+        for name, data in intents.items()
+    ))
+
+    manipulation = AsyncResponseManipulation()
+    await asyncio.gather(*(
+        _send(
+            semaphore, report, 'response', name, data['texts'], name in response_names,
+            lambda name=name, data=data: manipulation.create_response({name: data['texts']}),
+            lambda name=name, data=data: manipulation.edit_response_examples(name, {'texts': data['texts']}),
+        )
+        for name, data in responses.items()
+    ))
+
+    manipulation = AsyncStoriesManipulation()
+    await asyncio.gather(*(
+        _send(
+            semaphore, report, 'story', name, data['steps'], name in story_names,
+            lambda data=data: manipulation.create_story({'data': dict(data)}),
+            lambda name=name, data=data: manipulation.change_story_steps(name, {'steps': data['steps']}),
+        )
+        for name, data in stories.items()
+    ))
+
+    return report
+
+
+async def intents_page(page):
+    resource = AsyncIntentManipulation()
+    res = await resource.get_all_intents(page)
+
+    if resource.last_status_code != 200:
+        raise ConnectorUnavailable(resource.last_status_code)
+
+    return res['data']
+
+
+async def responses_page(page):
+    resource = AsyncResponseManipulation()
+    res = await resource.get_all_responses(page)
+
+    if resource.last_status_code != 200:
+        raise ConnectorUnavailable(resource.last_status_code)
+
+    return res.json()['data']
+
+
+async def iter_pages(fetch_page, first_page, concurrency):
+    """
+    Entrega `first_page` e depois as páginas 2 a `total_pages`, buscadas em
+    paralelo (no máximo `concurrency` por vez) mas entregues em ordem.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(page):
+        async with semaphore:
+            return await fetch_page(page)
+
+    # As buscas começam antes de a primeira página ser consumida
+    tasks = [asyncio.ensure_future(fetch(page)) for page in range(2, (first_page.get('total_pages') or 1) + 1)]
+
+    try:
+        yield first_page
+
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def merge_nlu(pages):
+    nlu = {}
+
+    for page in pages:
+        for key, items in page['nlu'].items():
+            nlu.setdefault(key, []).extend(items)
+
+    return nlu
+
+
+async def _build_all_intents(concurrency):
+    first_page = await intents_page(1)
+    pages = [page async for page in iter_pages(intents_page, first_page, concurrency)]
+    nlu_serializer = serializers.NLUSerializer(data={'total_pages': 1, 'nlu': merge_nlu(pages)})
+
+    # Validado uma vez ao montar o snapshot, não a cada leitura
+    if not nlu_serializer.is_valid():
+        return None
+
+    return nlu_serializer.data
+
+
+async def all_intents(concurrency=None):
+    """
+    Todas as páginas de intents em um só `{'total_pages': 1, 'nlu': {...}}`,
+    ou `None` se o conector devolveu dados fora do formato esperado.
+    """
+    concurrency = concurrency or settings.BOT_INTENT_PREFETCH_CONCURRENCY
+
+    return await aget_or_build('intents', 'all_intents', lambda: _build_all_intents(concurrency))
+
+
+async def open_export(concurrency=None):
+    """
+    Busca as primeiras páginas (um conector fora do ar vira `ConnectorUnavailable`
+    antes de a resposta começar) e devolve o gerador assíncrono do JSON.
+    """
+    concurrency = concurrency or settings.BOT_BUNDLE_CONCURRENCY
+    stories = AsyncStoriesManipulation()
+    first_intents, first_responses, all_stories = await asyncio.gather(
+        intents_page(1), responses_page(1), stories.get_all_stories()
+    )
+
+    if stories.last_status_code != 200:
+        raise ConnectorUnavailable(stories.last_status_code)
+
+    async def generate():
+        # Depois do 200 uma falha não vira mais 503: a seção aberta é fechada e o JSON termina com `erro`
+        closing = ']'
+
+        try:
+            yield '{"nlu": ['
+            separator = ''
+
+            async for page in iter_pages(intents_page, first_intents, concurrency):
+                for item in page['nlu']['nlu']:
+                    yield separator + json.dumps(item, ensure_ascii=False)
+                    separator = ','
+
+            yield '], "responses": {'
+            closing = '}'
+            separator = ''
+
+            async for page in iter_pages(responses_page, first_responses, concurrency):
+                for name, texts in page['responses'].items():
+                    yield f'{separator}{json.dumps(name, ensure_ascii=False)}: {json.dumps(texts, ensure_ascii=False)}'
+                    separator = ','
+        except ConnectorUnavailable as error:
+            logger.warning('Exportação interrompida: %s', error)
+            yield f'{closing}, "erro": {json.dumps(str(error), ensure_ascii=False)}}}'
+            return
+
+        yield '}, "stories": ' + json.dumps(all_stories.json()['data'], ensure_ascii=False) + '}'
+
+    return generate()
@@ -0,0 +1,29 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from . import pendencias
+from .models import CustomUser
+
+
+class PendenciasConsumer(AsyncWebsocketConsumer):
+    """Feed em tempo real das pendências criadas e alteradas, apenas para admins."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+
+        if user is None or not user.is_authenticated or user.role != CustomUser.ADMIN:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(pendencias.PENDENCIAS_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(pendencias.PENDENCIAS_GROUP, self.channel_name)
+
+    async def pendencia_event(self, event):
+        await self.send(text_data=json.dumps({
+            'action': event['action'],
+            'pendencia': event['pendencia'],
+        }))
@@ -0,0 +1,137 @@
+"""
+Detecção de exemplos repetidos entre intents, antes de enviá-los ao conector.
+
+Cada exemplo é normalizado (`normalize_text`) e indexado de duas formas:
+
+* pelo texto normalizado, para achar repetições exatas;
+* pelos trigramas de caracteres, para achar exemplos quase iguais
+  (similaridade de Jaccard dos trigramas >= `BOT_EXAMPLE_SIMILARITY`).
+
+Para não comparar com todos os exemplos, a busca de semelhantes usa o filtro
+de prefixo: se J(A, B) >= t então A e B têm pelo menos t·|A| trigramas em
+comum, logo qualquer subconjunto de |A| - ⌈t·|A|⌉ + 1 trigramas de A tem algum
+trigrama de B. Só os trigramas mais raros de A são consultados, e só os
+candidatos encontrados têm a similaridade calculada.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+
+from .text import normalize_text
+
+
+DUPLICADO = 'duplicado'
+SEMELHANTE = 'semelhante'
+
+
+def normalize_example(line):
+    return normalize_text(line.strip().removeprefix('- '))
+
+
+def split_examples(examples):
+    """Exemplos normalizados, sem vazios, na ordem do texto no formato `- exemplo`."""
+    return [text for text in (normalize_example(line) for line in examples.splitlines()) if text]
+
+
+def trigrams(text):
+    padded = f' {text} '
+
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class ExampleIndex:
+    def __init__(self):
+        # texto normalizado -> intents que o têm
+        self.owners = defaultdict(set)
+        self.grams = {}
+        self.postings = defaultdict(set)
+        self.by_intent = {}
+
+    def _discard(self, intent, text):
+        self.owners[text].discard(intent)
+
+        if self.owners[text]:
+            return
+
+        del self.owners[text]
+
+        for gram in self.grams.pop(text):
+            self.postings[gram].discard(text)
+
+            if not self.postings[gram]:
+                del self.postings[gram]
+
+    def set_intent(self, intent, examples):
+        for text in self.by_intent.pop(intent, ()):
+            self._discard(intent, text)
+
+        texts = set(split_examples(examples))
+        self.by_intent[intent] = texts
+
+        for text in texts:
+            if text not in self.owners:
+                self.grams[text] = trigrams(text)
+
+                for gram in self.grams[text]:
+                    self.postings[gram].add(text)
+
+            self.owners[text].add(intent)
+
+    def similar(self, text, threshold):
+        """Textos indexados com similaridade >= `threshold`, como `[(texto, similaridade)]`."""
+        grams = trigrams(text)
+        probe = len(grams) - math.ceil(threshold * len(grams)) + 1
+        candidates = set()
+
+        for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))[:probe]:
+            candidates |= self.postings.get(gram, set())
+
+        matches = []
+
+        for candidate in candidates:
+            other = self.grams[candidate]
+            # |A ∩ B| / |A ∪ B| só pode chegar a t se os tamanhos forem próximos
+            if not threshold * len(grams) <= len(other) <= len(grams) / threshold:
+                continue
+
+            common = len(grams & other)
+            score = common / (len(grams) + len(other) - common)
+
+            if score >= threshold:
+                matches.append((candidate, score))
+
+        return matches
+
+    def conflicts(self, intent, examples, threshold=None):
+        """
+        Exemplos de `examples` que já existem em outra intent (`duplicado`) ou
+        que são quase iguais a exemplos de outra intent (`semelhante`).
+        """
+        threshold = threshold or settings.BOT_EXAMPLE_SIMILARITY
+        found = []
+
+        for text in dict.fromkeys(split_examples(examples)):
+            others = self.owners.get(text, set()) - {intent}
+
+            if others:
+                found.append({'exemplo': text, 'tipo': DUPLICADO, 'intents': sorted(others), 'similar': text, 'similaridade': 1.0})
+                continue
+
+            best = {}
+
+            for candidate, score in self.similar(text, threshold):
+                for other in self.owners[candidate] - {intent}:
+                    if score > best.get(other, (None, 0))[1]:
+                        best[other] = (candidate, score)
+
+            for other, (candidate, score) in sorted(best.items()):
+                found.append({
+                    'exemplo': text,
+                    'tipo': SEMELHANTE,
+                    'intents': [other],
+                    'similar': candidate,
+                    'similaridade': round(score, 3),
+                })
+
+        return found
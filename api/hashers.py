@@ -0,0 +1,21 @@
+import base64
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from . import passwords
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Mesmo algoritmo e formato do `PBKDF2PasswordHasher` (`pbkdf2_sha256$...`),
+    mas o PBKDF2 roda no pool de processos de `api.passwords`. O `verify` da
+    classe base chama `encode`, então a verificação também usa o pool.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        hash = passwords.run_pbkdf2(password, salt, iterations, self.digest)
+        hash = base64.b64encode(hash).decode('ascii').strip()
+
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, hash)
@@ -0,0 +1,331 @@
+"""
+Importação em lote de disciplinas, turmas, alunos e notas a partir de CSV/XLSX.
+
+As planilhas são lidas linha a linha (`csv` ou `openpyxl` em modo read_only) e
+processadas em blocos de `chunk_size` linhas: cada bloco valida as linhas,
+resolve as chaves estrangeiras com uma consulta por tabela e grava tudo com
+`bulk_create`. Linhas inválidas entram no relatório sem interromper o resto.
+
+Um arquivo que não dá para ler (CSV fora de UTF-8, XLSX corrompido) gera
+`InvalidImportFile`, com o relatório dos blocos já gravados até ali.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from . import models
+from . import reports
+from . import serializers
+from . import student_context
+
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class InvalidImportFile(Exception):
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+class ImportReport:
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.total = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.ignorados = 0
+        self.erros = []
+        self.total_erros = 0
+
+    def error(self, linha, erros):
+        self.total_erros += 1
+
+        if len(self.erros) < MAX_REPORTED_ERRORS:
+            self.erros.append({'linha': linha, 'erros': erros})
+
+    def as_dict(self):
+        return {
+            'tipo': self.tipo,
+            'total': self.total,
+            'criados': self.criados,
+            'atualizados': self.atualizados,
+            'ignorados': self.ignorados,
+            'total_erros': self.total_erros,
+            'erros': self.erros,
+        }
+
+
+def _normalize_cell(value):
+    if isinstance(value, datetime):
+        return value.date()
+
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+
+    if isinstance(value, str):
+        return value.strip()
+
+    return value
+
+
+def _rows_from_header(header, rows):
+    header = [str(column).strip().lower() if column is not None else '' for column in header]
+
+    # A linha 1 da planilha é o cabeçalho
+    for linha, values in enumerate(rows, start=2):
+        row = {
+            column: _normalize_cell(value)
+            for column, value in zip(header, values)
+            if column and value not in (None, '')
+        }
+
+        if row:
+            yield linha, row
+
+
+def iter_csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(text, dialect=dialect)
+
+    return _rows_from_header(next(reader, []), reader)
+
+
+def iter_xlsx_rows(file):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+
+    return _rows_from_header(next(rows, ()), rows)
+
+
+def iter_rows(file, filename):
+    if filename.lower().endswith('.xlsx'):
+        return iter_xlsx_rows(file)
+
+    return iter_csv_rows(file)
+
+
+def _read_rows(file, filename, report):
+    try:
+        yield from iter_rows(file, filename)
+    except UnicodeDecodeError as error:
+        raise InvalidImportFile('O arquivo CSV precisa estar em UTF-8.', report) from error
+    except csv.Error as error:
+        raise InvalidImportFile(f'Arquivo CSV inválido: {error}.', report) from error
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as error:
+        raise InvalidImportFile('Arquivo XLSX inválido ou corrompido.', report) from error
+
+
+def _validate_chunk(serializer_class, chunk, report):
+    valid = []
+
+    for linha, row in chunk:
+        serializer = serializer_class(data=row)
+
+        if serializer.is_valid():
+            valid.append((linha, serializer.validated_data))
+        else:
+            report.error(linha, serializer.errors)
+
+    return valid
+
+
+def import_disciplinas(valid, report):
+    nomes = {data['nome'] for _, data in valid}
+    existentes = set(models.Disciplina.objects.filter(nome__in=nomes).values_list('nome', flat=True))
+    novas = {}
+
+    for _, data in valid:
+        if data['nome'] in existentes or data['nome'] in novas:
+            report.ignorados += 1
+            continue
+
+        novas[data['nome']] = models.Disciplina(nome=data['nome'])
+
+    models.Disciplina.objects.bulk_create(novas.values())
+    report.criados += len(novas)
+
+
+def import_turmas(valid, report):
+    nomes_disciplinas = {nome for _, data in valid for nome in data['disciplinas']}
+    disciplinas = dict(
+        models.Disciplina.objects.filter(nome__in=nomes_disciplinas).values_list('nome', 'pk')
+    )
+    turmas = []
+
+    for linha, data in valid:
+        faltando = [nome for nome in data['disciplinas'] if nome not in disciplinas]
+
+        if faltando:
+            report.error(linha, {'disciplinas': [f'Disciplina não encontrada: "{nome}".' for nome in faltando]})
+            continue
+
+        turmas.append(data)
+
+    novas = {data['nome']: models.Turma(nome=data['nome'], turno=data['turno']) for data in turmas}
+    models.Turma.objects.bulk_create(novas.values(), ignore_conflicts=True)
+    # ignore_conflicts não diz quais linhas entraram: só as gravadas têm o uuid gerado aqui
+    criadas = models.Turma.objects.filter(uuid__in=[turma.uuid for turma in novas.values()]).count()
+    report.criados += criadas
+    report.ignorados += len(turmas) - criadas
+
+    # ignore_conflicts não devolve os ids, então as turmas são buscadas de novo
+    turma_ids = dict(
+        models.Turma.objects.filter(nome__in=[data['nome'] for data in turmas]).values_list('nome', 'pk')
+    )
+    Through = models.Turma.disciplinas.through
+    Through.objects.bulk_create(
+        [
+            Through(turma_id=turma_ids[data['nome']], disciplina_id=disciplinas[nome])
+            for data in turmas
+            for nome in data['disciplinas']
+        ],
+        ignore_conflicts=True,
+    )
+    student_context.invalidate_turmas(*turma_ids.values())
+
+
+def import_alunos(valid, report):
+    nomes_turmas = {data['turma'] for _, data in valid if data['turma']}
+    turmas = dict(models.Turma.objects.filter(nome__in=nomes_turmas).values_list('nome', 'pk'))
+    usernames = {data['username'] for _, data in valid}
+    existentes = set(
+        models.CustomUser.objects.filter(username__in=usernames).values_list('username', flat=True)
+    )
+    alunos = {}
+
+    for linha, data in valid:
+        if data['turma'] and data['turma'] not in turmas:
+            report.error(linha, {'turma': [f'Turma não encontrada: "{data["turma"]}".']})
+            continue
+
+        if data['username'] in existentes or data['username'] in alunos:
+            report.ignorados += 1
+            continue
+
+        alunos[data['username']] = models.CustomUser(
+            username=data['username'],
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            email=data['email'],
+            cpf=data['cpf'],
+            data_nascimento=data['data_nascimento'],
+            turma_id=turmas.get(data['turma']),
+            role=models.CustomUser.ALUNO,
+            is_active=False,
+            # Senha inutilizável: o aluno recebe uma senha provisória na ativação
+            password=make_password(None),
+        )
+
+    models.CustomUser.objects.bulk_create(alunos.values(), ignore_conflicts=True)
+    # Outro processo pode ter criado o mesmo username no meio tempo
+    criados = models.CustomUser.objects.filter(uuid__in=[aluno.uuid for aluno in alunos.values()]).count()
+    report.criados += criados
+    report.ignorados += len(alunos) - criados
+    reports.invalidate_turma(*{aluno.turma_id for aluno in alunos.values()})
+
+
+def import_notas(valid, report):
+    usuarios = {}
+    uuids = {}
+    turmas = set()
+
+    for username, pk, uuid, turma_id in (
+        models.CustomUser.objects
+        .filter(username__in={data['username'] for _, data in valid})
+        .values_list('username', 'pk', 'uuid', 'turma_id')
+    ):
+        usuarios[username] = pk
+        uuids[pk] = uuid
+        turmas.add(turma_id)
+
+    disciplinas = dict(
+        models.Disciplina.objects
+        .filter(nome__in={data['disciplina'] for _, data in valid})
+        .values_list('nome', 'pk')
+    )
+    existentes = {
+        (nota.custom_user_id, nota.disciplina_id): nota
+        for nota in models.CustomUserDisciplina.objects.filter(
+            custom_user_id__in=usuarios.values(), disciplina_id__in=disciplinas.values()
+        )
+    }
+    novas = {}
+    atualizadas = {}
+
+    for linha, data in valid:
+        erros = {}
+
+        if data['username'] not in usuarios:
+            erros['username'] = [f'Aluno não encontrado: "{data["username"]}".']
+
+        if data['disciplina'] not in disciplinas:
+            erros['disciplina'] = [f'Disciplina não encontrada: "{data["disciplina"]}".']
+
+        if erros:
+            report.error(linha, erros)
+            continue
+
+        key = (usuarios[data['username']], disciplinas[data['disciplina']])
+        nota = existentes.get(key)
+
+        if nota is None:
+            novas[key] = models.CustomUserDisciplina(
+                custom_user_id=key[0], disciplina_id=key[1], falta=data['falta'], nota=data['nota']
+            )
+        else:
+            nota.falta = data['falta']
+            nota.nota = data['nota']
+            atualizadas[key] = nota
+
+    models.CustomUserDisciplina.objects.bulk_create(novas.values())
+    models.CustomUserDisciplina.objects.bulk_update(atualizadas.values(), ['falta', 'nota'])
+    report.criados += len(novas)
+    report.atualizados += len(atualizadas)
+    reports.invalidate_turma(*turmas)
+    student_context.invalidate_students(*{uuids[custom_user_id] for custom_user_id, _ in [*novas, *atualizadas]})
+
+
+IMPORTERS = {
+    'disciplinas': (serializers.DisciplinaImportSerializer, import_disciplinas),
+    'turmas': (serializers.TurmaImportSerializer, import_turmas),
+    'alunos': (serializers.AlunoImportSerializer, import_alunos),
+    'notas': (serializers.NotaImportSerializer, import_notas),
+}
+
+
+def import_file(tipo, file, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    serializer_class, importer = IMPORTERS[tipo]
+    report = ImportReport(tipo)
+    rows = _read_rows(file, filename, report)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+
+        if not chunk:
+            break
+
+        report.total += len(chunk)
+        valid = _validate_chunk(serializer_class, chunk, report)
+
+        if valid:
+            with transaction.atomic():
+                importer(valid, report)
+
+    return report
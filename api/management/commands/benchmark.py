@@ -0,0 +1,108 @@
+import asyncio
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Mede latência (p50/p95/p99), vazão e consultas ao banco/Redis dos endpoints REST e WebSocket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Usuário admin usado para obter o token')
+        parser.add_argument('--password', required=True)
+        parser.add_argument(
+            '--scenarios',
+            default=','.join(benchmark.SCENARIOS),
+            help=f'Cenários separados por vírgula. Disponíveis: {", ".join(benchmark.SCENARIOS)}',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requisições por cenário')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument(
+            '--base-url',
+            help='Servidor em execução para os cenários HTTP. Se omitido, roda a aplicação ASGI em processo.',
+        )
+        parser.add_argument(
+            '--stub',
+            action='store_true',
+            help='Sobe o stub do conector do bot e aponta o conector para ele (apenas em processo).',
+        )
+        parser.add_argument('--stub-latency-ms', type=float, default=0, help='Latência simulada pelo stub')
+        parser.add_argument('--stub-error-rate', type=float, default=0, help='Fração de erros 500 do stub')
+        parser.add_argument('--label', help='Identificação da execução. Padrão: commit atual.')
+        parser.add_argument('--output', help='Arquivo JSON de saída. Padrão: stdout.')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(benchmark.SCENARIOS)
+
+        if unknown:
+            raise CommandError(f'Cenários desconhecidos: {", ".join(sorted(unknown))}')
+
+        if options['stub'] and options['base_url']:
+            raise CommandError('--stub só pode ser usado sem --base-url.')
+
+        application = None
+
+        if not options['base_url']:
+            from conf.asgi import application
+
+        if options['stub']:
+            from services import bot_connector, bot_stub
+
+            stub = bot_stub.start_stub(config=bot_stub.StubConfig(
+                latency_ms=options['stub_latency_ms'],
+                error_rate=options['stub_error_rate'],
+            ))
+            bot_connector.reset_clients(stub.url)
+
+        credentials = {'username': options['username'], 'password': options['password']}
+
+        with override_settings(SERVER_TIMING_METRICS=True):
+            results = asyncio.run(benchmark.run_benchmark(
+                scenarios,
+                options['requests'],
+                options['concurrency'],
+                credentials,
+                base_url=options['base_url'],
+                application=application,
+            ))
+
+        report = {
+            'label': options['label'] or self.current_commit(),
+            'created_at': timezone.now().isoformat(),
+            'mode': 'http' if options['base_url'] else 'asgi',
+            'stub': {
+                'latency_ms': options['stub_latency_ms'],
+                'error_rate': options['stub_error_rate'],
+            } if options['stub'] else None,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'scenarios': results,
+        }
+        output = json.dumps(report, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+
+            for name, result in results.items():
+                latency = result.get('latency_ms', {})
+                self.stdout.write(
+                    f'{name}: p50={latency.get("p50")} p95={latency.get("p95")} p99={latency.get("p99")} ms, '
+                    f'{result.get("throughput_rps")} req/s, {result.get("errors")} erros'
+                )
+        else:
+            self.stdout.write(output)
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
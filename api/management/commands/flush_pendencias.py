@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import pendencias
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco as pendências enfileiradas no Redis pelo bot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Segundos entre cada gravação. Se omitido, grava uma única vez.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = pendencias.flush_queue(options['batch_size'])
+            self.stdout.write(f'{flushed} pendências gravadas')
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
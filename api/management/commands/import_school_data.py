@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import importers
+
+
+class Command(BaseCommand):
+    help = 'Importa disciplinas, turmas, alunos ou notas de uma planilha CSV/XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=importers.IMPORTERS.keys())
+        parser.add_argument('arquivo')
+        parser.add_argument('--chunk-size', type=int, default=importers.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        with open(options['arquivo'], 'rb') as file:
+            try:
+                report = importers.import_file(options['tipo'], file, options['arquivo'], options['chunk_size'])
+            except importers.InvalidImportFile as error:
+                raise CommandError(error)
+
+        self.stdout.write(json.dumps(report.as_dict(), ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from services.bot_stub import BotStubServer, StubConfig
+
+
+class Command(BaseCommand):
+    help = 'Sobe o stub do conector do bot (Rasa) para desenvolvimento, testes e benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=5005)
+        parser.add_argument('--latency-ms', type=float, default=0)
+        parser.add_argument('--latency-jitter-ms', type=float, default=0)
+        parser.add_argument('--error-rate', type=float, default=0, help='Fração das chamadas que falham (0 a 1)')
+        parser.add_argument('--error-status', type=int, default=500)
+        parser.add_argument(
+            '--fallback-rate', type=float, default=0, help='Fração das mensagens respondidas com fallback (0 a 1)'
+        )
+        parser.add_argument('--intents', type=int, default=20, help='Quantidade de intents geradas')
+        parser.add_argument('--examples-per-intent', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        config = StubConfig(
+            latency_ms=options['latency_ms'],
+            latency_jitter_ms=options['latency_jitter_ms'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            fallback_rate=options['fallback_rate'],
+            intents=options['intents'],
+            examples_per_intent=options['examples_per_intent'],
+            page_size=options['page_size'],
+            seed=options['seed'],
+        )
+        server = BotStubServer((options['host'], options['port']), config)
+        self.stdout.write(f'Stub do bot em {server.url} (BOT_CONNECTOR_URL={server.url})')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails pendentes da fila EmailOutbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Segundos de espera quando a fila está vazia. Se omitido, processa a fila uma única vez.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = outbox.deliver_pending(options['batch_size'])
+
+            if sent:
+                self.stdout.write(f'{sent} emails enviados')
+                continue
+
+            depth = outbox.outbox_depth()
+            self.stdout.write(f'{depth["pendentes"]} emails pendentes, {depth["falhas"]} com falha')
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
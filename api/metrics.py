@@ -0,0 +1,80 @@
+"""
+Contadores por requisição de consultas ao banco e comandos Redis.
+
+O `ServerTimingMiddleware` abre um `RequestMetrics` por requisição; as
+consultas são contadas por um `execute_wrapper` instalado em toda conexão ao
+ser aberta (`install_db_counter`), e os comandos Redis pelo `CountingRedis`, configurado como `REDIS_CLIENT_CLASS` dos caches do
+django_redis. Os totais saem no cabeçalho `Server-Timing` quando
+`SERVER_TIMING_METRICS` está ativo, o que o comando `benchmark` usa.
+"""
+import contextvars
+import time
+
+import redis
+from redis.client import Pipeline
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self.redis_commands = 0
+
+
+_request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start_request_metrics():
+    metrics = RequestMetrics()
+    _request_metrics.set(metrics)
+
+    return metrics
+
+
+def count_db_query(execute, sql, params, many, context):
+    metrics = _request_metrics.get()
+
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_ms += (time.perf_counter() - started) * 1000
+
+
+def install_db_counter(connection):
+    """
+    Sob ASGI as views síncronas rodam numa thread do `sync_to_async`, com outra
+    conexão: por isso o wrapper fica em todas, e as métricas da requisição
+    chegam a ele pelo contextvar, que o asgiref copia para a thread.
+    """
+    if count_db_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_db_query)
+
+
+def count_redis_commands(count):
+    metrics = _request_metrics.get()
+
+    if metrics is not None:
+        metrics.redis_commands += count
+
+
+class CountingPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        count_redis_commands(len(self.command_stack))
+
+        return super().execute(raise_on_error)
+
+
+class CountingRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        count_redis_commands(1)
+
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,84 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
+from . import passwords
+
+
+class ServerTimingMiddleware:
+    """
+    Adiciona o cabeçalho `Server-Timing` com o tempo gasto em hash de senha na
+    requisição (espera na fila do pool e total), quando houve algum.
+
+    Com `SERVER_TIMING_METRICS` ativo inclui também o número de consultas ao
+    banco (`db`) e de comandos Redis (`redis`) da requisição.
+
+    Suporta os modos síncrono e assíncrono: sob ASGI não força uma thread
+    para a cadeia inteira, o que anularia as views assíncronas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        hashing = passwords.start_request_metrics()
+
+        if not settings.SERVER_TIMING_METRICS:
+            return self.add_header(self.get_response(request), hashing)
+
+        request_metrics = metrics.start_request_metrics()
+
+        return self.add_header(self.get_response(request), hashing, request_metrics)
+
+    async def __acall__(self, request):
+        hashing = passwords.start_request_metrics()
+
+        if not settings.SERVER_TIMING_METRICS:
+            return self.add_header(await self.get_response(request), hashing)
+
+        request_metrics = metrics.start_request_metrics()
+
+        return self.add_header(await self.get_response(request), hashing, request_metrics)
+
+    def add_header(self, response, hashing, request_metrics=None):
+        timings = []
+
+        if request_metrics is not None:
+            timings += [
+                f'db;dur={request_metrics.db_ms:.1f};desc="{request_metrics.db_queries} queries"',
+                f'redis;desc="{request_metrics.redis_commands} commands"',
+            ]
+
+        if hashing.count:
+            timings += [
+                f'pwhash;dur={hashing.total_ms:.1f};desc="{hashing.count} ops"',
+                f'pwhash-wait;dur={hashing.wait_ms:.1f}',
+            ]
+
+        if timings:
+            response['Server-Timing'] = ', '.join(timings)
+
+        return response
+
+
+class PasswordHashingBusyMiddleware(MiddlewareMixin):
+    """
+    Responde 503 quando o pool de hash recusa trabalho numa view que não é do
+    DRF (login do admin, por exemplo). As views do DRF já tratam a exceção.
+    """
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, passwords.PasswordHashingBusy):
+            return HttpResponse(exception.detail, status=exception.status_code, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:01
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_customuser_turma'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='turma',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.turma'),
+        ),
+        migrations.AlterField(
+            model_name='turma',
+            name='calendario',
+            field=models.FileField(blank=True, null=True, upload_to=''),
+        ),
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('assunto', models.CharField(max_length=255)),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('conteudo', models.TextField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pendente'), (2, 'Enviado'), (3, 'Falhou')], default=1)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('proxima_tentativa_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_erro', models.TextField(blank=True, default='')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'proxima_tentativa_em'], name='api_emailoutbox_fila_idx')],
+            },
+        ),
+    ]
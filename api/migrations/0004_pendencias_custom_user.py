@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendencias',
+            name='custom_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
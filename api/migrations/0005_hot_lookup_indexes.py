@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_pendencias_custom_user'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'id'], name='api_customuser_role_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuserdisciplina',
+            index=models.Index(fields=['custom_user', 'disciplina'], name='api_cud_user_disciplina_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendencias',
+            index=models.Index(fields=['status', '-criado_em'], name='api_pendencias_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendencias',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['custom_user', '-criado_em'], name='api_pendencias_abertas_idx'),
+        ),
+    ]
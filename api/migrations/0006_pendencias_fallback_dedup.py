@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendencias',
+            name='hash_pergunta',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendencias',
+            name='ocorrencias',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='pendencias',
+            index=models.Index(fields=['status', '-ocorrencias'], name='api_pendencias_ocorrencias_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pendencias',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 1)), fields=('hash_pergunta',), name='api_pendencias_pergunta_aberta_uniq'),
+        ),
+    ]
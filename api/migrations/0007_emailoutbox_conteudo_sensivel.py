@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+# Cópias de api.outbox.ACTIVATION_SUBJECT e CONTEUDO_REMOVIDO na data da migração
+ACTIVATION_SUBJECT = 'I.V.O Chat - Nova Senha'
+CONTEUDO_REMOVIDO = '[conteúdo removido após o envio]'
+STATUS_PENDENTE = 1
+
+
+def redact_activation_emails(apps, schema_editor):
+    EmailOutbox = apps.get_model('api', 'EmailOutbox')
+    activation_emails = EmailOutbox.objects.filter(assunto=ACTIVATION_SUBJECT)
+
+    activation_emails.update(conteudo_sensivel=True)
+    activation_emails.exclude(status=STATUS_PENDENTE).update(conteudo=CONTEUDO_REMOVIDO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_pendencias_fallback_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='conteudo_sensivel',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(redact_activation_emails, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ from typing import Iterable
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 # Create your models here.
 
@@ -58,6 +59,12 @@ class CustomUser(AbstractUser):
 
     turma = models.ForeignKey(Turma, on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Listagem de alunos: WHERE role = 2 ORDER BY id (paginação por cursor)
+            models.Index(fields=['role', 'id'], name='api_customuser_role_id_idx'),
+        ]
+
     def set_password(self, raw_password: str | None) -> None:
         self.prev_password = raw_password
         self.is_password_changed = False
@@ -83,6 +90,12 @@ class CustomUserDisciplina(models.Model):
     falta = models.IntegerField()
     nota = models.DecimalField(decimal_places=2, max_digits=5)
 
+    class Meta:
+        indexes = [
+            # Nota de um aluno em uma disciplina (importação, relatórios, contexto do bot)
+            models.Index(fields=['custom_user', 'disciplina'], name='api_cud_user_disciplina_idx'),
+        ]
+
 
 class Pendencias(models.Model):
     STATUS_AGUARDANDO = 1
@@ -99,3 +112,62 @@ class Pendencias(models.Model):
     status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, blank=False, null=False, default=STATUS_AGUARDANDO)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+
+    custom_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
+
+    # Pendências abertas automaticamente pelo fallback do bot: hash do texto
+    # normalizado da pergunta e quantas vezes ela se repetiu
+    hash_pergunta = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    ocorrencias = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hash_pergunta'],
+                condition=models.Q(status=1),
+                name='api_pendencias_pergunta_aberta_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-criado_em'], name='api_pendencias_status_idx'),
+            models.Index(fields=['status', '-ocorrencias'], name='api_pendencias_ocorrencias_idx'),
+            # Só as pendências em aberto, que são as consultadas com frequência
+            models.Index(
+                fields=['custom_user', '-criado_em'],
+                condition=models.Q(status=1),
+                name='api_pendencias_abertas_idx',
+            ),
+        ]
+
+
+class EmailOutbox(models.Model):
+    STATUS_PENDENTE = 1
+    STATUS_ENVIADO = 2
+    STATUS_FALHOU = 3
+
+    STATUS_CHOICES = (
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_ENVIADO, 'Enviado'),
+        (STATUS_FALHOU, 'Falhou'),
+    )
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    assunto = models.CharField(max_length=255)
+    destinatario = models.EmailField()
+    conteudo = models.TextField()
+    # Conteúdo com segredo (ex.: senha provisória), apagado assim que sai da fila
+    conteudo_sensivel = models.BooleanField(default=False)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    proxima_tentativa_em = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa_em'], name='api_emailoutbox_fila_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.destinatario} - {self.assunto}'
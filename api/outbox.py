@@ -0,0 +1,161 @@
+"""
+Fila de emails (outbox) gravada no banco.
+
+As views apenas inserem linhas em `EmailOutbox` na mesma transação da alteração
+que gerou o email; o comando `send_queued_emails` entrega os pendentes em lotes
+usando uma única sessão SMTP, com novas tentativas em backoff exponencial.
+
+Emails com `conteudo_sensivel` (a senha provisória da ativação) têm o
+conteúdo trocado por `CONTEUDO_REMOVIDO` assim que são enviados ou desistidos,
+e o admin nunca o exibe.
+"""
+import logging
+import random
+import smtplib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from utils import email_utils
+from .models import EmailOutbox
+
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+# Prazo de um lote reservado por um worker; se ele morrer no meio do envio, os
+# emails voltam para a fila depois disso
+CLAIM_SECONDS = 10 * 60
+
+CONTEUDO_REMOVIDO = '[conteúdo removido após o envio]'
+
+
+ACTIVATION_SUBJECT = 'I.V.O Chat - Nova Senha'
+
+
+def activation_content(password):
+    return f'''
+                Seja bem vindo ao I.V.O Chat! <br>
+                Segue sua senha provisória: <br> <br>
+
+                    {password}<br><br>
+                
+               <strong>OBS:</strong> Terá que trocar a senha após o primeiro login.<br>
+                '''
+
+
+def queue_email(subject, msg_to, content, sensivel=False):
+    return EmailOutbox.objects.create(
+        assunto=subject, destinatario=msg_to, conteudo=content, conteudo_sensivel=sensivel
+    )
+
+
+def queue_emails(emails, sensivel=False):
+    """Enfileira vários emails `(assunto, destinatario, conteudo)` em um único INSERT."""
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(assunto=subject, destinatario=msg_to, conteudo=content, conteudo_sensivel=sensivel)
+        for subject, msg_to, content in emails
+    ])
+
+
+def next_attempt(tentativas):
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (tentativas - 1), BACKOFF_MAX_SECONDS)
+
+    return timezone.now() + timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def outbox_depth():
+    counts = dict(EmailOutbox.objects.values_list('status').annotate(total=Count('id')).order_by())
+
+    return {
+        'pendentes': counts.get(EmailOutbox.STATUS_PENDENTE, 0),
+        'enviados': counts.get(EmailOutbox.STATUS_ENVIADO, 0),
+        'falhas': counts.get(EmailOutbox.STATUS_FALHOU, 0),
+        'atrasados': EmailOutbox.objects.filter(
+            status=EmailOutbox.STATUS_PENDENTE, proxima_tentativa_em__lte=timezone.now()
+        ).count(),
+    }
+
+
+def _fail(email, error):
+    email.tentativas += 1
+    email.ultimo_erro = str(error)
+
+    if email.tentativas >= MAX_TENTATIVAS:
+        email.status = EmailOutbox.STATUS_FALHOU
+    else:
+        email.proxima_tentativa_em = next_attempt(email.tentativas)
+
+
+def _claim(batch_size):
+    """Reserva um lote de emails vencidos empurrando a próxima tentativa para depois do prazo."""
+    now = timezone.now()
+
+    with transaction.atomic():
+        emails = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDENTE, proxima_tentativa_em__lte=now)
+            .order_by('proxima_tentativa_em')[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[email.pk for email in emails]).update(
+            proxima_tentativa_em=now + timedelta(seconds=CLAIM_SECONDS)
+        )
+
+    return emails
+
+
+def deliver_pending(batch_size=100, session_class=email_utils.SMTPSession):
+    """
+    Entrega um lote de emails vencidos e devolve quantos foram enviados.
+
+    O lote é reservado em uma transação curta (`_claim`) e enviado fora dela,
+    sem travar linhas durante o SMTP; vários workers podem rodar em paralelo
+    sem pegar os mesmos emails.
+    """
+    emails = _claim(batch_size)
+
+    if not emails:
+        return 0
+
+    sent = 0
+    session = session_class()
+
+    try:
+        for email in emails:
+            try:
+                if session.smtp is None:
+                    session.open()
+
+                session.send(email.assunto, email.destinatario, email.conteudo)
+            except (smtplib.SMTPException, OSError) as error:
+                logger.warning('Falha ao enviar email %s: %s', email.uuid, error)
+                _fail(email, error)
+
+                # Conexão perdida: a próxima iteração abre uma nova sessão
+                if isinstance(error, (smtplib.SMTPServerDisconnected, OSError)):
+                    session.close()
+            except Exception as error:
+                # Erro do próprio email (ex.: codificação): conta a tentativa e segue o lote
+                logger.exception('Erro inesperado ao enviar email %s', email.uuid)
+                _fail(email, error)
+            else:
+                email.status = EmailOutbox.STATUS_ENVIADO
+                email.enviado_em = timezone.now()
+                sent += 1
+
+            if email.conteudo_sensivel and email.status != EmailOutbox.STATUS_PENDENTE:
+                email.conteudo = CONTEUDO_REMOVIDO
+    finally:
+        session.close()
+
+        EmailOutbox.objects.bulk_update(
+            emails,
+            ['status', 'tentativas', 'proxima_tentativa_em', 'ultimo_erro', 'enviado_em', 'conteudo'],
+        )
+
+    return sent
@@ -0,0 +1,183 @@
+"""
+Hash de senhas em paralelo, fora do processo que atende a requisição.
+
+O PBKDF2 do Django é puramente CPU. Tanto o `PooledPBKDF2PasswordHasher`
+(login, troca de senha) quanto a ativação em lote mandam esse cálculo para um
+`ProcessPoolExecutor` limitado. Quando a fila passa de
+`PASSWORD_HASHING_MAX_PENDING`, as novas chamadas esperam até
+`PASSWORD_HASHING_QUEUE_TIMEOUT` segundos e então falham com 503 em vez de
+acumular trabalho sem limite. A ativação em lote passa pelas mesmas vagas, um
+item por vez, para não segurar os logins atrás do lote inteiro.
+
+Um hash que não fica pronto em `PASSWORD_HASHING_RESULT_TIMEOUT` segundos
+também vira 503. Fora das views do DRF (admin, por exemplo) o
+`PasswordHashingBusyMiddleware` faz a mesma conversão.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils.crypto import pbkdf2
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Servidor ocupado processando senhas, tente novamente em instantes.'
+    default_code = 'password_hashing_busy'
+
+
+class RequestHashingMetrics:
+    def __init__(self):
+        self.count = 0
+        self.wait_ms = 0.0
+        self.total_ms = 0.0
+
+
+_request_metrics = contextvars.ContextVar('password_hashing_metrics', default=None)
+
+# Verdadeiro dentro dos processos do pool, que calculam os hashes diretamente
+_in_worker = False
+
+
+def start_request_metrics():
+    metrics = RequestHashingMetrics()
+    _request_metrics.set(metrics)
+
+    return metrics
+
+
+def _setup_worker():
+    global _in_worker
+    import django
+
+    _in_worker = True
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
+    django.setup()
+
+
+class PasswordHashingPool:
+    def __init__(self, max_workers, max_pending, queue_timeout, result_timeout):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_setup_worker)
+        self.max_workers = max_workers
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.queue_timeout = queue_timeout
+        self.result_timeout = result_timeout
+        self.stats_lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def _acquire(self):
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            with self.stats_lock:
+                self.rejected += 1
+
+            raise PasswordHashingBusy()
+
+        with self.stats_lock:
+            self.in_flight += 1
+
+    def _release(self, future):
+        # Só quando o trabalho termina: quem desistiu de esperar não libera a vaga
+        self.slots.release()
+
+        with self.stats_lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def _submit(self, fn, *args):
+        self._acquire()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.result_timeout)
+        except TimeoutError:
+            raise PasswordHashingBusy()
+
+    def submit(self, fn, *args):
+        started = time.perf_counter()
+        future = self._submit(fn, *args)
+        waited = time.perf_counter() - started
+
+        try:
+            return self._result(future)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics = _request_metrics.get()
+
+            if metrics is not None:
+                metrics.count += 1
+                metrics.wait_ms += waited * 1000
+                metrics.total_ms += elapsed * 1000
+
+    def map(self, fn, iterable):
+        """
+        `fn` para cada item, na ordem. Cada item ocupa uma vaga como no `submit`
+        e no máximo `max_workers` itens do lote ficam no executor ao mesmo tempo,
+        então os logins entram na fila entre eles em vez de esperar o lote todo.
+        """
+        batch = threading.BoundedSemaphore(self.max_workers)
+        futures = []
+
+        for item in iterable:
+            batch.acquire()
+
+            try:
+                future = self._submit(fn, item)
+            except PasswordHashingBusy:
+                batch.release()
+                raise
+
+            future.add_done_callback(lambda future: batch.release())
+            futures.append(future)
+
+        return [self._result(future) for future in futures]
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'in_flight': self.in_flight,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHashingPool(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    settings.PASSWORD_HASHING_MAX_PENDING,
+                    settings.PASSWORD_HASHING_QUEUE_TIMEOUT,
+                    settings.PASSWORD_HASHING_RESULT_TIMEOUT,
+                )
+
+    return _pool
+
+
+def run_pbkdf2(password, salt, iterations, digest):
+    if _in_worker:
+        return pbkdf2(password, salt, iterations, digest=digest)
+
+    return get_pool().submit(pbkdf2, password, salt, iterations, 0, digest)
+
+
+def make_passwords(raw_passwords):
+    return get_pool().map(make_password, raw_passwords)
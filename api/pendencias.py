@@ -0,0 +1,275 @@
+"""
+Pendências: perguntas que o bot não soube responder, tratadas pelos admins.
+
+Além do CRUD síncrono, o bot pode abrir pendências sem esperar o banco com
+`enqueue`, que só faz um RPUSH no Redis; o comando `flush_pendencias` grava a
+fila em lotes com `bulk_create`. Toda pendência criada ou alterada é enviada ao
+grupo `PENDENCIAS_GROUP` do channel layer, que alimenta o feed dos admins.
+
+Respostas de fallback do bot (`capture_fallback`) entram na mesma fila com o
+hash do texto normalizado da pergunta: perguntas repetidas enquanto a
+pendência estiver aberta só incrementam `ocorrencias`.
+"""
+import hashlib
+import json
+import logging
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from . import models
+from . import student_context
+from .text import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+PENDENCIAS_GROUP = 'pendencias'
+QUEUE_KEY = 'pendencias:queue'
+
+
+def as_event(pendencia, custom_user_uuid=None):
+    if custom_user_uuid is None and pendencia.custom_user_id is not None:
+        custom_user_uuid = pendencia.custom_user.uuid
+
+    return {
+        'uuid': str(pendencia.uuid),
+        'nome': pendencia.nome,
+        'descricao': pendencia.descricao,
+        'status': pendencia.status,
+        'ocorrencias': pendencia.ocorrencias,
+        'custom_user': str(custom_user_uuid) if custom_user_uuid else None,
+        'criado_em': timezone.localtime(pendencia.criado_em).isoformat(),
+        'atualizado_em': timezone.localtime(pendencia.atualizado_em).isoformat(),
+    }
+
+
+def notify(events, action):
+    send = async_to_sync(get_channel_layer().group_send)
+
+    for event in events:
+        send(PENDENCIAS_GROUP, {'type': 'pendencia_event', 'action': action, 'pendencia': event})
+
+
+def question_hash(text):
+    return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+
+def _fallback_texts():
+    return {normalize_text(text) for text in settings.BOT_FALLBACK_RESPONSES}
+
+
+def is_fallback(replies):
+    """
+    Indica se a resposta do webhook REST do Rasa é um fallback: nenhuma
+    mensagem, um payload `custom` com `fallback` ou `confidence` abaixo de
+    `BOT_FALLBACK_CONFIDENCE`, ou um texto listado em `BOT_FALLBACK_RESPONSES`.
+    """
+    if not isinstance(replies, list):
+        return False
+
+    if not replies:
+        return True
+
+    fallback_texts = _fallback_texts()
+
+    for reply in replies:
+        # Itens fora do formato do webhook não dizem nada sobre fallback
+        if not isinstance(reply, dict):
+            continue
+
+        custom = reply.get('custom')
+
+        if not isinstance(custom, dict):
+            custom = {}
+
+        if custom.get('fallback'):
+            return True
+
+        confidence = custom.get('confidence')
+
+        if isinstance(confidence, (int, float)) and confidence < settings.BOT_FALLBACK_CONFIDENCE:
+            return True
+
+        if isinstance(reply.get('text'), str) and normalize_text(reply['text']) in fallback_texts:
+            return True
+
+    return False
+
+
+def capture_fallback(sender, message, replies):
+    """Enfileira a pergunta como pendência se o bot não soube respondê-la."""
+    if not isinstance(message, str) or not normalize_text(message) or not is_fallback(replies):
+        return None
+
+    try:
+        custom_user_uuid = uuid.UUID(str(sender))
+    except ValueError:
+        custom_user_uuid = None
+
+    # A resposta do bot já foi obtida: uma falha aqui não pode chegar ao aluno
+    try:
+        return enqueue(message[:255], message, custom_user_uuid, hash_pergunta=question_hash(message))
+    except RedisError:
+        logger.exception('Falha ao enfileirar pendência de fallback de %s', sender)
+        return None
+
+
+def enqueue(nome, descricao, custom_user_uuid=None, hash_pergunta=None):
+    """Enfileira uma pendência para gravação em lote e devolve o seu uuid."""
+    payload = {
+        'uuid': str(uuid.uuid4()),
+        'nome': nome,
+        'descricao': descricao,
+        'custom_user': str(custom_user_uuid) if custom_user_uuid else None,
+        'hash_pergunta': hash_pergunta,
+    }
+    get_redis_connection('default').rpush(QUEUE_KEY, json.dumps(payload))
+
+    return payload['uuid']
+
+
+def queue_length():
+    return get_redis_connection('default').llen(QUEUE_KEY)
+
+
+def _pop_queue(connection, batch_size):
+    with connection.pipeline(transaction=True) as pipe:
+        pipe.lrange(QUEUE_KEY, 0, batch_size - 1)
+        pipe.ltrim(QUEUE_KEY, batch_size, -1)
+        payloads, _ = pipe.execute()
+
+    return [json.loads(payload) for payload in payloads]
+
+
+def _merge_repeated(items):
+    """
+    Junta as perguntas repetidas do lote e soma as ocorrências nas pendências
+    abertas com o mesmo hash. Devolve os itens que ainda precisam ser criados.
+    """
+    counts = {}
+    novos = []
+
+    for item in items:
+        hash_pergunta = item.get('hash_pergunta')
+
+        if hash_pergunta is None:
+            novos.append(item)
+        elif hash_pergunta in counts:
+            counts[hash_pergunta] += 1
+        else:
+            counts[hash_pergunta] = 1
+            novos.append(item)
+
+    if not counts:
+        return novos, {}, []
+
+    abertas = list(
+        models.Pendencias.objects
+        .select_related('custom_user')
+        .select_for_update(of=('self',))
+        .filter(hash_pergunta__in=counts, status=models.Pendencias.STATUS_AGUARDANDO)
+    )
+
+    for pendencia in abertas:
+        pendencia.ocorrencias += counts[pendencia.hash_pergunta]
+        pendencia.atualizado_em = timezone.now()
+
+    models.Pendencias.objects.bulk_update(abertas, ['ocorrencias', 'atualizado_em'])
+    existentes = {pendencia.hash_pergunta for pendencia in abertas}
+
+    return [item for item in novos if item.get('hash_pergunta') not in existentes], counts, abertas
+
+
+def _create_batch(items):
+    with transaction.atomic():
+        items, counts, repetidas = _merge_repeated(items)
+        uuids = [uuid.UUID(item['uuid']) for item in items]
+        # Um lote devolvido à fila após uma falha pode já estar gravado
+        ja_gravadas = set(models.Pendencias.objects.filter(uuid__in=uuids).values_list('uuid', flat=True))
+        user_ids = {
+            str(user_uuid): pk
+            for user_uuid, pk in models.CustomUser.objects
+            .filter(uuid__in={item['custom_user'] for item in items if item['custom_user']})
+            .values_list('uuid', 'pk')
+        }
+        owners = [item['custom_user'] if item['custom_user'] in user_ids else None for item in items]
+        pendencias = models.Pendencias.objects.bulk_create(
+            [
+                models.Pendencias(
+                    uuid=pendencia_uuid,
+                    nome=item['nome'],
+                    descricao=item['descricao'],
+                    custom_user_id=user_ids.get(owner),
+                    hash_pergunta=item.get('hash_pergunta'),
+                    ocorrencias=counts.get(item.get('hash_pergunta'), 1),
+                )
+                for item, owner, pendencia_uuid in zip(items, owners, uuids)
+            ],
+            ignore_conflicts=True,
+        )
+        gravadas = set(models.Pendencias.objects.filter(uuid__in=uuids).values_list('uuid', flat=True)) - ja_gravadas
+
+        # Outro flusher abriu a mesma pergunta depois de `_merge_repeated`: o
+        # ignore_conflicts descartou a linha, então as ocorrências vão para a dele
+        perdidas = {}
+
+        for pendencia in pendencias:
+            if pendencia.uuid not in gravadas and pendencia.uuid not in ja_gravadas and pendencia.hash_pergunta:
+                perdidas[pendencia.hash_pergunta] = pendencia.ocorrencias
+
+        for hash_pergunta, ocorrencias in perdidas.items():
+            models.Pendencias.objects.filter(
+                hash_pergunta=hash_pergunta, status=models.Pendencias.STATUS_AGUARDANDO,
+            ).update(ocorrencias=F('ocorrencias') + ocorrencias, atualizado_em=timezone.now())
+
+        if perdidas:
+            repetidas += models.Pendencias.objects.select_related('custom_user').filter(
+                hash_pergunta__in=perdidas, status=models.Pendencias.STATUS_AGUARDANDO,
+            )
+
+    criadas = [(pendencia, owner) for pendencia, owner in zip(pendencias, owners) if pendencia.uuid in gravadas]
+
+    # bulk_create não dispara post_save: contexto do aluno e feed são tratados aqui
+    student_context.invalidate_students(*{owner for _, owner in criadas if owner})
+    notify([as_event(pendencia, owner) for pendencia, owner in criadas], 'created')
+    notify([as_event(pendencia) for pendencia in repetidas], 'updated')
+
+    return len(criadas)
+
+
+def flush_queue(batch_size=500):
+    """
+    Grava no banco as pendências enfileiradas por `enqueue`.
+
+    Como na fila de histórico do chat, os uuids são gerados no enfileiramento:
+    um lote devolvido à fila após uma falha é ignorado pelo `ignore_conflicts`
+    se já tiver sido gravado. Só as pendências realmente gravadas contam e
+    geram o evento `created`.
+    """
+    connection = get_redis_connection('default')
+    flushed = 0
+
+    while True:
+        items = _pop_queue(connection, batch_size)
+
+        if not items:
+            break
+
+        try:
+            flushed += _create_batch(items)
+        except Exception:
+            connection.lpush(QUEUE_KEY, *[json.dumps(item) for item in reversed(items)])
+            raise
+
+        if len(items) < batch_size:
+            break
+
+    return flushed
@@ -6,3 +6,15 @@ class IsAdmin(permissions.BasePermission):
 
     def has_permission(self, request, view):
         return request.user.role == 1
+
+
+class IsAdminOrOwner(permissions.BasePermission):
+    """
+    Libera admins e o próprio usuário identificado pelo `uuid` da URL (ou pelo
+    kwarg indicado em `owner_url_kwarg` na view).
+    """
+
+    def has_permission(self, request, view):
+        owner = view.kwargs.get(getattr(view, 'owner_url_kwarg', 'uuid'))
+
+        return request.user.role == 1 or str(request.user.uuid) == str(owner)
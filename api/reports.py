@@ -0,0 +1,182 @@
+"""
+Relatórios de notas e faltas sobre `CustomUserDisciplina`.
+
+Cada relatório sai de uma única consulta agregada (médias, somas e rankings via
+funções de janela) e fica em cache por turma; os relatórios dos alunos saem
+todos da mesma consulta das notas da turma. Qualquer escrita que altere notas
+ou alunos de uma turma troca a versão da turma (ver `api.signals`), o que
+descarta de uma vez o relatório da turma e os de todos os seus alunos.
+"""
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Sum, Window
+from django.db.models.functions import Cast, Rank
+
+from . import models
+
+
+REPORT_TIMEOUT = 60 * 10
+
+
+def _version_key(turma_id):
+    return f'report:turma:{turma_id}:version'
+
+
+def _turma_version(turma_id):
+    return cache.get_or_set(_version_key(turma_id), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_turma(*turma_ids):
+    cache.set_many({_version_key(turma_id): uuid.uuid4().hex for turma_id in set(turma_ids)}, timeout=None)
+
+
+def _round(value):
+    return None if value is None else round(float(value), 2)
+
+
+def _cached(key, build):
+    report = cache.get(key)
+
+    if report is None:
+        report = build()
+        cache.set(key, report, timeout=REPORT_TIMEOUT)
+
+    return report
+
+
+def _turma_notas(turma_id):
+    """
+    Notas da turma por aluno, com a posição e a média da turma em cada
+    disciplina. A janela precisa ver a turma inteira, então o aluno é
+    escolhido depois, em Python, e não num filtro da consulta.
+    """
+    key = f'report:turma:{turma_id}:{_turma_version(turma_id)}:notas'
+
+    def build():
+        notas = defaultdict(list)
+
+        for item in (
+            models.CustomUserDisciplina.objects
+            .filter(custom_user__turma_id=turma_id)
+            .annotate(
+                # Cast para float: o SQLite não aceita o CAST de decimal que o Django põe no ORDER BY da janela
+                posicao=Window(
+                    Rank(), partition_by=F('disciplina_id'), order_by=Cast('nota', FloatField()).desc()
+                ),
+                media_turma=Window(Avg('nota', output_field=FloatField()), partition_by=F('disciplina_id')),
+            )
+            .order_by('disciplina__nome')
+            .values('custom_user_id', 'disciplina__uuid', 'disciplina__nome', 'nota', 'falta', 'posicao', 'media_turma')
+        ):
+            notas[item.pop('custom_user_id')].append(item)
+
+        return dict(notas)
+
+    return _cached(key, build)
+
+
+def _aluno_notas(user):
+    if user.turma_id is not None:
+        return _turma_notas(user.turma_id).get(user.pk, [])
+
+    # Sem turma não há com quem comparar: nem posição nem média da turma
+    return [
+        {**item, 'posicao': None, 'media_turma': None}
+        for item in (
+            models.CustomUserDisciplina.objects
+            .filter(custom_user_id=user.pk)
+            .order_by('disciplina__nome')
+            .values('disciplina__uuid', 'disciplina__nome', 'nota', 'falta')
+        )
+    ]
+
+
+def student_report(user):
+    """
+    Notas e faltas do aluno por disciplina, com a média e a posição do aluno na
+    turma em cada disciplina (`None` para alunos sem turma).
+    """
+    key = f'report:turma:{user.turma_id}:{_turma_version(user.turma_id)}:aluno:{user.pk}'
+
+    def build():
+        disciplinas = _aluno_notas(user)
+
+        return {
+            'aluno': {
+                'uuid': str(user.uuid),
+                'username': user.username,
+                'nome': user.get_full_name(),
+            },
+            'media_geral': _round(
+                sum(item['nota'] for item in disciplinas) / len(disciplinas) if disciplinas else None
+            ),
+            'total_faltas': sum(item['falta'] for item in disciplinas),
+            'disciplinas': [
+                {
+                    'uuid': str(item['disciplina__uuid']),
+                    'nome': item['disciplina__nome'],
+                    'nota': _round(item['nota']),
+                    'falta': item['falta'],
+                    'posicao_turma': item['posicao'],
+                    'media_turma': _round(item['media_turma']),
+                }
+                for item in disciplinas
+            ],
+        }
+
+    return _cached(key, build)
+
+
+def turma_report(turma):
+    """Médias e faltas por disciplina e o ranking dos alunos da turma."""
+    key = f'report:turma:{turma.pk}:{_turma_version(turma.pk)}:resumo'
+
+    def build():
+        disciplinas = (
+            models.CustomUserDisciplina.objects
+            .filter(custom_user__turma_id=turma.pk)
+            .values('disciplina__uuid', 'disciplina__nome')
+            .annotate(media=Avg('nota'), total_faltas=Sum('falta'), alunos=Count('custom_user_id'))
+            .order_by('disciplina__nome')
+        )
+        ranking = (
+            models.CustomUser.objects
+            .filter(turma_id=turma.pk, role=models.CustomUser.ALUNO)
+            .annotate(
+                # FloatField pelo mesmo motivo do Cast em `student_report`
+                media=Avg('customuserdisciplina__nota', output_field=FloatField()),
+                total_faltas=Sum('customuserdisciplina__falta'),
+            )
+            .annotate(posicao=Window(Rank(), order_by=F('media').desc(nulls_last=True)))
+            .order_by('posicao', 'username')
+            .values('uuid', 'username', 'first_name', 'last_name', 'media', 'total_faltas', 'posicao')
+        )
+
+        return {
+            'turma': {'uuid': str(turma.uuid), 'nome': turma.nome, 'turno': turma.get_turno_display()},
+            'disciplinas': [
+                {
+                    'uuid': str(item['disciplina__uuid']),
+                    'nome': item['disciplina__nome'],
+                    'media': _round(item['media']),
+                    'total_faltas': item['total_faltas'],
+                    'alunos': item['alunos'],
+                }
+                for item in disciplinas
+            ],
+            'ranking': [
+                {
+                    'posicao': item['posicao'],
+                    'uuid': str(item['uuid']),
+                    'username': item['username'],
+                    'nome': f'{item["first_name"]} {item["last_name"]}'.strip(),
+                    'media': _round(item['media']),
+                    'total_faltas': item['total_faltas'] or 0,
+                }
+                for item in ranking
+            ],
+        }
+
+    return _cached(key, build)
@@ -0,0 +1,8 @@
+from django.urls import re_path
+
+from . import consumers
+
+
+websocket_urlpatterns = [
+    re_path(r'ws/pendencias/$', consumers.PendenciasConsumer.as_asgi())
+]
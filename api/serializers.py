@@ -4,7 +4,41 @@ from drf_yasg import openapi
 from . import models
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Permite escolher os campos da resposta com `?fields=uuid,username`.
+
+    Nomes desconhecidos são ignorados; sem o parâmetro (ou sem nenhum nome
+    válido) todos os campos de `Meta.fields` são mantidos.
+    """
+
+    FIELDS_QUERY_PARAM = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = set(self.requested_fields(self.context.get('request')))
+
+        for name in list(self.fields):
+            if name not in requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        if request is None:
+            return list(cls.Meta.fields)
+
+        names = {name.strip() for name in request.query_params.get(cls.FIELDS_QUERY_PARAM, '').split(',')}
+        requested = [name for name in cls.Meta.fields if name in names]
+
+        return requested or list(cls.Meta.fields)
+
+    @classmethod
+    def only_fields(cls, request):
+        """Campos do model para `QuerySet.only()`; a pk sempre é carregada."""
+        return [name for name in cls.requested_fields(request) if name != 'pk']
+
+
+class CustomUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = models.CustomUser
         fields = ['uuid', 'pk', 'first_name', 'last_name', 'username', 'email', 'role', 'cpf', 'data_nascimento', 'is_active', 'is_password_changed']
@@ -30,6 +64,86 @@ class CustomUserChangePasswordSerializer(serializers.ModelSerializer):
         fields = ['password', 'confirm_password']
 
 
+class CustomUserBulkActivateSerializer(serializers.Serializer):
+    turma = serializers.UUIDField(required=False)
+    users = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+
+    def validate(self, data):
+        if ('turma' in data) == ('users' in data):
+            raise serializers.ValidationError('Informe apenas um entre "turma" e "users".')
+
+        return data
+
+
+class PendenciasSerializer(serializers.ModelSerializer):
+    custom_user = serializers.SlugRelatedField(
+        slug_field='uuid',
+        queryset=models.CustomUser.objects.filter(role=models.CustomUser.ALUNO),
+        required=False,
+        allow_null=True,
+    )
+
+    class Meta:
+        model = models.Pendencias
+        fields = ['uuid', 'nome', 'descricao', 'status', 'ocorrencias', 'custom_user', 'criado_em', 'atualizado_em']
+        read_only_fields = ['status', 'ocorrencias']
+
+
+class PendenciasStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Pendencias
+        fields = ['status']
+
+
+class PendenciasEnqueueSerializer(serializers.Serializer):
+    nome = serializers.CharField(max_length=255)
+    descricao = serializers.CharField()
+    custom_user = serializers.UUIDField(required=False, allow_null=True)
+
+
+class DisciplinaImportSerializer(serializers.Serializer):
+    nome = serializers.CharField(max_length=255)
+
+
+class TurmaImportSerializer(serializers.Serializer):
+    TURNOS = {label.lower(): value for value, label in models.Turma.TURNO_CHOICES}
+
+    nome = serializers.CharField(max_length=255)
+    turno = serializers.CharField()
+    disciplinas = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_turno(self, value):
+        value = str(value).strip().lower()
+
+        if value.isdigit() and int(value) in dict(models.Turma.TURNO_CHOICES):
+            return int(value)
+
+        if value in self.TURNOS:
+            return self.TURNOS[value]
+
+        raise serializers.ValidationError(f'Turno inválido: "{value}".')
+
+    def validate_disciplinas(self, value):
+        return [nome.strip() for nome in value.split(';') if nome.strip()]
+
+
+class AlunoImportSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=255)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    cpf = serializers.CharField(max_length=60, required=False, allow_blank=True, allow_null=True, default=None)
+    data_nascimento = serializers.DateField(required=False, allow_null=True, default=None)
+    turma = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class NotaImportSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    disciplina = serializers.CharField()
+    falta = serializers.IntegerField(min_value=0)
+    nota = serializers.DecimalField(decimal_places=2, max_digits=5)
+
+
 class IntentSerializer(serializers.Serializer):
     intent = serializers.CharField(default="")
     examples = serializers.CharField(allow_blank=True, required=False, default="")
@@ -192,8 +306,25 @@ class StoriesSerializer(serializers.Serializer):
         }
 
 
+def validate_story_steps(steps):
+    """
+    Confere só as referências: `intent` e `action`, quando presentes, precisam
+    ser um nome. Os demais tipos de passo do Rasa (`slot_was_set`, `or`,
+    `active_loop`, `entities` junto da intent...) passam como vieram.
+    """
+    for step in steps:
+        for kind in ('intent', 'action'):
+            if kind in step and not (isinstance(step[kind], str) and step[kind].strip()):
+                raise serializers.ValidationError(f'O valor de "{kind}" deve ser um nome.')
+
+    return steps
+
+
 class StoryStepsSerializer(serializers.Serializer):
-    steps = serializers.ListField()
+    steps = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_steps(self, steps):
+        return validate_story_steps(steps)
 
     class Meta:
         swagger_schema_fields = {
@@ -232,7 +363,17 @@ class StoryStepsSerializer(serializers.Serializer):
         }
 
 
+class StoryContentSerializer(serializers.Serializer):
+    story = serializers.CharField()
+    steps = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_steps(self, steps):
+        return validate_story_steps(steps)
+
+
 class StoryCreateSerializer(serializers.Serializer):
+    data = StoryContentSerializer()
+
     class Meta:
         swagger_schema_fields = {
             'type': openapi.TYPE_OBJECT,
@@ -277,6 +418,34 @@ class StoryCreateSerializer(serializers.Serializer):
         }
 
 
+class BundleIntentSerializer(serializers.Serializer):
+    intent = serializers.CharField()
+    examples = serializers.CharField()
+
+
+class BundleResponseSerializer(serializers.Serializer):
+    name = serializers.RegexField(r'^utter_', error_messages={'invalid': 'O nome deve começar com "utter_".'})
+    texts = serializers.ListField(child=serializers.DictField(child=serializers.CharField()), allow_empty=False)
+
+    def validate_texts(self, texts):
+        if any('text' not in item for item in texts):
+            raise serializers.ValidationError('Cada item deve ter a chave "text".')
+
+        return texts
+
+
+class TrainingBundleSerializer(serializers.Serializer):
+    """
+    Pacote de treinamento no mesmo formato devolvido pela exportação. Só a
+    estrutura é validada aqui; cada item é validado à parte, para que itens
+    inválidos entrem no relatório sem impedir a importação dos demais.
+    """
+
+    nlu = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    responses = serializers.DictField(child=serializers.ListField(), required=False, default=dict)
+    stories = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+
+
 class RestInputSendMessageSerializer(serializers.Serializer):
     sender = serializers.CharField()
     message = serializers.CharField()
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import metrics
+from . import models
+from . import pendencias
+from . import reports
+from . import student_context
+from . import tokens
+from . import user_cache
+
+
+@receiver(connection_created)
+def count_request_queries(sender, connection, **kwargs):
+    metrics.install_db_counter(connection)
+
+
+@receiver(pre_save, sender=models.CustomUser)
+def remember_previous_turma(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and not {'turma', 'turma_id'} & set(update_fields)):
+        return
+
+    instance._previous_turma_id = (
+        models.CustomUser.objects.filter(pk=instance.pk).values_list('turma_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=models.CustomUser)
+@receiver(post_delete, sender=models.CustomUser)
+def invalidate_custom_user_cache(sender, instance, **kwargs):
+    user_cache.invalidate_user(instance.pk)
+    # Ao trocar de turma o aluno sai também do relatório da turma antiga
+    reports.invalidate_turma(instance.turma_id, instance.__dict__.pop('_previous_turma_id', instance.turma_id))
+
+
+@receiver(post_save, sender=models.CustomUserDisciplina)
+@receiver(post_delete, sender=models.CustomUserDisciplina)
+def invalidate_custom_user_disciplina_reports(sender, instance, **kwargs):
+    turma_id = models.CustomUser.objects.filter(pk=instance.custom_user_id).values_list('turma_id', flat=True).first()
+    reports.invalidate_turma(turma_id)
+
+
+@receiver(post_save, sender=models.Turma)
+def invalidate_turma_reports(sender, instance, **kwargs):
+    reports.invalidate_turma(instance.pk)
+
+
+@receiver(post_save, sender=models.Disciplina)
+def invalidate_disciplina_reports(sender, instance, **kwargs):
+    # `None`: relatórios dos alunos sem turma
+    reports.invalidate_turma(None, *models.Turma.objects.filter(disciplinas=instance).values_list('pk', flat=True))
+
+
+# Contexto do aluno para o bot: cada escrita reconstrói só o documento afetado,
+# depois do commit para não materializar dados de uma transação desfeita.
+
+@receiver(post_save, sender=models.CustomUser)
+def refresh_custom_user_context(sender, instance, update_fields=None, **kwargs):
+    # O login só atualiza last_login, que não faz parte do contexto
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+
+    def refresh():
+        if student_context.refresh_student(instance.pk) is None:
+            student_context.invalidate_students(instance.uuid)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=models.CustomUser)
+def forget_custom_user_context(sender, instance, **kwargs):
+    student_context.invalidate_students(instance.uuid)
+
+
+@receiver(post_save, sender=models.CustomUserDisciplina)
+@receiver(post_delete, sender=models.CustomUserDisciplina)
+@receiver(post_save, sender=models.Pendencias)
+@receiver(post_delete, sender=models.Pendencias)
+def refresh_student_context(sender, instance, **kwargs):
+    if instance.custom_user_id is not None:
+        transaction.on_commit(lambda: student_context.refresh_student(instance.custom_user_id))
+
+
+@receiver(post_save, sender=models.Turma)
+@receiver(post_delete, sender=models.Turma)
+def refresh_turma_context(sender, instance, **kwargs):
+    transaction.on_commit(lambda: student_context.refresh_turma(instance.pk))
+
+
+@receiver(m2m_changed, sender=models.Turma.disciplinas.through)
+def refresh_turma_disciplinas_context(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        turma_ids = pk_set or models.Turma.objects.filter(disciplinas=instance).values_list('pk', flat=True)
+    else:
+        turma_ids = [instance.pk]
+
+    transaction.on_commit(lambda: student_context.invalidate_turmas(*turma_ids))
+
+
+@receiver(post_save, sender=models.Disciplina)
+def invalidate_disciplina_context(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    # O nome da disciplina aparece na turma e nas notas dos alunos
+    student_context.invalidate_turmas(
+        *models.Turma.objects.filter(disciplinas=instance).values_list('pk', flat=True)
+    )
+    student_context.invalidate_students(
+        *models.CustomUserDisciplina.objects.filter(disciplina=instance).values_list('custom_user__uuid', flat=True)
+    )
+
+
+@receiver(post_save, sender=models.Pendencias)
+def notify_pendencia(sender, instance, created, **kwargs):
+    event = pendencias.as_event(instance)
+    transaction.on_commit(lambda: pendencias.notify([event], 'created' if created else 'updated'))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, **kwargs):
+    tokens.remember_blacklist_state(instance.token.jti, instance.token.expires_at, True)
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def forget_blacklisted_token(sender, instance, **kwargs):
+    tokens.remember_blacklist_state(instance.token.jti, instance.token.expires_at, False)
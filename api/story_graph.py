@@ -0,0 +1,147 @@
+"""
+Grafo das stories do bot: intents e respostas são os nós, e cada par de passos
+seguidos de uma story é uma aresta (`intent -> utter_...`).
+
+O grafo vive dentro do `TrainingIndex` e é atualizado a cada escrita. Os
+problemas de cada story ficam calculados: editar uma story só revalida os
+passos dela, e criar uma intent ou resposta só revalida as stories que citam
+esse nome. Os problemas verificados são:
+
+* `intent_inexistente` / `resposta_inexistente`: o passo cita uma intent ou
+  uma ação `utter_` que não existe;
+* `inicio_sem_intent`: a story não começa por uma intent, então nada a aciona;
+* `intent_sem_resposta`: a intent é seguida por outra intent ou encerra a
+  story, e o bot não responde nada a ela.
+
+Ações que não começam com `utter_` são ações customizadas do Rasa e não são
+verificadas. Só passos com `intent` ou `action` em texto entram no grafo;
+os demais (`slot_was_set`, `or`, `checkpoint`...) são ignorados, e as arestas
+ligam os passos de intent/action em volta deles.
+"""
+from collections import defaultdict
+
+
+INTENT = 'intent'
+ACTION = 'action'
+RESPONSE_PREFIX = 'utter_'
+
+
+def step_ref(step):
+    """`(tipo, nome)` de um passo que cita uma intent ou action, ou `None` para os demais."""
+    if isinstance(step, dict):
+        for kind in (INTENT, ACTION):
+            if isinstance(step.get(kind), str):
+                return kind, step[kind]
+
+    return None
+
+
+def _refs(steps):
+    """Posição e `(tipo, nome)` dos passos que citam intents ou actions."""
+    return [(index, ref) for index, ref in ((index, step_ref(step)) for index, step in enumerate(steps)) if ref]
+
+
+def validate_steps(steps, intents, responses):
+    """Problemas de uma lista de passos, dados os nomes de intents e respostas existentes."""
+    problemas = []
+    refs = _refs(steps)
+
+    for position, (index, (kind, name)) in enumerate(refs):
+        if kind == INTENT and name not in intents:
+            problemas.append({'passo': index, 'tipo': 'intent_inexistente', 'nome': name})
+        elif kind == ACTION and name.startswith(RESPONSE_PREFIX) and name not in responses:
+            problemas.append({'passo': index, 'tipo': 'resposta_inexistente', 'nome': name})
+
+        if index == 0 and kind != INTENT:
+            problemas.append({'passo': index, 'tipo': 'inicio_sem_intent', 'nome': name})
+
+        if kind == INTENT and (position == len(refs) - 1 or refs[position + 1][1][0] == INTENT):
+            problemas.append({'passo': index, 'tipo': 'intent_sem_resposta', 'nome': name})
+
+    return problemas
+
+
+def _node_id(kind, name):
+    return f'{kind}:{name}'
+
+
+def _edges(steps):
+    refs = [ref for _, ref in _refs(steps)]
+
+    return [(_node_id(*ref), _node_id(*next_ref)) for ref, next_ref in zip(refs, refs[1:])]
+
+
+class StoryGraph:
+    def __init__(self):
+        self.intents = set()
+        self.responses = set()
+        self.stories = {}
+        # (tipo, nome) -> stories que têm esse passo
+        self.refs = defaultdict(set)
+        # (origem, destino) -> stories que têm esses dois passos seguidos
+        self.edges = defaultdict(set)
+        self.problemas = {}
+
+    def _revalidate(self, ref):
+        for story in self.refs.get(ref, ()):
+            self.problemas[story] = validate_steps(self.stories[story], self.intents, self.responses)
+
+    def add_intent(self, name):
+        if name not in self.intents:
+            self.intents.add(name)
+            self._revalidate((INTENT, name))
+
+    def add_response(self, name):
+        if name not in self.responses:
+            self.responses.add(name)
+            self._revalidate((ACTION, name))
+
+    def _unlink(self, story):
+        old_steps = self.stories.get(story, [])
+
+        for _, ref in _refs(old_steps):
+            self.refs[ref].discard(story)
+
+            if not self.refs[ref]:
+                del self.refs[ref]
+
+        for edge in _edges(old_steps):
+            self.edges[edge].discard(story)
+
+            if not self.edges[edge]:
+                del self.edges[edge]
+
+    def set_story(self, story, steps):
+        """Troca os passos de `story`; custa o tamanho da story antiga mais o da nova."""
+        self._unlink(story)
+        self.stories[story] = steps
+        self.problemas[story] = validate_steps(steps, self.intents, self.responses)
+
+        for _, ref in _refs(steps):
+            self.refs[ref].add(story)
+
+        for edge in _edges(steps):
+            self.edges[edge].add(story)
+
+    def check(self, steps):
+        return validate_steps(steps, self.intents, self.responses)
+
+    def as_dict(self):
+        nodes = {(INTENT, name): True for name in self.intents}
+        nodes.update({(ACTION, name): True for name in self.responses})
+
+        # Passos que citam nomes inexistentes ou ações customizadas também viram nós
+        for ref in self.refs:
+            nodes.setdefault(ref, ref[0] == ACTION and not ref[1].startswith(RESPONSE_PREFIX))
+
+        return {
+            'nos': [
+                {'id': _node_id(kind, name), 'tipo': kind, 'nome': name, 'existe': existe, 'usado': (kind, name) in self.refs}
+                for (kind, name), existe in sorted(nodes.items())
+            ],
+            'arestas': [
+                {'origem': origem, 'destino': destino, 'stories': sorted(stories)}
+                for (origem, destino), stories in sorted(self.edges.items())
+            ],
+            'problemas': {story: problemas for story, problemas in sorted(self.problemas.items()) if problemas},
+        }
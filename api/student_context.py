@@ -0,0 +1,146 @@
+"""
+Contexto do aluno pré-calculado para as custom actions do Rasa.
+
+Em vez de juntar `CustomUser`, `Turma`, `Turma.disciplinas`,
+`CustomUserDisciplina` e `Pendencias` a cada mensagem, o contexto fica
+materializado no Redis em dois documentos:
+
+* `student_context:aluno:{uuid}`: dados do aluno, notas e pendências abertas;
+* `student_context:turma:{id}`: turma, turno, calendário e disciplinas,
+  compartilhado por todos os alunos da turma.
+
+Os signals de `api.signals` reconstroem apenas o documento afetado por cada
+escrita; as importações em lote só apagam as chaves e o documento é refeito na
+próxima leitura.
+"""
+from django.core.cache import cache
+
+from . import models
+
+
+CONTEXT_TIMEOUT = 60 * 60 * 24
+
+
+def student_key(user_uuid):
+    return f'student_context:aluno:{user_uuid}'
+
+
+def turma_key(turma_id):
+    return f'student_context:turma:{turma_id}'
+
+
+def _nota(value):
+    return None if value is None else float(value)
+
+
+def build_student(user_id=None, user_uuid=None):
+    lookup = {'pk': user_id} if user_id is not None else {'uuid': user_uuid}
+    aluno = (
+        models.CustomUser.objects
+        .filter(role=models.CustomUser.ALUNO, **lookup)
+        .values('pk', 'uuid', 'username', 'first_name', 'last_name', 'turma_id')
+        .first()
+    )
+
+    if aluno is None:
+        return None
+
+    notas = (
+        models.CustomUserDisciplina.objects
+        .filter(custom_user_id=aluno['pk'])
+        .order_by('disciplina__nome')
+        .values_list('disciplina__nome', 'nota', 'falta')
+    )
+    pendencias = (
+        models.Pendencias.objects
+        .filter(custom_user_id=aluno['pk'], status=models.Pendencias.STATUS_AGUARDANDO)
+        .order_by('-criado_em')
+        .values_list('uuid', 'nome', 'descricao', 'criado_em')
+    )
+
+    return {
+        'uuid': str(aluno['uuid']),
+        'username': aluno['username'],
+        'nome': f'{aluno["first_name"]} {aluno["last_name"]}'.strip(),
+        'turma_id': aluno['turma_id'],
+        'notas': [
+            {'disciplina': disciplina, 'nota': _nota(nota), 'falta': falta}
+            for disciplina, nota, falta in notas
+        ],
+        'pendencias': [
+            {'uuid': str(uuid), 'nome': nome, 'descricao': descricao, 'criado_em': criado_em.isoformat()}
+            for uuid, nome, descricao, criado_em in pendencias
+        ],
+    }
+
+
+def build_turma(turma_id):
+    turma = models.Turma.objects.filter(pk=turma_id).first()
+
+    if turma is None:
+        return None
+
+    return {
+        'uuid': str(turma.uuid),
+        'nome': turma.nome,
+        'turno': turma.get_turno_display(),
+        'calendario': turma.calendario.url if turma.calendario else None,
+        'disciplinas': list(turma.disciplinas.order_by('nome').values_list('nome', flat=True)),
+    }
+
+
+def refresh_student(user_id):
+    document = build_student(user_id=user_id)
+
+    if document is not None:
+        cache.set(student_key(document['uuid']), document, timeout=CONTEXT_TIMEOUT)
+
+    return document
+
+
+def refresh_turma(turma_id):
+    document = build_turma(turma_id)
+
+    if document is None:
+        cache.delete(turma_key(turma_id))
+    else:
+        cache.set(turma_key(turma_id), document, timeout=CONTEXT_TIMEOUT)
+
+    return document
+
+
+def invalidate_students(*user_uuids):
+    cache.delete_many([student_key(user_uuid) for user_uuid in user_uuids])
+
+
+def invalidate_turmas(*turma_ids):
+    cache.delete_many([turma_key(turma_id) for turma_id in turma_ids])
+
+
+def get_context(sender):
+    """
+    Devolve o contexto completo do aluno identificado pelo `sender` (uuid do
+    usuário, o mesmo enviado ao Rasa) ou `None` se ele não for um aluno.
+    """
+    student = cache.get(student_key(sender))
+
+    if student is None:
+        student = build_student(user_uuid=sender)
+
+        if student is None:
+            return None
+
+        cache.set(student_key(sender), student, timeout=CONTEXT_TIMEOUT)
+
+    turma = None
+
+    if student['turma_id'] is not None:
+        turma = cache.get(turma_key(student['turma_id']))
+
+        if turma is None:
+            turma = refresh_turma(student['turma_id'])
+
+    context = {key: value for key, value in student.items() if key != 'turma_id'}
+    context['turma'] = turma
+
+    return context
@@ -1,3 +1,1465 @@
-from django.test import TestCase
+import asyncio
+import email
+import io
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+import redis
+from aiosmtpd.controller import Controller
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from services import bot_connector, connector_cache
+from services.bot_stub import StubConfig, start_stub
+from services.connector_resilience import CircuitBreaker
+from utils.email_utils import SMTPSession
+
+from . import benchmark
+from . import bot_bundle
+from . import models
+from . import outbox
+from . import passwords
+from . import pendencias
+from . import reports
+from . import training_index
+from . import user_cache
+from .consumers import PendenciasConsumer
 
 # Create your tests here.
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-tests'},
+    'chat_history': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-tests-chat'},
+}
+
+# A fila de pendências usa o Redis do cache `default` diretamente
+QUEUE_LOCATION = 'redis://localhost:6379/14'
+QUEUE_CACHES = {
+    **LOCMEM_CACHES,
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': QUEUE_LOCATION,
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+    },
+}
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(QUEUE_LOCATION).ping()
+    except redis.RedisError:
+        return False
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HotEndpointQueryCountTests(TestCase):
+    """
+    Número de consultas de cada endpoint quente, com dados suficientes para que
+    um N+1 apareça como consultas a mais.
+    """
+
+    ALUNOS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.disciplinas = [models.Disciplina.objects.create(nome=f'D{index}') for index in range(3)]
+        cls.turma.disciplinas.set(cls.disciplinas)
+        cls.alunos = [
+            models.CustomUser.objects.create(
+                username=f'aluno{index}', password='x', role=models.CustomUser.ALUNO, turma=cls.turma
+            )
+            for index in range(cls.ALUNOS)
+        ]
+        models.CustomUserDisciplina.objects.bulk_create([
+            models.CustomUserDisciplina(custom_user=aluno, disciplina=disciplina, falta=index, nota=5 + index)
+            for index, aluno in enumerate(cls.alunos)
+            for disciplina in cls.disciplinas
+        ])
+        models.Pendencias.objects.bulk_create([
+            models.Pendencias(nome='Documento', descricao='RG', custom_user=aluno) for aluno in cls.alunos
+        ])
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        return client
+
+    def assertWarmQueries(self, client, url, cold, warm):
+        with self.assertNumQueries(cold):
+            response = client.get(url)
+
+        self.assertEqual(response.status_code, 200, response.content)
+
+        with self.assertNumQueries(warm):
+            response = client.get(url)
+
+        self.assertEqual(response.status_code, 200, response.content)
+
+        return response
+
+    def test_user_list(self):
+        # Autenticação (1, só na primeira) + página
+        response = self.assertWarmQueries(self.client_for(self.admin), '/api/user/?fields=uuid,username', 2, 1)
+
+        self.assertEqual(set(response.data['results'][0]), {'uuid', 'username'})
+        self.assertNotIn('count', response.data)
+
+    def test_aluno_list(self):
+        self.assertWarmQueries(self.client_for(self.admin), '/api/user/role/aluno/', 2, 1)
+
+    def test_current_user(self):
+        self.assertWarmQueries(self.client_for(self.alunos[0]), '/api/user/current/', 1, 0)
+
+    def test_aluno_report(self):
+        aluno = self.alunos[0]
+
+        # Autenticação + aluno + versão da turma; depois só o aluno
+        self.assertWarmQueries(self.client_for(aluno), f'/api/report/aluno/{aluno.uuid}/', 3, 1)
+
+    def test_turma_report(self):
+        # Autenticação + turma + agregados por disciplina + ranking
+        self.assertWarmQueries(self.client_for(self.admin), f'/api/report/turma/{self.turma.uuid}/', 4, 1)
+
+    def test_student_context(self):
+        aluno = self.alunos[0]
+
+        # Autenticação + aluno, notas, pendências, turma e disciplinas; depois só cache
+        response = self.assertWarmQueries(self.client_for(aluno), f'/api/bot/context/{aluno.uuid}/', 6, 0)
+
+        self.assertEqual(len(response.data['notas']), len(self.disciplinas))
+        self.assertEqual(len(response.data['pendencias']), 1)
+
+    def test_email_outbox_depth(self):
+        self.assertWarmQueries(self.client_for(self.admin), '/api/email/outbox/', 3, 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Planos de execução verificados apenas no PostgreSQL')
+@override_settings(CACHES=LOCMEM_CACHES)
+class HotLookupQueryPlanTests(TestCase):
+    """
+    Garante que as consultas quentes usam índice. Cada endpoint é chamado de
+    verdade e o EXPLAIN roda sobre o SQL capturado, então o teste acompanha o
+    que as views executam. Com poucas linhas o PostgreSQL preferiria Seq Scan
+    de qualquer forma, então ele é desligado para que o teste falhe apenas
+    quando não houver índice utilizável.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.disciplina = models.Disciplina.objects.create(nome='D1')
+        cls.turma.disciplinas.add(cls.disciplina)
+        cls.aluno = models.CustomUser.objects.create(
+            username='aluno', password='x', role=models.CustomUser.ALUNO, turma=cls.turma
+        )
+        models.CustomUserDisciplina.objects.create(custom_user=cls.aluno, disciplina=cls.disciplina, falta=1, nota=7)
+        models.Pendencias.objects.create(nome='Documento', descricao='RG', custom_user=cls.aluno)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertEndpointUsesIndexes(self, user, url, tables):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        explained = set()
+
+        for query in queries.captured_queries:
+            if not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {query["sql"]}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+            for table in tables:
+                if f'"{table}"' in query['sql']:
+                    explained.add(table)
+                    self.assertNotRegex(plan, rf'Seq Scan on {table}\b', query['sql'])
+
+        # Se a view deixar de consultar a tabela o teste precisa ser revisto
+        self.assertEqual(explained, set(tables))
+
+    def test_aluno_list(self):
+        self.assertEndpointUsesIndexes(self.admin, '/api/user/role/aluno/', ['api_customuser'])
+
+    def test_pendencias_by_status(self):
+        self.assertEndpointUsesIndexes(
+            self.admin, f'/api/pendencia/?status={models.Pendencias.STATUS_AGUARDANDO}', ['api_pendencias']
+        )
+
+    def test_aluno_report(self):
+        self.assertEndpointUsesIndexes(
+            self.aluno, f'/api/report/aluno/{self.aluno.uuid}/', ['api_customuser', 'api_customuserdisciplina']
+        )
+
+    def test_student_context(self):
+        self.assertEndpointUsesIndexes(
+            self.aluno, f'/api/bot/context/{self.aluno.uuid}/',
+            ['api_customuser', 'api_customuserdisciplina', 'api_pendencias'],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserCacheTests(TestCase):
+    """Usuário autenticado servido do cache e descartado a cada `save()`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = models.CustomUser.objects.create(
+            username='aluno', password='x', first_name='Ana', role=models.CustomUser.ALUNO
+        )
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.aluno)}')
+
+    def test_current_user_reflects_saved_changes(self):
+        self.assertEqual(self.client.get('/api/user/current/').data['first_name'], 'Ana')
+
+        self.aluno.first_name = 'Beatriz'
+        self.aluno.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/user/current/')
+
+        self.assertEqual(response.data['first_name'], 'Beatriz')
+
+    def test_deactivated_user_loses_access_to_the_current_user(self):
+        self.assertEqual(self.client.get('/api/user/current/').status_code, 200)
+
+        self.aluno.is_active = False
+        self.aluno.save()
+
+        self.assertEqual(self.client.get('/api/user/current/').status_code, 401)
+
+    def test_auth_user_comes_from_the_lru_without_the_password(self):
+        with self.assertNumQueries(1):
+            user_cache.get_auth_user(self.aluno.pk)
+
+        with self.assertNumQueries(0):
+            user = user_cache.get_auth_user(self.aluno.pk)
+
+        self.assertEqual(user.username, 'aluno')
+        self.assertIn('password', user.get_deferred_fields())
+
+        # Sem o LRU (outro processo) o valor vem do cache compartilhado
+        user_cache.auth_users.clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user_cache.get_auth_user(self.aluno.pk).pk, self.aluno.pk)
+
+    def test_saving_a_user_drops_the_cached_auth_user(self):
+        user_cache.get_auth_user(self.aluno.pk)
+
+        self.aluno.is_active = False
+        self.aluno.save()
+
+        self.assertIsNone(user_cache.get_lru_auth_user(self.aluno.pk))
+        self.assertFalse(user_cache.get_auth_user(self.aluno.pk).is_active)
+
+    def test_lru_evicts_the_least_recently_used_and_expired_items(self):
+        lru = user_cache.LRUCache(maxsize=2, timeout=60)
+        lru.set(1, 'a')
+        lru.set(2, 'b')
+        lru.get(1)
+        lru.set(3, 'c')
+
+        self.assertEqual((lru.get(1), lru.get(2), lru.get(3)), ('a', None, 'c'))
+
+        with mock.patch('api.user_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get(1))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+
+        return sock.getsockname()[1]
+
+
+class SMTPRecorder:
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+
+        return '250 OK'
+
+
+class EmailOutboxTests(TestCase):
+    """Entrega da fila de emails contra um servidor SMTP local (aiosmtpd)."""
+
+    def start_smtp(self):
+        recorder = SMTPRecorder()
+        controller = Controller(recorder, hostname='127.0.0.1', port=free_port())
+        controller.start()
+        self.addCleanup(controller.stop)
+
+        return recorder, lambda: SMTPSession(controller.hostname, controller.port, use_ssl=False)
+
+    def test_sent_activation_email_has_its_password_removed(self):
+        recorder, session_class = self.start_smtp()
+        outbox.queue_email(outbox.ACTIVATION_SUBJECT, 'aluno@ivo.test', outbox.activation_content('s3nha-provisoria'), sensivel=True)
+        outbox.queue_email('Aviso', 'aluno@ivo.test', 'sem segredo')
+
+        self.assertEqual(outbox.deliver_pending(session_class=session_class), 2)
+
+        self.assertEqual(len(recorder.envelopes), 2)
+        body = email.message_from_bytes(recorder.envelopes[0].content).get_payload()[0].get_payload(decode=True)
+        self.assertIn(b's3nha-provisoria', body)
+        self.assertEqual(
+            dict(models.EmailOutbox.objects.values_list('assunto', 'conteudo')),
+            {outbox.ACTIVATION_SUBJECT: outbox.CONTEUDO_REMOVIDO, 'Aviso': 'sem segredo'},
+        )
+        self.assertEqual(outbox.deliver_pending(session_class=session_class), 0)
+
+    def test_failed_delivery_is_retried_later(self):
+        port = free_port()
+        queued = outbox.queue_email(outbox.ACTIVATION_SUBJECT, 'aluno@ivo.test', 'senha', sensivel=True)
+
+        with self.assertLogs('api.outbox', 'WARNING'):
+            sent = outbox.deliver_pending(session_class=lambda: SMTPSession('127.0.0.1', port, use_ssl=False))
+
+        queued.refresh_from_db()
+
+        self.assertEqual(sent, 0)
+        self.assertEqual((queued.status, queued.tentativas), (models.EmailOutbox.STATUS_PENDENTE, 1))
+        self.assertGreater(queued.proxima_tentativa_em, timezone.now())
+        # Ainda pendente: o conteúdo continua lá para a próxima tentativa
+        self.assertEqual(queued.conteudo, 'senha')
+
+
+    def test_unexpected_error_only_fails_its_own_email(self):
+        _, session_class = self.start_smtp()
+        quebrado = outbox.queue_email('Quebrado', 'aluno@ivo.test', 'conteúdo')
+        outbox.queue_email('Aviso', 'aluno@ivo.test', 'sem segredo')
+
+        with (
+            mock.patch.object(SMTPSession, 'send', side_effect=[UnicodeEncodeError('ascii', '', 0, 1, 'teste'), None]),
+            self.assertLogs('api.outbox', 'ERROR'),
+        ):
+            sent = outbox.deliver_pending(session_class=session_class)
+
+        quebrado.refresh_from_db()
+
+        self.assertEqual(sent, 1)
+        self.assertEqual((quebrado.status, quebrado.tentativas), (models.EmailOutbox.STATUS_PENDENTE, 1))
+        self.assertIn('ascii', quebrado.ultimo_erro)
+        self.assertEqual(models.EmailOutbox.objects.get(assunto='Aviso').status, models.EmailOutbox.STATUS_ENVIADO)
+
+class BulkActivationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.alunos = [
+            models.CustomUser.objects.create(
+                username=f'aluno{index}', password='x', role=models.CustomUser.ALUNO, turma=cls.turma,
+                email=f'aluno{index}@ivo.test' if index else '', is_active=index in (1, 2),
+            )
+            for index in range(4)
+        ]
+
+    def test_activates_inactive_students_with_redacted_emails(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+        response = client.post('/api/user/role/aluno/activate/', {'turma': str(self.turma.uuid)}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(response.data['ativados']), sorted([str(self.alunos[0].uuid), str(self.alunos[3].uuid)]))
+        self.assertEqual(response.data['sem_email'], [str(self.alunos[0].uuid)])
+
+        queued = models.EmailOutbox.objects.get()
+        aluno = models.CustomUser.objects.get(pk=self.alunos[3].pk)
+        raw_password = queued.conteudo.split('<br> <br>')[1].split('<br>')[0].strip()
+
+        self.assertTrue(queued.conteudo_sensivel)
+        self.assertTrue(aluno.is_active)
+        self.assertTrue(aluno.check_password(raw_password))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.outra_turma = models.Turma.objects.create(nome='T2', turno=models.Turma.NOTURNO)
+        cls.disciplina = models.Disciplina.objects.create(nome='Matemática')
+        cls.alunos = []
+
+        for index, nota in enumerate([7, 5, 6]):
+            aluno = models.CustomUser.objects.create(
+                username=f'aluno{index}', password='x', role=models.CustomUser.ALUNO, turma=cls.turma,
+            )
+            models.CustomUserDisciplina.objects.create(custom_user=aluno, disciplina=cls.disciplina, falta=index, nota=nota)
+            cls.alunos.append(aluno)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_student_position_and_average_use_the_whole_class(self):
+        report = reports.student_report(self.alunos[1])
+
+        self.assertEqual(report['media_geral'], 5.0)
+        self.assertEqual(report['total_faltas'], 1)
+        self.assertEqual(
+            [(item['posicao_turma'], item['media_turma']) for item in report['disciplinas']],
+            [(3, 6.0)],
+        )
+        self.assertEqual(reports.student_report(self.alunos[0])['disciplinas'][0]['posicao_turma'], 1)
+
+    def test_student_without_turma_is_not_ranked(self):
+        sem_turma = []
+
+        for index, nota in enumerate([8, 4]):
+            aluno = models.CustomUser.objects.create(username=f'sem_turma{index}', password='x', role=models.CustomUser.ALUNO)
+            models.CustomUserDisciplina.objects.create(custom_user=aluno, disciplina=self.disciplina, falta=0, nota=nota)
+            sem_turma.append(aluno)
+
+        report = reports.student_report(sem_turma[1])
+
+        self.assertEqual(report['media_geral'], 4.0)
+        self.assertEqual(
+            [(item['nota'], item['posicao_turma'], item['media_turma']) for item in report['disciplinas']],
+            [(4.0, None, None)],
+        )
+
+    def test_class_ranking(self):
+        report = reports.turma_report(self.turma)
+
+        self.assertEqual([item['username'] for item in report['ranking']], ['aluno0', 'aluno2', 'aluno1'])
+        self.assertEqual(report['disciplinas'][0]['media'], 6.0)
+        self.assertEqual(report['disciplinas'][0]['alunos'], 3)
+
+    def test_grade_change_invalidates_cached_reports(self):
+        reports.student_report(self.alunos[1])
+        nota = models.CustomUserDisciplina.objects.get(custom_user=self.alunos[1])
+        nota.nota = 9
+        nota.save()
+
+        self.assertEqual(reports.student_report(self.alunos[1])['disciplinas'][0]['posicao_turma'], 1)
+
+    def test_moving_a_student_invalidates_the_previous_class(self):
+        self.assertEqual(len(reports.turma_report(self.turma)['ranking']), 3)
+
+        aluno = models.CustomUser.objects.get(pk=self.alunos[2].pk)
+        aluno.turma = self.outra_turma
+        aluno.save()
+
+        self.assertEqual([item['username'] for item in reports.turma_report(self.turma)['ranking']], ['aluno0', 'aluno1'])
+        self.assertEqual([item['username'] for item in reports.turma_report(self.outra_turma)['ranking']], ['aluno2'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserListingTests(TestCase):
+    """Listagens de usuários paginadas por cursor e com campos escolhidos em `fields`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        cls.alunos = [
+            models.CustomUser.objects.create(username=f'aluno{index}', password='x', role=models.CustomUser.ALUNO)
+            for index in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def test_cursor_walks_every_aluno_once(self):
+        url = '/api/user/role/aluno/?page_size=3&fields=username'
+        usernames = []
+        user_cache.get_auth_user(self.admin.pk)
+
+        while url:
+            # Uma consulta por página, sem COUNT(*)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200, response.content)
+            usernames += [item['username'] for item in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(usernames, [aluno.username for aluno in self.alunos])
+
+    def test_fields_limit_the_response_and_ignore_unknown_names(self):
+        response = self.client.get('/api/user/', {'fields': 'uuid, username,password'})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual({frozenset(item) for item in response.data['results']}, {frozenset({'uuid', 'username'})})
+
+        response = self.client.get('/api/user/', {'fields': 'password'})
+
+        self.assertIn('email', response.data['results'][0])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PendenciasListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        # bulk_create não dispara os signals de notificação
+        models.Pendencias.objects.bulk_create([
+            models.Pendencias(nome=f'Pergunta {index}', descricao='?', ocorrencias=3 if index == 4 else 1)
+            for index in range(7)
+        ])
+
+    def test_cursor_over_repeated_ocorrencias_breaks_ties_by_id(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        url = '/api/pendencia/?ordering=-ocorrencias&page_size=2'
+        nomes = []
+
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            nomes += [item['nome'] for item in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(
+            nomes,
+            list(models.Pendencias.objects.order_by('-ocorrencias', '-id').values_list('nome', flat=True)),
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StudentContextTests(TestCase):
+    """Contexto do aluno para o bot, refeito a cada escrita que o altera."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.disciplina = models.Disciplina.objects.create(nome='Matemática')
+        cls.turma.disciplinas.add(cls.disciplina)
+        cls.aluno = models.CustomUser.objects.create(
+            username='aluno', password='x', role=models.CustomUser.ALUNO, turma=cls.turma
+        )
+        cls.nota = models.CustomUserDisciplina.objects.create(
+            custom_user=cls.aluno, disciplina=cls.disciplina, falta=1, nota=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.aluno)}')
+
+    def get_context(self):
+        response = self.client.get(f'/api/bot/context/{self.aluno.uuid}/')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        return response.data
+
+    def test_grade_change_rebuilds_the_student_document_after_commit(self):
+        self.get_context()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nota.nota = 9
+            self.nota.save()
+
+        # O documento já foi refeito pelo signal: a leitura não consulta o banco
+        with self.assertNumQueries(0):
+            context = self.get_context()
+
+        self.assertEqual(context['notas'], [{'disciplina': 'Matemática', 'nota': 9.0, 'falta': 1}])
+
+    def test_disciplina_rename_reaches_the_turma_and_the_grades(self):
+        self.get_context()
+
+        self.disciplina.nome = 'Álgebra'
+        self.disciplina.save()
+        context = self.get_context()
+
+        self.assertEqual(context['turma']['disciplinas'], ['Álgebra'])
+        self.assertEqual(context['notas'][0]['disciplina'], 'Álgebra')
+
+    def test_new_disciplina_in_the_turma_is_listed(self):
+        self.get_context()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.turma.disciplinas.add(models.Disciplina.objects.create(nome='Biologia'))
+
+        self.assertEqual(self.get_context()['turma']['disciplinas'], ['Biologia', 'Matemática'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SchoolDataImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+        cls.turma = models.Turma.objects.create(nome='T1', turno=models.Turma.MATUTINO)
+        cls.disciplina = models.Disciplina.objects.create(nome='Matemática')
+        cls.turma.disciplinas.add(cls.disciplina)
+
+    def upload(self, tipo, name, content):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+        return client.post(f'/api/import/{tipo}/', {'arquivo': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_existing_rows_are_not_counted_as_created(self):
+        content = 'nome;turno;disciplinas\nT1;matutino;Matemática\nT2;noturno;Matemática\nT3;tarde;\n'
+
+        response = self.upload('turmas', 'turmas.csv', content.encode())
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            {key: response.data[key] for key in ('total', 'criados', 'ignorados', 'total_erros')},
+            {'total': 3, 'criados': 1, 'ignorados': 1, 'total_erros': 1},
+        )
+        self.assertEqual(response.data['erros'][0]['linha'], 4)
+        self.assertEqual(list(models.Turma.objects.get(nome='T2').disciplinas.all()), [self.disciplina])
+
+    def test_students_and_grades(self):
+        alunos = 'username,first_name,turma\naluno1,Ana,T1\naluno1,Ana,T1\naluno2,Bia,T9\n'
+        notas = 'username,disciplina,falta,nota\naluno1,Matemática,2,7.5\naluno1,Matemática,3,8\n'
+
+        response = self.upload('alunos', 'alunos.csv', alunos.encode())
+
+        self.assertEqual((response.data['criados'], response.data['ignorados'], response.data['total_erros']), (1, 1, 1))
+        self.assertFalse(models.CustomUser.objects.get(username='aluno1').has_usable_password())
+
+        response = self.upload('notas', 'notas.csv', notas.encode())
+
+        self.assertEqual((response.data['criados'], response.data['atualizados']), (1, 0))
+        nota = models.CustomUserDisciplina.objects.get()
+        self.assertEqual((nota.falta, nota.nota), (3, 8))
+
+    def test_unreadable_files_are_rejected(self):
+        for name, content in [('alunos.csv', 'username\njoão\n'.encode('latin-1')), ('alunos.xlsx', b'not a zip')]:
+            with self.subTest(name):
+                response = self.upload('alunos', name, content)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('arquivo', response.data)
+
+        self.assertFalse(models.CustomUser.objects.filter(role=models.CustomUser.ALUNO).exists())
+
+
+@skipUnless(redis_available(), 'A fila de pendências precisa de um Redis')
+@override_settings(CACHES=QUEUE_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, BOT_FALLBACK_RESPONSES=[])
+class PendenciasQueueTests(TestCase):
+    """Fila de pendências no Redis, gravação em lote e eventos do feed dos admins."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = models.CustomUser.objects.create(username='aluno', password='x', role=models.CustomUser.ALUNO)
+        cls.outro = models.CustomUser.objects.create(username='outro', password='x', role=models.CustomUser.ALUNO)
+
+    def setUp(self):
+        redis.Redis.from_url(QUEUE_LOCATION).flushdb()
+        layer = get_channel_layer()
+        self.channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(pendencias.PENDENCIAS_GROUP, self.channel)
+
+    async def receive_events(self):
+        events = []
+
+        while True:
+            try:
+                message = await asyncio.wait_for(get_channel_layer().receive(self.channel), 0.1)
+            except asyncio.TimeoutError:
+                return events
+
+            events.append((message['action'], message['pendencia']))
+
+    def test_queued_pendencia_is_written_in_batch_and_notified(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.aluno)}')
+
+        response = client.post(
+            '/api/pendencia/queue/', {'nome': 'Documento', 'descricao': 'RG', 'custom_user': str(self.outro.uuid)},
+        )
+
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(pendencias.queue_length(), 1)
+        self.assertFalse(models.Pendencias.objects.exists())
+
+        self.assertEqual(pendencias.flush_queue(), 1)
+
+        pendencia = models.Pendencias.objects.get()
+        # Alunos só abrem pendências em nome próprio
+        self.assertEqual((str(pendencia.uuid), pendencia.custom_user), (response.data['uuid'], self.aluno))
+        self.assertEqual(pendencias.queue_length(), 0)
+        self.assertEqual(
+            [(action, event['uuid'], event['custom_user']) for action, event in async_to_sync(self.receive_events)()],
+            [('created', response.data['uuid'], str(self.aluno.uuid))],
+        )
+
+    def test_repeated_fallback_questions_increment_ocorrencias(self):
+        for pergunta in ['Qual o horário?', 'qual o horario', 'QUAL O HORÁRIO']:
+            pendencias.capture_fallback(str(self.aluno.uuid), pergunta, [])
+
+        # Respostas que não são fallback não geram pendência
+        pendencias.capture_fallback(str(self.aluno.uuid), 'Oi', [{'text': 'Olá!'}])
+
+        self.assertEqual(pendencias.flush_queue(), 1)
+        self.assertEqual(models.Pendencias.objects.get().ocorrencias, 3)
+
+        pendencias.capture_fallback('sala-anonima', 'Qual o horario?', [])
+        pendencias.flush_queue()
+
+        pendencia = models.Pendencias.objects.get()
+        self.assertEqual(pendencia.ocorrencias, 4)
+        self.assertEqual(
+            [(action, event['ocorrencias']) for action, event in async_to_sync(self.receive_events)()],
+            [('created', 3), ('updated', 4)],
+        )
+
+
+    def test_question_opened_by_a_concurrent_flush_keeps_the_count(self):
+        aberta = models.Pendencias.objects.create(
+            nome='Qual o horário?', descricao='Qual o horário?', ocorrencias=2,
+            hash_pergunta=pendencias.question_hash('Qual o horário?'),
+        )
+        pendencias.capture_fallback(str(self.aluno.uuid), 'qual o horario', [])
+
+        # Simula outro flush gravando a pendência depois da busca pelas abertas
+        with mock.patch('api.pendencias._merge_repeated', side_effect=lambda items: (items, {}, [])):
+            self.assertEqual(pendencias.flush_queue(), 0)
+
+        aberta.refresh_from_db()
+        self.assertEqual(aberta.ocorrencias, 3)
+        self.assertEqual(models.Pendencias.objects.count(), 1)
+        self.assertEqual(
+            [(action, event['uuid'], event['ocorrencias']) for action, event in async_to_sync(self.receive_events)()],
+            [('updated', str(aberta.uuid), 3)],
+        )
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class PendenciasConsumerTests(SimpleTestCase):
+    async def connect(self, role):
+        communicator = WebsocketCommunicator(PendenciasConsumer.as_asgi(), '/ws/pendencias/')
+        communicator.scope['user'] = models.CustomUser(username='user', role=role)
+        connected, _ = await communicator.connect()
+
+        return communicator, connected
+
+    async def test_admins_receive_pendencia_events(self):
+        communicator, connected = await self.connect(models.CustomUser.ADMIN)
+        self.assertTrue(connected)
+
+        await get_channel_layer().group_send(
+            pendencias.PENDENCIAS_GROUP, {'type': 'pendencia_event', 'action': 'created', 'pendencia': {'uuid': 'x'}},
+        )
+
+        self.assertEqual(await communicator.receive_json_from(), {'action': 'created', 'pendencia': {'uuid': 'x'}})
+        await communicator.disconnect()
+
+    async def test_students_are_refused(self):
+        communicator, connected = await self.connect(models.CustomUser.ALUNO)
+
+        self.assertFalse(connected)
+        await communicator.disconnect()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERVER_TIMING_METRICS=True)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.aluno = models.CustomUser.objects.create(username='aluno', password='x', role=models.CustomUser.ALUNO)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+
+    def headers(self):
+        return {'authorization': f'Bearer {AccessToken.for_user(self.aluno)}'}
+
+    def test_counts_queries_in_sync_mode(self):
+        response = self.client.get('/api/user/current/', headers=self.headers())
+
+        self.assertIn('db;', response['Server-Timing'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    async def test_counts_queries_of_sync_views_under_asgi(self):
+        # A view síncrona roda em outra thread, com outra conexão
+        response = await AsyncClient().get('/api/user/current/', headers=self.headers())
+
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_percentile_uses_the_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual([benchmark.percentile(values, percent) for percent in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_server_timing_counts(self):
+        header = 'app;dur=12.5, db;desc="3";dur=4.1, redis;desc="2"'
+
+        self.assertEqual(benchmark.parse_server_timing(header), (3, 2))
+        self.assertEqual(benchmark.parse_server_timing(None), (None, None))
+
+    def test_unknown_scenarios_are_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--username', 'admin', '--password', 'x', '--scenarios', 'nenhum')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkCommandTests(TransactionTestCase):
+    """
+    Comando `benchmark` rodando a aplicação ASGI no mesmo processo. As views
+    síncronas rodam em outra thread, que só enxerga dados já gravados: por isso
+    `TransactionTestCase`.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+        models.CustomUser.objects.create_user(username='admin', password='senha-do-benchmark', role=models.CustomUser.ADMIN)
+
+    def tearDown(self):
+        bot_connector.reset_clients(bot_connector.CONNECTOR_URL)
+
+    def test_reports_each_scenario(self):
+        stdout = io.StringIO()
+        call_command(
+            'benchmark', '--username', 'admin', '--password', 'senha-do-benchmark', '--stub',
+            '--scenarios', 'current_user,bot_intent_names', '--requests', '4', '--concurrency', '2',
+            '--label', 'teste', stdout=stdout,
+        )
+        report = json.loads(stdout.getvalue())
+
+        self.assertEqual(report['label'], 'teste')
+        self.assertEqual(set(report['scenarios']), {'current_user', 'bot_intent_names'})
+
+        for result in report['scenarios'].values():
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0, result)
+            self.assertIsNotNone(result['latency_ms']['p99'])
+
+        self.assertIsNotNone(report['scenarios']['current_user']['db_queries_per_request'])
+
+
+class PasswordHashingPoolTests(SimpleTestCase):
+    """Vagas, tempo máximo de espera e 503 do pool de hash de senhas."""
+
+    def make_pool(self, **options):
+        options = {'max_workers': 1, 'max_pending': 1, 'queue_timeout': 0.05, 'result_timeout': 5, **options}
+        pool = passwords.PasswordHashingPool(**options)
+        self.addCleanup(pool.executor.shutdown)
+
+        return pool
+
+    def occupy(self, pool, seconds):
+        worker = threading.Thread(target=pool.submit, args=(time.sleep, seconds))
+        worker.start()
+        self.addCleanup(worker.join)
+
+        # Espera a vaga ser ocupada
+        while not pool.stats()['in_flight']:
+            time.sleep(0.01)
+
+    def test_map_waits_for_the_pending_slots(self):
+        pool = self.make_pool()
+        self.occupy(pool, 0.5)
+
+        with self.assertRaises(passwords.PasswordHashingBusy):
+            pool.map(abs, [-1, -2])
+
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_map_returns_results_in_order(self):
+        pool = self.make_pool(max_pending=2)
+
+        self.assertEqual(pool.map(abs, [-3, 2, -1]), [3, 2, 1])
+        self.assertEqual(pool.stats(), {'completed': 3, 'rejected': 0, 'in_flight': 0})
+
+    def test_slow_hash_times_out_without_releasing_the_slot(self):
+        pool = self.make_pool(result_timeout=0.05)
+
+        with self.assertRaises(passwords.PasswordHashingBusy):
+            pool.submit(time.sleep, 0.5)
+
+        # O trabalho continua ocupando a vaga até terminar
+        self.assertEqual(pool.stats()['in_flight'], 1)
+
+
+class PasswordHashingBusyTests(TestCase):
+    def test_busy_pool_outside_drf_is_503(self):
+        models.CustomUser.objects.create_user(username='admin', password='x', is_staff=True)
+
+        with mock.patch('api.passwords.run_pbkdf2', side_effect=passwords.PasswordHashingBusy()):
+            response = self.client.post('/sa/login/', {'username': 'admin', 'password': 'x'})
+
+        self.assertEqual(response.status_code, 503)
+
+
+class BotConnectorClientTests(SimpleTestCase):
+    """Pool de conexões, timeouts e ciclo de vida dos clientes do conector."""
+
+    def start_stub(self, **config):
+        server = start_stub(config=StubConfig(**config))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        return server
+
+    def test_sync_client_reuses_one_connection(self):
+        server = self.start_stub(intents=3)
+        client = bot_connector.ConnectorClient(base_url=server.url)
+        self.addCleanup(client.close)
+
+        for _ in range(5):
+            self.assertEqual(client.get(f'{bot_connector.WEBHOOK}/intent/names').status_code, 200)
+
+        pools = client.session.get_adapter(server.url).poolmanager.pools
+
+        self.assertEqual([pools[key].num_connections for key in pools.keys()], [1])
+        self.assertEqual(server.state.hits['GET /intent/names'], 5)
+
+    def test_read_timeout_becomes_504(self):
+        server = self.start_stub(latency_ms=300)
+        client = bot_connector.ConnectorClient(base_url=server.url, breaker=CircuitBreaker())
+        self.addCleanup(client.close)
+
+        res = client.request('POST', f'{bot_connector.WEBHOOK}/intent', timeout=0.05, json={'intent': 'x'})
+
+        self.assertEqual(res.status_code, 504)
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_async_client_per_loop_is_closed_with_the_loop(self):
+        server = self.start_stub(latency_ms=300)
+        self.addCleanup(bot_connector.reset_clients, bot_connector.CONNECTOR_URL)
+        bot_connector.reset_clients(server.url)
+
+        async def call():
+            client = bot_connector.get_async_client()
+            self.assertIs(bot_connector.get_async_client(), client)
+            res = await client.request('POST', f'{bot_connector.WEBHOOK}/intent', timeout=0.05, json={'intent': 'x'})
+
+            return client, res
+
+        client, res = asyncio.run(call())
+
+        self.assertEqual(res.status_code, 504)
+        self.assertTrue(client.client.is_closed)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, BOT_FALLBACK_RESPONSES=['Desculpe, não entendi.'])
+class BotStubTests(TestCase):
+    """Endpoints `/api/bot/*` contra o stub do conector, sem o Rasa."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = models.CustomUser.objects.create(username='admin', password='x', role=models.CustomUser.ADMIN)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.auth_users.clear()
+        training_index.reset()
+        self.connector_url = bot_connector.CONNECTOR_URL
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def tearDown(self):
+        bot_connector.reset_clients(self.connector_url)
+
+    def async_headers(self):
+        return {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+
+    def start_stub(self, **config):
+        server = start_stub(config=StubConfig(**config))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        bot_connector.reset_clients(server.url)
+
+        return server
+
+    async def test_bot_views_authenticate_on_the_event_loop(self):
+        self.start_stub(intents=3)
+        values = await models.CustomUser.objects.values_list(*user_cache._auth_field_names()).aget(pk=self.admin.pk)
+        user_cache.auth_users.set(self.admin.pk, values)
+
+        # Com o usuário no LRU a autenticação não passa por sync_to_async
+        with mock.patch('api.authentication.sync_to_async', side_effect=AssertionError('thread hop')):
+            response = await AsyncClient().get('/api/bot/intent/names', headers=self.async_headers())
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['data']), 3)
+
+    def test_intent_names_are_cached(self):
+        server = self.start_stub(intents=3)
+
+        for _ in range(2):
+            response = self.client.get('/api/bot/intent/names')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(len(response.data['data']), 3)
+        self.assertEqual(server.state.hits['GET /intent/names'], 1)
+
+    def test_connector_errors_are_not_cached(self):
+        server = self.start_stub(error_rate=1)
+
+        for _ in range(2):
+            response = self.client.get('/api/bot/intent/names')
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(server.state.hits['GET /intent/names'], 2)
+
+    def test_fallback_reply_opens_pendencia(self):
+        self.start_stub(fallback_rate=1)
+
+        with mock.patch('api.pendencias.enqueue') as enqueue:
+            response = self.client.post(
+                '/api/bot/message/', {'sender': str(self.admin.uuid), 'message': 'Onde fica a biblioteca?'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data[0]['text'], 'Desculpe, não entendi.')
+        enqueue.assert_called_once()
+
+    def test_aluno_talks_to_the_bot_only_as_themself(self):
+        self.start_stub(fallback_rate=1)
+        aluno = models.CustomUser.objects.create(username='aluno', password='x', role=models.CustomUser.ALUNO)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(aluno)}')
+
+        with mock.patch('api.pendencias.enqueue') as enqueue:
+            response = client.post(
+                '/api/bot/message/', {'sender': str(self.admin.uuid), 'message': 'Qual a minha nota?'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data[0]['recipient_id'], str(aluno.uuid))
+        self.assertEqual(enqueue.call_args.args[2], aluno.uuid)
+
+    def test_anonymous_messages_are_refused(self):
+        response = APIClient().post('/api/bot/message/', {'sender': str(self.admin.uuid), 'message': 'oi'}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_replies_outside_the_webhook_format_are_ignored(self):
+        self.assertFalse(pendencias.is_fallback(['Olá!', 1]))
+        self.assertFalse(pendencias.is_fallback([{'text': None, 'custom': 'texto'}, {'custom': {'confidence': 'alta'}}]))
+        self.assertFalse(pendencias.is_fallback({'text': 'Desculpe, não entendi.'}))
+        self.assertTrue(pendencias.is_fallback(['Olá!', {'text': 'Desculpe, não entendi.'}]))
+
+    def test_retries_until_circuit_opens(self):
+        server = self.start_stub(error_rate=1, error_status=503)
+        breaker = bot_connector.circuit_breaker
+
+        with mock.patch('services.connector_resilience.backoff', return_value=0):
+            for _ in range(3):
+                self.client.get('/api/bot/intent/names/available')
+
+        # Cada GET tenta de novo até o circuito abrir; depois falha sem chamar o conector
+        self.assertTrue(breaker.is_open)
+        self.assertEqual(server.state.hits['GET /intent/names/available'], breaker.failure_threshold)
+
+    def test_open_circuit_serves_last_listing(self):
+        server = self.start_stub(intents=3)
+        names = self.client.get('/api/bot/intent/names').data
+
+        connector_cache.invalidate('intents')
+        self.open_circuit()
+
+        response = self.client.get('/api/bot/intent/names')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, names)
+        self.assertEqual(server.state.hits['GET /intent/names'], 1)
+
+    def open_circuit(self):
+        for _ in range(bot_connector.circuit_breaker.failure_threshold):
+            bot_connector.circuit_breaker.record_failure()
+
+    def assertConnectorUnavailable(self, response):
+        self.assertEqual(response.status_code, 503, response.content)
+        self.assertEqual(response.data['detail'], bot_connector.CIRCUIT_OPEN_DETAIL)
+
+    def test_open_circuit_without_cache_is_503_for_intents(self):
+        self.start_stub()
+        self.open_circuit()
+
+        self.assertConnectorUnavailable(self.client.get('/api/bot/intent/', {'page': 1}))
+
+    def test_open_circuit_without_cache_is_503_for_intent_names(self):
+        self.start_stub()
+        self.open_circuit()
+
+        self.assertConnectorUnavailable(self.client.get('/api/bot/intent/names'))
+
+    def test_open_circuit_without_cache_is_503_for_responses(self):
+        self.start_stub()
+        self.open_circuit()
+
+        self.assertConnectorUnavailable(self.client.get('/api/bot/response/', {'page': 1}))
+
+    def test_open_circuit_is_503_for_messages(self):
+        self.start_stub()
+        self.open_circuit()
+
+        response = self.client.post('/api/bot/message/', {'sender': str(self.admin.uuid), 'message': 'oi'}, format='json')
+
+        self.assertConnectorUnavailable(response)
+
+    async def test_stale_listing_is_served_while_it_is_refreshed(self):
+        server = self.start_stub(intents=3)
+
+        async def count_names():
+            response = await AsyncClient().get('/api/bot/intent/names', headers=self.async_headers())
+
+            return len(response.json()['data'])
+
+        with mock.patch.object(connector_cache, 'CONNECTOR_CACHE_TTL', 0):
+            self.assertEqual(await count_names(), 3)
+
+            # Criada direto no Rasa, sem passar pela API
+            server.state.intents['criada_no_rasa'] = '- exemplo'
+
+            # Vencida: a resposta anterior é servida e uma atualização roda em segundo plano
+            self.assertEqual(await count_names(), 3)
+            await asyncio.gather(*connector_cache._refresh_tasks)
+
+            self.assertEqual(await count_names(), 4)
+            await asyncio.gather(*connector_cache._refresh_tasks)
+
+        self.assertEqual(server.state.hits['GET /intent/names'], 3)
+
+    def test_writes_discard_cached_listings(self):
+        server = self.start_stub(intents=3)
+        self.client.get('/api/bot/intent/names')
+
+        response = self.client.post('/api/bot/intent/', {'intent': 'nova', 'examples': '- exemplo'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.assertIn('nova', self.client.get('/api/bot/intent/names').data['data'])
+        self.assertEqual(server.state.hits['GET /intent/names'], 2)
+
+    def test_concurrent_gets_are_coalesced(self):
+        server = self.start_stub(latency_ms=200)
+        client = bot_connector.get_client()
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(
+                lambda _: client.get(f'{bot_connector.WEBHOOK}/intent/names'), range(5)
+            ))
+
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(server.state.hits['GET /intent/names'], 1)
+
+    def test_bundle_import_reports_each_item(self):
+        server = self.start_stub(intents=2)
+        bundle = {
+            'nlu': [
+                {'intent': 'intent_0', 'examples': '- novo exemplo'},
+                {'intent': 'matricula', 'examples': '- como faço a matrícula'},
+                {'intent': 'matricula', 'examples': '- repetida'},
+                {'intent': ''},
+            ],
+            'responses': {'utter_matricula': [{'text': 'Na secretaria.'}], 'matricula': [{'text': 'Sem prefixo'}]},
+            'stories': [{'story': 'matricula', 'steps': [{'intent': 'matricula'}, {'action': 'utter_matricula'}]}],
+        }
+
+        response = self.client.post('/api/bot/bundle/import/', bundle, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            {key: response.data[key] for key in ('total', 'criados', 'atualizados', 'total_erros')},
+            {'total': 7, 'criados': 3, 'atualizados': 1, 'total_erros': 3},
+        )
+        self.assertEqual(server.state.intents['intent_0'], '- novo exemplo')
+        self.assertEqual(server.state.responses['utter_matricula'], [{'text': 'Na secretaria.'}])
+        self.assertEqual(server.state.stories['matricula'][1], {'action': 'utter_matricula'})
+
+    async def test_bundle_export_streams_every_page(self):
+        server = self.start_stub(intents=25, page_size=10)
+
+        response = await AsyncClient().get('/api/bot/bundle/export/', headers=self.async_headers())
+        bundle = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(bundle['nlu']), 25)
+        self.assertEqual(len(bundle['responses']), 25)
+        self.assertEqual(len(bundle['stories']), 25)
+        self.assertEqual(server.state.hits['GET /intent'], 3)
+
+    async def test_bundle_export_ends_with_error_when_a_page_fails(self):
+        self.start_stub(intents=25, page_size=10)
+        intents_page = bot_bundle.intents_page
+
+        async def failing_page(page):
+            if page == 3:
+                raise bot_bundle.ConnectorUnavailable(500)
+
+            return await intents_page(page)
+
+        with (
+            mock.patch('api.bot_bundle.intents_page', new=failing_page),
+            self.assertLogs('api.bot_bundle', 'WARNING'),
+        ):
+            response = await AsyncClient().get('/api/bot/bundle/export/', headers=self.async_headers())
+            bundle = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(bundle['nlu']), 20)
+        self.assertEqual(bundle['erro'], 'Conector do bot respondeu 500')
+        self.assertNotIn('stories', bundle)
+
+    def test_all_intents_snapshot_until_next_mutation(self):
+        server = self.start_stub(intents=25, page_size=10)
+
+        for _ in range(2):
+            response = self.client.get('/api/bot/intent/all/')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(len(response.data['nlu']['nlu']), 25)
+        self.assertEqual(server.state.hits['GET /intent'], 3)
+
+        self.client.post('/api/bot/intent/', {'intent': 'nova', 'examples': '- exemplo'}, format='json')
+        response = self.client.get('/api/bot/intent/all/')
+
+        self.assertEqual(len(response.data['nlu']['nlu']), 26)
+        self.assertEqual(server.state.hits['GET /intent'], 6)
+
+    async def test_all_intents_snapshot_is_revalidated_after_the_ttl(self):
+        server = self.start_stub(intents=3, page_size=10)
+
+        async def count_intents():
+            return len((await bot_bundle.all_intents())['nlu']['nlu'])
+
+        with mock.patch.object(connector_cache, 'CONNECTOR_CACHE_TTL', 0):
+            self.assertEqual(await count_intents(), 3)
+
+            # Criada direto no Rasa, sem passar pela API
+            server.state.intents['criada_no_rasa'] = '- exemplo'
+
+            # Vencido: devolve o snapshot anterior e remonta em segundo plano
+            self.assertEqual(await count_intents(), 3)
+            await asyncio.gather(*connector_cache._refresh_tasks)
+
+            self.assertEqual(await count_intents(), 4)
+            await asyncio.gather(*connector_cache._refresh_tasks)
+
+    def test_search_index_is_updated_without_refetching(self):
+        server = self.start_stub(intents=25, page_size=10)
+
+        response = self.client.get('/api/bot/search/', {'q': 'exemplo 3 da inte'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(response.data[0]['trechos'][0], 'exemplo 3 da intent 0')
+
+        response = self.client.get('/api/bot/intent/intent_7/stories/')
+        self.assertEqual(response.data, {'data': ['intent_7']})
+        hits = dict(server.state.hits)
+
+        self.client.patch('/api/bot/intent/intent_7/change/examples', {'examples': '- quero ver a matrícula'}, format='json')
+        self.client.patch('/api/bot/stories/intent_8/change/steps/', {'steps': [{'intent': 'intent_7'}, {'action': 'utter_intent_8'}]}, format='json')
+        matches = self.client.get('/api/bot/search/', {'q': 'matri'}).data
+        stories = self.client.get('/api/bot/intent/intent_7/stories/').data
+
+        self.assertEqual([(item['tipo'], item['nome']) for item in matches], [('intent', 'intent_7')])
+        self.assertEqual(stories, {'data': ['intent_7', 'intent_8']})
+        # As escritas atualizam o índice local, sem nova leitura do conector
+        self.assertEqual(server.state.hits['GET /intent'], hits['GET /intent'])
+        self.assertEqual(server.state.hits['GET /stories'], hits['GET /stories'])
+
+    def test_stories_with_other_step_kinds_are_indexed(self):
+        server = self.start_stub(intents=3)
+        server.state.stories['com_slot'] = [
+            {'intent': 'intent_1'},
+            {'slot_was_set': [{'turno': 'noite'}]},
+            {'or': [{'intent': 'intent_0'}, {'intent': 'intent_2'}]},
+            {'action': 'utter_intent_1'},
+        ]
+
+        response = self.client.get('/api/bot/search/', {'q': 'utter_intent_1'})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn(('story', 'com_slot'), [(item['tipo'], item['nome']) for item in response.data])
+        self.assertEqual(self.client.get('/api/bot/intent/intent_1/stories/').data, {'data': ['com_slot', 'intent_1']})
+        self.assertNotIn('com_slot', self.client.get('/api/bot/stories/graph/').data['problemas'])
+
+    async def test_index_catches_up_with_writes_from_other_processes(self):
+        server = self.start_stub(intents=3)
+        index = await training_index.get_index()
+
+        # Escrita feita por outro processo: o índice deste não é atualizado na hora
+        training_index.reset()
+        await training_index.record_changes([(training_index.INTENT, 'nova', '- quero ver a matrícula')])
+        training_index._index = index
+        hits = dict(server.state.hits)
+
+        index = await training_index.get_index()
+
+        self.assertEqual([item['nome'] for item in index.search('matri')], ['nova'])
+        self.assertEqual(server.state.hits, hits)
+
+    async def test_concurrent_requests_build_the_index_once(self):
+        server = self.start_stub(intents=3)
+
+        indexes = await asyncio.gather(*(training_index.get_index() for _ in range(5)))
+
+        self.assertEqual(len({id(index) for index in indexes}), 1)
+        self.assertEqual(server.state.hits['GET /stories'], 1)
+
+    def test_invalid_examples_are_rejected(self):
+        self.start_stub(intents=2)
+
+        for data in ({}, {'examples': ['- lista']}):
+            with self.subTest(data=data):
+                response = self.client.patch('/api/bot/intent/intent_1/change/examples', data, format='json')
+
+                self.assertEqual(response.status_code, 400, response.content)
+
+    def test_example_check_is_skipped_when_the_index_cannot_be_built(self):
+        server = self.start_stub(intents=2)
+
+        with (
+            mock.patch('api.training_index.build_index', side_effect=RuntimeError('dados inesperados')),
+            self.assertLogs('api.training_index', 'ERROR'),
+        ):
+            response = self.client.patch('/api/bot/intent/intent_1/change/examples', {'examples': '- oi'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, {'conflitos': []})
+        self.assertEqual(server.state.intents['intent_1'], '- oi')
+
+    def test_bundle_import_rejects_duplicated_examples(self):
+        server = self.start_stub(intents=3)
+        bundle = {
+            'nlu': [
+                # Igual a um exemplo da intent_0, que o pacote não altera
+                {'intent': 'copia', 'examples': '- Exemplo 0 da intent 0'},
+                # Repetidas entre si no próprio pacote
+                {'intent': 'a', 'examples': '- bom dia'},
+                {'intent': 'b', 'examples': '- bom dia'},
+                # A intent_1 é substituída pelo pacote, então o exemplo antigo dela fica livre
+                {'intent': 'intent_1', 'examples': '- novo exemplo'},
+                {'intent': 'herdeira', 'examples': '- exemplo 0 da intent 1'},
+            ],
+            'responses': {},
+            'stories': [],
+        }
+
+        response = self.client.post('/api/bot/bundle/import/', bundle, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            sorted((item['nome'], item['resultado'], item.get('status')) for item in response.data['itens']),
+            [('a', 'erro', 409), ('b', 'erro', 409), ('copia', 'erro', 409), ('herdeira', 'criado', 201), ('intent_1', 'atualizado', 200)],
+        )
+        self.assertNotIn('copia', server.state.intents)
+
+    def test_story_steps_accept_other_rasa_step_kinds(self):
+        server = self.start_stub(intents=2)
+        steps = [
+            {'intent': 'intent_1', 'entities': [{'turno': 'noite'}]},
+            {'slot_was_set': [{'turno': 'noite'}]},
+            {'action': 'utter_intent_1'},
+        ]
+
+        response = self.client.patch('/api/bot/stories/intent_0/change/steps/', {'steps': steps}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(server.state.stories['intent_0'], steps)
+        self.assertEqual(self.client.get('/api/bot/intent/intent_1/stories/').data, {'data': ['intent_0', 'intent_1']})
+        self.assertNotIn('intent_0', self.client.get('/api/bot/stories/graph/').data['problemas'])
+
+        response = self.client.patch('/api/bot/stories/intent_0/change/steps/', {'steps': [{'intent': ['x']}]}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+
+    async def test_index_is_rebuilt_after_max_age(self):
+        server = self.start_stub(intents=2)
+        index = await training_index.get_index()
+
+        # Story criada direto no Rasa, com as listagens do conector já vencidas
+        server.state.stories['direto_no_rasa'] = [{'intent': 'intent_0'}, {'action': 'utter_intent_0'}]
+        await cache.aclear()
+
+        self.assertIs(await training_index.get_index(), index)
+
+        with override_settings(BOT_TRAINING_INDEX_MAX_AGE=0):
+            index = await training_index.get_index()
+
+        self.assertEqual(index.stories_using('intent_0'), ['direto_no_rasa', 'intent_0'])
+
+    def test_duplicate_examples_are_rejected_before_the_connector(self):
+        server = self.start_stub(intents=5)
+        url = '/api/bot/intent/{}/change/examples'
+
+        response = self.client.patch(url.format('intent_4'), {'examples': '- como faço a rematrícula online'}, format='json')
+        self.assertEqual(response.data, {'conflitos': []})
+
+        response = self.client.post('/api/bot/intent/', {'intent': 'nova', 'examples': '- Como faço a REMATRICULA online?'}, format='json')
+
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.data['conflitos'][0]['tipo'], 'duplicado')
+        self.assertEqual(response.data['conflitos'][0]['intents'], ['intent_4'])
+        self.assertNotIn('POST /intent', server.state.hits)
+
+        # Parecido com o de outra intent: vai para o conector, com o aviso na resposta
+        response = self.client.patch(url.format('intent_2'), {'examples': '- como faço a rematrícula on-line'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([(item['tipo'], item['intents']) for item in response.data['conflitos']], [('semelhante', ['intent_4'])])
+        self.assertEqual(server.state.hits['PATCH /intent/intent_2/change/examples'], 1)
+
+    def test_story_steps_are_checked_against_the_graph(self):
+        server = self.start_stub(intents=3)
+        url = '/api/bot/stories/intent_0/change/steps/'
+
+        response = self.client.patch(url, {'steps': [{'intent': 'intent_9'}, {'action': 'utter_intent_1'}, {'intent': 'intent_1'}]}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(
+            [(item['passo'], item['tipo']) for item in response.data['problemas']],
+            [(0, 'intent_inexistente'), (2, 'intent_sem_resposta')],
+        )
+        self.assertNotIn('PATCH /stories/intent_0/change/steps', server.state.hits)
+
+        hits = server.state.hits['GET /stories']
+        self.client.post('/api/bot/response/', {'utter_nova': [{'text': 'Oi'}]}, format='json')
+        response = self.client.post(
+            '/api/bot/stories/', {'data': {'story': 'nova', 'steps': [{'intent': 'intent_0'}, {'action': 'utter_nova'}]}}, format='json'
+        )
+        graph = self.client.get('/api/bot/stories/graph/').data
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(graph['problemas'], {})
+        self.assertIn({'origem': 'intent:intent_0', 'destino': 'action:utter_nova', 'stories': ['nova']}, graph['arestas'])
+        self.assertEqual(server.state.hits['GET /stories'], hits)
@@ -0,0 +1,13 @@
+"""
+Normalização de texto usada para comparar perguntas, exemplos e buscas:
+minúsculas, sem acentos, sem pontuação e com os espaços colapsados.
+"""
+import re
+import unicodedata
+
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
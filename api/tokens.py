@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenBlacklistSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def blacklist_key(jti):
+    return f'token_blacklist:{jti}'
+
+
+def remember_blacklist_state(jti, expires_at, blacklisted):
+    timeout = int((expires_at - datetime.now(tz=timezone.utc)).total_seconds())
+
+    if timeout > 0:
+        cache.set(blacklist_key(jti), blacklisted, timeout=timeout)
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token que guarda em cache o resultado da consulta à blacklist até
+    o token expirar. Todo token colocado na blacklist atualiza o cache (ver
+    `api.signals`), então um resultado negativo em cache nunca fica desatualizado.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        blacklisted = cache.get(blacklist_key(jti))
+
+        if blacklisted is None:
+            blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+            remember_blacklist_state(jti, datetime.fromtimestamp(self.payload['exp'], tz=timezone.utc), blacklisted)
+
+        if blacklisted:
+            raise TokenError(_('Token is blacklisted'))
+
+
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
+
+
+class CachedBlacklistTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = CachedBlacklistRefreshToken
@@ -0,0 +1,328 @@
+"""
+Índice invertido, em memória do processo, dos dados de treinamento do bot:
+nomes e exemplos das intents, textos das respostas e passos das stories.
+
+Serve busca por texto (todas as palavras, a última também como prefixo, para
+busca enquanto se digita) e "quais stories usam esta intent/action" sem chamar
+o Rasa, além da checagem de exemplos repetidos (`check_examples`) e do grafo
+das stories (`check_story`). É montado a partir do conector na primeira busca
+e atualizado item a item pelas views de criação e edição (`record_changes`).
+
+Cada processo (worker) tem o seu índice. Toda escrita incrementa o contador
+`WRITES_KEY` no cache e guarda as mudanças em `CHANGES_KEY:<n>` por
+`CHANGES_TIMEOUT` segundos. O índice sabe até qual escrita já contém: ao ficar
+para trás, aplica as mudanças dos outros processos lidas do cache, e só é
+remontado do conector se alguma já tiver saído do cache ou se faltarem mais de
+`MAX_CATCH_UP` escritas. A montagem roda uma vez por event loop: requisições
+concorrentes esperam a que já está em andamento.
+
+Alterações feitas direto no Rasa não passam por `record_changes`: para que
+apareçam, o índice é remontado quando passa de `BOT_TRAINING_INDEX_MAX_AGE`
+segundos.
+"""
+import asyncio
+import bisect
+import logging
+import time
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from services.bot_connector import AsyncStoriesManipulation
+
+from . import bot_bundle
+from .example_conflicts import ExampleIndex
+from .story_graph import StoryGraph, step_ref
+from .text import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+WRITES_KEY = 'training_index:writes'
+CHANGES_KEY = 'training_index:changes'
+CHANGES_TIMEOUT = 60 * 60
+MAX_CATCH_UP = 100
+DEFAULT_LIMIT = 20
+
+INTENT = 'intent'
+RESPONSE = 'response'
+STORY = 'story'
+
+
+def tokenize(text):
+    return set(normalize_text(text.replace('_', ' ')).split())
+
+
+def _example_lines(examples):
+    return [line.strip().removeprefix('- ').strip() for line in examples.splitlines() if line.strip()]
+
+
+def _step_text(step):
+    kind, name = step_ref(step)
+
+    return f'{kind} {name}'
+
+
+def _excerpts(textos, words, limit=5):
+    """Linhas com mais palavras da busca primeiro (a última conta como prefixo)."""
+    scored = []
+
+    for texto in textos:
+        tokens = tokenize(texto)
+        score = len(tokens.intersection(words[:-1])) + any(token.startswith(words[-1]) for token in tokens)
+
+        if score:
+            scored.append((-score, len(scored), texto))
+
+    return [texto for _, _, texto in sorted(scored)[:limit]] or textos[:1]
+
+
+class TrainingIndex:
+    def __init__(self, writes):
+        self.writes = writes
+        self.built_at = time.monotonic()
+        self.documents = {}
+        self.postings = defaultdict(set)
+        self.tokens = []
+        self.story_refs = defaultdict(set)
+        self.examples = ExampleIndex()
+        self.graph = StoryGraph()
+
+    def _remove(self, key):
+        document = self.documents.pop(key, None)
+
+        if document is None:
+            return
+
+        for token in document['tokens']:
+            self.postings[token].discard(key)
+
+            if not self.postings[token]:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+        if key[0] == STORY:
+            for ref in document['refs']:
+                self.story_refs[ref].discard(key[1])
+
+    def _add(self, tipo, nome, textos, refs=()):
+        key = (tipo, nome)
+        self._remove(key)
+
+        tokens = tokenize(nome).union(*(tokenize(texto) for texto in textos))
+        self.documents[key] = {'textos': textos, 'tokens': tokens, 'refs': set(refs)}
+
+        for token in tokens:
+            if token not in self.postings:
+                bisect.insort(self.tokens, token)
+
+            self.postings[token].add(key)
+
+        for ref in refs:
+            self.story_refs[ref].add(nome)
+
+    def set_intent(self, nome, examples):
+        self._add(INTENT, nome, _example_lines(examples))
+        self.examples.set_intent(nome, examples)
+        self.graph.add_intent(nome)
+
+    def set_response(self, nome, texts):
+        self._add(RESPONSE, nome, [item['text'] for item in texts if item.get('text')])
+        self.graph.add_response(nome)
+
+    def set_story(self, nome, steps):
+        steps = [step for step in steps if isinstance(step, dict)]
+        refs = [step for step in steps if step_ref(step)]
+        self._add(STORY, nome, [_step_text(step) for step in refs], [step_ref(step)[1] for step in refs])
+        self.graph.set_story(nome, steps)
+
+    def apply(self, changes):
+        setters = {INTENT: self.set_intent, RESPONSE: self.set_response, STORY: self.set_story}
+
+        for tipo, nome, data in changes:
+            setters[tipo](nome, data)
+
+    def _prefixed(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        keys = set()
+
+        for token in self.tokens[start:]:
+            if not token.startswith(prefix):
+                break
+
+            keys |= self.postings[token]
+
+        return keys
+
+    def search(self, query, tipo=None, limit=DEFAULT_LIMIT):
+        words = normalize_text(query.replace('_', ' ')).split()
+
+        if not words:
+            return []
+
+        # Palavras completas primeiro (conjuntos menores), a última também como prefixo
+        keys = self._prefixed(words[-1])
+
+        for word in sorted(words[:-1], key=lambda word: len(self.postings.get(word, ()))):
+            keys &= self.postings.get(word, set())
+
+            if not keys:
+                return []
+
+        results = []
+
+        for key in sorted(key for key in keys if tipo is None or key[0] == tipo)[:limit]:
+            textos = self.documents[key]['textos']
+            results.append({'tipo': key[0], 'nome': key[1], 'trechos': _excerpts(textos, words)})
+
+        return results
+
+    def stories_using(self, nome):
+        return sorted(self.story_refs.get(nome, ()))
+
+
+_index = None
+_build_locks = weakref.WeakKeyDictionary()
+
+
+def reset():
+    global _index
+    _index = None
+
+
+def _changes_key(writes):
+    return f'{CHANGES_KEY}:{writes}'
+
+
+async def _writes():
+    await cache.aadd(WRITES_KEY, 0, timeout=None)
+
+    return await cache.aget(WRITES_KEY)
+
+
+async def build_index():
+    writes = await _writes()
+    index = TrainingIndex(writes)
+    intents = await bot_bundle.all_intents()
+
+    for item in (intents or {}).get('nlu', {}).get('nlu', []):
+        index.set_intent(item['intent'], item.get('examples') or '')
+
+    first_page = await bot_bundle.responses_page(1)
+
+    async for page in bot_bundle.iter_pages(bot_bundle.responses_page, first_page, settings.BOT_BUNDLE_CONCURRENCY):
+        for nome, texts in page['responses'].items():
+            index.set_response(nome, texts)
+
+    stories = AsyncStoriesManipulation()
+    res = await stories.get_all_stories()
+
+    if stories.last_status_code != 200:
+        raise bot_bundle.ConnectorUnavailable(stories.last_status_code)
+
+    for story in res.json()['data']:
+        index.set_story(story['story'], story.get('steps') or [])
+
+    return index
+
+
+async def _catch_up(index, writes):
+    """Aplica as escritas dos outros processos guardadas no cache; `False` se não há como."""
+    if not 0 < writes - index.writes <= MAX_CATCH_UP:
+        return False
+
+    keys = [_changes_key(number) for number in range(index.writes + 1, writes + 1)]
+    changes = await cache.aget_many(keys)
+
+    if len(changes) != len(keys):
+        return False
+
+    for key in keys:
+        index.apply(changes[key])
+
+    index.writes = writes
+
+    return True
+
+
+def _build_lock():
+    # Um asyncio.Lock só serve ao event loop em que foi usado
+    loop = asyncio.get_running_loop()
+
+    if loop not in _build_locks:
+        _build_locks[loop] = asyncio.Lock()
+
+    return _build_locks[loop]
+
+
+def _expired(index):
+    return index is None or time.monotonic() - index.built_at > settings.BOT_TRAINING_INDEX_MAX_AGE
+
+
+async def get_index():
+    """Índice atual do processo, com as escritas que ainda não foram aplicadas a ele."""
+    global _index
+
+    if not _expired(_index) and _index.writes == await _writes():
+        return _index
+
+    async with _build_lock():
+        # Outra requisição pode ter atualizado o índice enquanto esta esperava
+        writes = await _writes()
+
+        if _expired(_index) or (_index.writes != writes and not await _catch_up(_index, writes)):
+            _index = await build_index()
+
+    return _index
+
+
+async def _checked_index():
+    # A verificação não pode impedir a escrita: sem índice ela é pulada
+    try:
+        return await get_index()
+    except bot_bundle.ConnectorUnavailable:
+        return None
+    except Exception:
+        logger.exception('Falha ao montar o índice de treinamento; verificação pulada')
+        return None
+
+
+async def check_examples(intent, examples):
+    """
+    Conflitos dos exemplos com os das outras intents (ver `ExampleIndex.conflicts`).
+    Sem o conector, ou se o índice não puder ser montado, a verificação é pulada.
+    """
+    index = await _checked_index()
+
+    return [] if index is None else index.examples.conflicts(intent, examples)
+
+
+async def check_story(steps):
+    """Problemas dos passos de uma story (ver `story_graph`), pulada sem índice como `check_examples`."""
+    index = await _checked_index()
+
+    return [] if index is None else index.graph.check(steps)
+
+
+async def record_changes(changes):
+    """
+    Registra escritas já aceitas pelo conector: `changes` é uma lista de
+    `(tipo, nome, dados)`, com os exemplos da intent, os textos da resposta ou
+    os passos da story.
+    """
+    global _index
+
+    if not changes:
+        return
+
+    await cache.aadd(WRITES_KEY, 0, timeout=None)
+    writes = await cache.aincr(WRITES_KEY)
+    await cache.aset(_changes_key(writes), changes, timeout=CHANGES_TIMEOUT)
+    index = _index
+
+    # Só aplica se o índice estava em dia antes desta escrita; senão `get_index` alcança pelo cache
+    if index is not None and index.writes == writes - 1:
+        index.apply(changes)
+        index.writes = writes
@@ -13,27 +13,58 @@ token_urls = [
 user_urls = [
     path('user/', view=views.CustomUserListCreate.as_view(), name='customuser_view_create'),
     path('user/role/aluno/', view=views.CustomUserByRoleAlunoAPIView.as_view(), name='customuser_by_role_admin_view'),
+    path('user/role/aluno/activate/', view=views.CustomUserBulkActivateAPIView.as_view(), name='customuser_bulk_activate'),
     path('user/current/', view=views.CustomUserCurrentRetrieve.as_view(), name='customuser_current_role_view'),
     path('user/<str:uuid>/role/aluno/update/password', view=views.CustomUserChangePasswordAPIView.as_view(), name='customuser_password_update'),
 ]
 
+report_urls = [
+    path('report/aluno/<uuid:uuid>/', view=views.AlunoReportRetrieve.as_view(), name='aluno_report'),
+    path('report/turma/<uuid:uuid>/', view=views.TurmaReportRetrieve.as_view(), name='turma_report'),
+]
+
+pendencia_urls = [
+    path('pendencia/', view=views.PendenciasListCreate.as_view(), name='pendencia_list_create'),
+    path('pendencia/queue/', view=views.PendenciasEnqueue.as_view(), name='pendencia_enqueue'),
+    path('pendencia/<uuid:uuid>/', view=views.PendenciasRetrieveUpdate.as_view(), name='pendencia_retrieve_update'),
+]
+
+import_urls = [
+    path('import/<str:tipo>/', view=views.SchoolDataImportAPIView.as_view(), name='school_data_import'),
+]
+
+email_urls = [
+    path('email/outbox/', view=views.EmailOutboxDepthRetrieve.as_view(), name='email_outbox_depth'),
+]
+
 bot_urls = [
     path('bot/intent/', view=views.IntentListCreate.as_view(), name='intent_view_create'),
+    path('bot/intent/all/', view=views.IntentListAll.as_view(), name='intent_list_all'),
     path('bot/intent/names', view=views.IntentNamesList.as_view(), name='intent_list_names'),
     path('bot/intent/names/available', view=views.AvailableIntentNamesList.as_view(), name='available_intent_list_names'),
     path('bot/intent/<str:intent>', view=views.IntentListBy.as_view(), name='intent_list_by'),
+    path('bot/intent/<str:intent>/stories/', view=views.IntentStoriesList.as_view(), name='intent_stories'),
     path('bot/intent/<str:intent>/change/examples', view=views.IntentUpdateExamples.as_view(), name='intent_update_examples'),
     path('bot/response/', view=views.ResponseRetrieveCreate.as_view(), name='response_view_create'),
     path('bot/response/names/', view=views.ResponseNamesRetrieve.as_view(), name='response_list_names'),
     path('bot/response/<str:response_name>/change/texts/', view=views.ResponsesUpdateTexts.as_view(), name='response_update_texts'),
     path('bot/stories/', view=views.StoriesListCreate.as_view(), name='stories_list_create'),
+    path('bot/stories/graph/', view=views.StoriesGraphRetrieve.as_view(), name='stories_graph'),
     path('bot/stories/<str:story>/change/steps/', view=views.StoriesStepsUpdate.as_view(), name='stories_update_steps'),
+    path('bot/search/', view=views.TrainingSearch.as_view(), name='bot_training_search'),
+    path('bot/bundle/import/', view=views.TrainingBundleImport.as_view(), name='bot_bundle_import'),
+    path('bot/bundle/export/', view=views.TrainingBundleExport.as_view(), name='bot_bundle_export'),
     path('bot/message/', view=views.MessageToBotSender.as_view(), name='message_bot_sender'),
+    path('bot/context/<uuid:sender>/', view=views.StudentContextRetrieve.as_view(), name='student_context'),
 ]
 
 urlpatterns = [
     *token_urls,
     *user_urls,
+    *report_urls,
+    *pendencia_urls,
+    *import_urls,
+    *email_urls,
     *bot_urls
 ]
 
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+
+from . import models
+from . import serializers
+
+
+CURRENT_USER_TIMEOUT = 60 ** 2 # timeout=1 hora
+
+# Campos que nunca vão para o cache de autenticação; ficam adiados (deferred) na
+# instância reconstruída e só são lidos do banco se alguém acessá-los.
+AUTH_USER_EXCLUDED_FIELDS = ('password', 'prev_password')
+
+
+def current_user_key(user_id):
+    return f'customuser:{user_id}:current'
+
+
+def auth_user_key(user_id):
+    return f'customuser:{user_id}:auth'
+
+
+class LRUCache:
+    """LRU em memória, por processo, com expiração por item."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+
+            if item is None:
+                return None
+
+            expires_at, value = item
+
+            if expires_at < time.monotonic():
+                del self.data[key]
+                return None
+
+            self.data.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.timeout, value)
+            self.data.move_to_end(key)
+
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+auth_users = LRUCache(settings.AUTH_USER_CACHE['LRU_MAXSIZE'], settings.AUTH_USER_CACHE['LRU_TIMEOUT'])
+
+
+class CachedCurrentUser:
+    """
+    Usuário autenticado montado a partir do payload em cache, sem consulta ao banco.
+
+    Expõe apenas o necessário para as permissões (`role`, `is_active`) e o
+    payload do `CustomUserRetrieveSerializer` em `data`.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload):
+        self.data = payload['data']
+        self.is_active = payload['is_active']
+        self.pk = self.id = self.data['pk']
+        self.uuid = self.data['uuid']
+        self.username = self.data['username']
+        self.role = self.data['role']
+
+    def __str__(self) -> str:
+        return self.username
+
+
+def get_current_user_payload(user_id):
+    return cache.get(current_user_key(user_id))
+
+
+def set_current_user_payload(user):
+    payload = {
+        'is_active': user.is_active,
+        'data': dict(serializers.CustomUserRetrieveSerializer(user).data),
+    }
+    cache.set(current_user_key(user.pk), payload, timeout=CURRENT_USER_TIMEOUT)
+
+    return payload
+
+
+def _auth_field_names():
+    return tuple(
+        field.attname for field in models.CustomUser._meta.concrete_fields
+        if field.attname not in AUTH_USER_EXCLUDED_FIELDS
+    )
+
+
+def _user_from_values(values):
+    return models.CustomUser.from_db(router.db_for_read(models.CustomUser), _auth_field_names(), values)
+
+
+def get_auth_user(user_id):
+    """
+    Resolve o `CustomUser` do token: LRU do processo, depois Redis, depois banco.
+
+    No Redis fica apenas a tupla de valores dos campos concretos, não a
+    instância serializada com pickle.
+    """
+    values = auth_users.get(user_id)
+
+    if values is None:
+        values = cache.get(auth_user_key(user_id))
+
+        if values is None:
+            values = models.CustomUser.objects.filter(pk=user_id).values_list(*_auth_field_names()).first()
+
+            if values is None:
+                return None
+
+            cache.set(auth_user_key(user_id), values, timeout=settings.AUTH_USER_CACHE['TIMEOUT'])
+
+        auth_users.set(user_id, values)
+
+    return _user_from_values(values)
+
+
+def get_lru_auth_user(user_id):
+    """Como `get_auth_user`, mas só no LRU do processo: não faz I/O."""
+    values = auth_users.get(user_id)
+
+    return None if values is None else _user_from_values(values)
+
+
+def invalidate_user(*user_ids):
+    cache.delete_many([
+        key for user_id in user_ids
+        for key in (current_user_key(user_id), auth_user_key(user_id))
+    ])
+
+    for user_id in user_ids:
+        auth_users.delete(user_id)
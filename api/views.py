@@ -1,63 +1,100 @@
-from django.core.cache import cache
-from rest_framework import generics, status, views
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework import filters, generics, pagination, parsers, status, views
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 from . import serializers
 from . import permissions
 from . import models
-from utils import email_utils
+from . import activation
+from . import importers
+from . import reports
+from . import student_context
+from . import outbox
+from . import pendencias
+from . import bot_bundle
+from . import example_conflicts
+from . import training_index
+from .authentication import CachedJWTAuthentication, CurrentUserJWTAuthentication
+from .async_views import AsyncAPIView
 from services.bot_connector import (
-    IntentManipulation, ResponseManipulation, StoriesManipulation,
-    RestInput
+    AsyncIntentManipulation, AsyncResponseManipulation, AsyncStoriesManipulation,
+    AsyncRestInput
 )
 
 
 # Create your views here.
 
 page_query = openapi.Parameter('page', openapi.IN_QUERY, description='Página', type=openapi.TYPE_INTEGER, required=True, default=1)
+fields_query = openapi.Parameter(
+    'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+    description='Campos da resposta separados por vírgula (ex.: uuid,username). Padrão: todos.',
+)
+
+CONNECTOR_UNAVAILABLE_STATUSES = (status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_504_GATEWAY_TIMEOUT)
+
+
+def _connector_unavailable(status_code, result=None):
+    """
+    Conector fora do ar (503/504). `result` é a resposta ou o JSON já lido;
+    o `detail` do `UnavailableResponse` é repassado quando houver.
+    """
+    detail = result.get('detail') if isinstance(result, dict) else getattr(result, 'detail', None)
+
+    return Response({'detail': detail or 'Conector do bot indisponível'}, status=status_code)
+
+
+class CustomUserCursorPagination(pagination.CursorPagination):
+    # Paginação por chave (id > cursor): sem COUNT(*) nem OFFSET, cada página
+    # custa o mesmo independente da posição na listagem.
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 
-class CustomUserListCreate(generics.ListAPIView):
+class CustomUserSparseListMixin:
+    pagination_class = CustomUserCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().only(*self.get_serializer_class().only_fields(self.request))
+
+
+class CustomUserListCreate(CustomUserSparseListMixin, generics.ListAPIView):
     queryset = models.CustomUser.objects.all()
     serializer_class = serializers.CustomUserSerializer
-    authentication_classes = (JWTAuthentication, )
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, )
  
-    @swagger_auto_schema(operation_summary='Retorna todos os usuários')
+    @swagger_auto_schema(operation_summary='Retorna todos os usuários', manual_parameters=(fields_query,))
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
 class CustomUserCurrentRetrieve(generics.RetrieveAPIView):
     serializer_class = serializers.CustomUserRetrieveSerializer
+    authentication_classes = (CurrentUserJWTAuthentication, )
     permission_classes = (IsAuthenticated, )
 
     @swagger_auto_schema(operation_summary='Retona o usuário atual autorizado')
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
-    def get_object(self):
-        cache_key = f'CustomUserCurrentRetrieve_uuid_{self.request.user.uuid}'
-        user_cached = cache.get(cache_key)
+    def retrieve(self, request, *args, **kwargs):
+        # O payload já serializado vem do cache via CurrentUserJWTAuthentication
+        return Response(request.user.data)
 
-        if user_cached:
-            return user_cached
-        else:
-            cache.set(cache_key, self.request.user, timeout=60 ** 2 ) # timeout=1 hora
 
-        return self.request.user
-
-
-class CustomUserByRoleAlunoAPIView(generics.ListAPIView):
+class CustomUserByRoleAlunoAPIView(CustomUserSparseListMixin, generics.ListAPIView):
     serializer_class = serializers.CustomUserSerializer
     queryset = models.CustomUser.objects.filter(role=2)
-    authentication_classes = (JWTAuthentication, )
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    @swagger_auto_schema(operation_summary='Retona todos os usuários com a role [Aluno]')
+    @swagger_auto_schema(operation_summary='Retona todos os usuários com a role [Aluno]', manual_parameters=(fields_query,))
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -65,7 +102,7 @@ class CustomUserByRoleAlunoAPIView(generics.ListAPIView):
 class CustomUserChangePasswordAPIView(generics.UpdateAPIView):
     serializer_class = serializers.CustomUserChangePasswordSerializer
     queryset = models.CustomUser.objects.filter(role=2)
-    authentication_classes = (JWTAuthentication, )
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, )
     lookup_field = 'uuid'
 
@@ -100,21 +137,12 @@ class CustomUserChangePasswordAPIView(generics.UpdateAPIView):
             password = self.request.data.get('password')
             self.object.set_password(password)
             self.object.is_active = True
-            self.object.save()
-            cache.delete(f'CustomUserCurrentRetrieve_uuid_{self.object.uuid}')
 
-            email_utils.send_email(
-                'I.V.O Chat - Nova Senha',
-                self.object.email,
-                f'''
-                Seja bem vindo ao I.V.O Chat! <br>
-                Segue sua senha provisória: <br> <br>
-
-                    {password}<br><br>
-                
-               <strong>OBS:</strong> Terá que trocar a senha após o primeiro login.<br>
-                ''',
-            )
+            with transaction.atomic():
+                self.object.save()
+                outbox.queue_email(
+                    outbox.ACTIVATION_SUBJECT, self.object.email, outbox.activation_content(password), sensivel=True
+                )
 
             return Response({
                 'message': 'Senha atualizada com sucesso!',
@@ -131,7 +159,6 @@ class CustomUserChangePasswordAPIView(generics.UpdateAPIView):
             self.object.set_password(password)
             self.object.is_password_changed = True
             self.object.save()
-            cache.delete(f'CustomUserCurrentRetrieve_uuid_{self.object.uuid}')
 
             return Response({
                 'message': 'Senha atualizada com sucesso!'
@@ -152,20 +179,257 @@ class CustomUserChangePasswordAPIView(generics.UpdateAPIView):
 
         return response
 
-class IntentListCreate(views.APIView):
-    authentication_classes = (JWTAuthentication, )
+
+class CustomUserBulkActivateAPIView(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    @swagger_auto_schema(operation_summary='Retorna todas as perguntas', manual_parameters=(page_query,))
+    @swagger_auto_schema(
+        operation_summary='Ativa em lote usuários do tipo [Aluno]',
+        operation_description='''
+        Ativa todos os alunos inativos de uma turma (`turma`) ou de uma lista de uuids (`users`).
+        Cada aluno recebe uma senha provisória própria, enviada por email pela fila de emails.
+        Alunos já ativos são ignorados.
+        ''',
+        request_body=serializers.CustomUserBulkActivateSerializer,
+    )
+    def post(self, request):
+        bulk_activate_serializer = serializers.CustomUserBulkActivateSerializer(data=request.data)
+
+        if not bulk_activate_serializer.is_valid():
+            return Response(bulk_activate_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = bulk_activate_serializer.validated_data
+
+        if 'turma' in data:
+            queryset = models.CustomUser.objects.filter(turma__uuid=data['turma'])
+        else:
+            queryset = models.CustomUser.objects.filter(uuid__in=data['users'])
+
+        return Response(activation.activate_students(queryset), status=status.HTTP_200_OK)
+
+
+class SchoolDataImportAPIView(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+    parser_classes = (parsers.MultiPartParser, )
+
+    @swagger_auto_schema(
+        operation_summary='Importa disciplinas, turmas, alunos ou notas de uma planilha',
+        operation_description='''
+        Recebe um arquivo CSV ou XLSX no campo `arquivo`, com cabeçalho na primeira linha.
+        As colunas esperadas dependem do tipo:
+
+        * **disciplinas**: nome
+        * **turmas**: nome, turno, disciplinas (nomes separados por `;`)
+        * **alunos**: username, first_name, last_name, email, cpf, data_nascimento, turma
+        * **notas**: username, disciplina, falta, nota
+
+        Linhas inválidas são listadas em `erros` sem interromper a importação.
+        Um arquivo ilegível (CSV fora de UTF-8, XLSX corrompido) retorna 400 com
+        o relatório do que já foi gravado.
+        ''',
+        manual_parameters=(
+            openapi.Parameter('arquivo', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True),
+        ),
+    )
+    def post(self, request, tipo):
+        if tipo not in importers.IMPORTERS:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        arquivo = request.FILES.get('arquivo')
+
+        if arquivo is None:
+            return Response({'arquivo': ['Arquivo obrigatório.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = importers.import_file(tipo, arquivo.file, arquivo.name)
+        except importers.InvalidImportFile as error:
+            return Response({**error.report.as_dict(), 'arquivo': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class AlunoReportRetrieve(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdminOrOwner)
+
+    @swagger_auto_schema(
+        operation_summary='Retorna notas, faltas e posição na turma de um aluno',
+        operation_description='Disponível para admins e para o próprio aluno.',
+    )
+    def get(self, request, uuid):
+        aluno = models.CustomUser.objects.filter(uuid=uuid, role=models.CustomUser.ALUNO).first()
+
+        if aluno is None:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(reports.student_report(aluno), status=status.HTTP_200_OK)
+
+
+class TurmaReportRetrieve(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(operation_summary='Retorna médias, faltas por disciplina e ranking de uma turma')
+    def get(self, request, uuid):
+        turma = models.Turma.objects.filter(uuid=uuid).first()
+
+        if turma is None:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(reports.turma_report(turma), status=status.HTTP_200_OK)
+
+
+status_query = openapi.Parameter(
+    'status', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+    description='Filtra pelo status (1: Aguardando Resposta, 2: Resolvido)',
+)
+
+
+class PendenciasCursorPagination(pagination.CursorPagination):
+    ordering = '-criado_em'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        # O cursor guarda só o valor do primeiro campo e conta os empates já vistos;
+        # sem desempate único (`ocorrencias` se repete) as páginas pulariam ou repetiriam linhas
+        ordering = super().get_ordering(request, queryset, view)
+
+        if ordering[-1].lstrip('-') in ('id', 'pk'):
+            return ordering
+
+        return (*ordering, '-id' if ordering[0].startswith('-') else 'id')
+
+
+class PendenciasListCreate(generics.ListCreateAPIView):
+    serializer_class = serializers.PendenciasSerializer
+    pagination_class = PendenciasCursorPagination
+    filter_backends = (filters.OrderingFilter, )
+    ordering_fields = ('criado_em', 'ocorrencias')
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(
+        operation_summary='Retorna as pendências, das mais recentes para as mais antigas',
+        operation_description='''
+        Paginação por cursor; use `?status=1` para a fila de pendências em aberto e
+        `?ordering=-ocorrencias` para priorizar as perguntas que o bot mais deixou sem resposta.
+        ''',
+        manual_parameters=(status_query,),
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_summary='Cria uma pendência')
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = models.Pendencias.objects.select_related('custom_user')
+        status_filter = self.request.query_params.get('status')
+
+        if status_filter and status_filter.isdigit():
+            queryset = queryset.filter(status=int(status_filter))
+
+        return queryset
+
+
+class PendenciasRetrieveUpdate(generics.RetrieveUpdateAPIView):
+    queryset = models.Pendencias.objects.select_related('custom_user')
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+    lookup_field = 'uuid'
+
+    def get_serializer_class(self):
+        if self.request.method == 'PATCH':
+            return serializers.PendenciasStatusSerializer
+
+        return serializers.PendenciasSerializer
+
+    @swagger_auto_schema(operation_summary='Retorna uma pendência')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(auto_schema=None)
+    def put(self, request, *args, **kwargs):
+        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @swagger_auto_schema(operation_summary='Atualiza o status de uma pendência (ex.: resolve)')
+    def patch(self, request, *args, **kwargs):
+        return super().patch(request, *args, **kwargs)
+
+
+class PendenciasEnqueue(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, )
+
+    @swagger_auto_schema(
+        operation_summary='Enfileira uma pendência sem esperar a gravação',
+        operation_description='''
+        Usado pela action de fallback do bot: a pendência vai para uma fila no Redis e
+        é gravada em lote pelo comando `flush_pendencias`. Retorna 202 com o uuid que
+        a pendência terá. Alunos só podem abrir pendências em seu próprio nome.
+        ''',
+        request_body=serializers.PendenciasEnqueueSerializer,
+    )
+    def post(self, request):
+        enqueue_serializer = serializers.PendenciasEnqueueSerializer(data=request.data)
+
+        if not enqueue_serializer.is_valid():
+            return Response(enqueue_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = enqueue_serializer.validated_data
+        custom_user = data.get('custom_user')
+
+        if request.user.role == models.CustomUser.ALUNO:
+            custom_user = request.user.uuid
+
+        pendencia_uuid = pendencias.enqueue(data['nome'], data['descricao'], custom_user)
+
+        return Response({'uuid': pendencia_uuid}, status=status.HTTP_202_ACCEPTED)
+
+
+class EmailOutboxDepthRetrieve(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(operation_summary='Retorna o tamanho da fila de emails')
     def get(self, request):
+        return Response(outbox.outbox_depth(), status=status.HTTP_200_OK)
+
+
+EXAMPLE_CONFLICTS_DESCRIPTION = '''
+Antes do envio ao conector, cada exemplo é comparado com os das outras intents.
+Exemplos iguais (após normalização) a um de outra intent recusam a requisição com
+409 e a lista em `conflitos`; exemplos apenas parecidos não impedem o envio e
+voltam em `conflitos` na resposta.
+'''
+
+
+def _has_duplicates(conflitos):
+    return any(conflito['tipo'] == example_conflicts.DUPLICADO for conflito in conflitos)
+
+
+class IntentListCreate(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(operation_summary='Retorna todas as perguntas', manual_parameters=(page_query,))
+    async def get(self, request):
         page = int(request.GET.get('page'))
 
         if not page:
             page = 1
 
-        intent_manipulation = IntentManipulation()
-        intents = intent_manipulation.get_all_intents(page)
-        intent_serializer = serializers.NLUSerializer(data=intents['data'])
+        intent_manipulation = AsyncIntentManipulation()
+        intents = await intent_manipulation.get_all_intents(page)
+
+        if intent_manipulation.last_status_code in CONNECTOR_UNAVAILABLE_STATUSES:
+            return _connector_unavailable(intent_manipulation.last_status_code, intents)
+
+        intent_serializer = serializers.NLUSerializer(data=intents.get('data'))
 
         if intent_serializer.is_valid():
             serialized = intent_serializer.data
@@ -174,30 +438,69 @@ class IntentListCreate(views.APIView):
         
         return Response(status=status.HTTP_400_BAD_REQUEST)
     
-    @swagger_auto_schema(operation_summary='Cria uma intent', request_body=serializers.IntentSerializer)
-    def post(self, request):
-        intent_manipulation = IntentManipulation()
+    @swagger_auto_schema(
+        operation_summary='Cria uma intent',
+        operation_description=EXAMPLE_CONFLICTS_DESCRIPTION,
+        request_body=serializers.IntentSerializer,
+    )
+    async def post(self, request):
+        intent_manipulation = AsyncIntentManipulation()
 
         intent_serializer = serializers.IntentSerializer(data=request.data)
 
         if intent_serializer.is_valid():
             serialized = intent_serializer.data
+            conflitos = await training_index.check_examples(serialized['intent'], serialized['examples'])
 
-            res = intent_manipulation.create_intent(serialized)
+            if _has_duplicates(conflitos):
+                return Response({'conflitos': conflitos}, status=status.HTTP_409_CONFLICT)
+
+            res = await intent_manipulation.create_intent(serialized)
 
             if res.status_code == 201:
-                return Response(serialized, status=status.HTTP_201_CREATED)
+                await training_index.record_changes([(training_index.INTENT, serialized['intent'], serialized['examples'])])
+
+                return Response({**serialized, 'conflitos': conflitos}, status=status.HTTP_201_CREATED)
 
         return Response({}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class IntentNamesList(views.APIView):
-    authentication_classes = (JWTAuthentication,)
+class IntentListAll(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    def get(self, request):
-        intent_manipulation = IntentManipulation()
-        intents_names = intent_manipulation.get_all_intents_names()
+    @swagger_auto_schema(
+        operation_summary='Retorna todas as perguntas de uma vez',
+        operation_description='''
+        Mesmo formato de `GET /api/bot/intent/?page=N`, com todas as páginas reunidas em uma.
+        As páginas são buscadas em paralelo e o resultado fica em cache até a próxima
+        alteração de intent.
+        ''',
+        responses={status.HTTP_200_OK: serializers.NLUSerializer},
+    )
+    async def get(self, request):
+        try:
+            intents = await bot_bundle.all_intents()
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if intents is None:
+            return Response({}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(intents, status=status.HTTP_200_OK)
+
+
+class IntentNamesList(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    async def get(self, request):
+        intent_manipulation = AsyncIntentManipulation()
+        intents_names = await intent_manipulation.get_all_intents_names()
+
+        if intent_manipulation.last_status_code in CONNECTOR_UNAVAILABLE_STATUSES:
+            return _connector_unavailable(intent_manipulation.last_status_code, intents_names)
+
         intents_names_serializer = serializers.IntentNamesSerializer(data=intents_names)
 
         if intents_names_serializer.is_valid():
@@ -208,13 +511,16 @@ class IntentNamesList(views.APIView):
         return Response({}, status=400)
         
 
-class AvailableIntentNamesList(views.APIView):
-    authentication_classes = (JWTAuthentication, )
+class AvailableIntentNamesList(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    def get(self, request):
-        intent_manipulation = IntentManipulation()
-        available_intents_names = intent_manipulation.get_all_available_intents_names()
+    async def get(self, request):
+        intent_manipulation = AsyncIntentManipulation()
+        available_intents_names = await intent_manipulation.get_all_available_intents_names()
+
+        if available_intents_names.status_code in CONNECTOR_UNAVAILABLE_STATUSES:
+            return _connector_unavailable(available_intents_names.status_code, available_intents_names)
 
         if available_intents_names.status_code == 200:
             intents_names_serializer = serializers.IntentNamesSerializer(data=available_intents_names.json())
@@ -227,13 +533,13 @@ class AvailableIntentNamesList(views.APIView):
         return Response({}, status=400)
 
 
-class IntentListBy(views.APIView):
-    authentication_classes = (JWTAuthentication, )
+class IntentListBy(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    def get(self, request, intent):
-        intent_manipulation = IntentManipulation()
-        intent = intent_manipulation.get_intent_by_name(intent)
+    async def get(self, request, intent):
+        intent_manipulation = AsyncIntentManipulation()
+        intent = await intent_manipulation.get_intent_by_name(intent)
 
         if not intent:
             return Response({}, status=status.HTTP_404_NOT_FOUND)
@@ -247,36 +553,56 @@ class IntentListBy(views.APIView):
 
         return Response({}, status=status.HTTP_400_BAD_REQUEST)
 
-class IntentUpdateExamples(views.APIView):
-    authentication_classes = (JWTAuthentication, )
+class IntentUpdateExamples(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    @swagger_auto_schema(request_body=serializers.IntentExamplesSerializer)
-    def patch(self, request, intent):
-        intent_manipulation = IntentManipulation()
-        res = intent_manipulation.edit_intent_examples(intent, request.data)
+    @swagger_auto_schema(
+        request_body=serializers.IntentExamplesSerializer,
+        operation_description=EXAMPLE_CONFLICTS_DESCRIPTION,
+    )
+    async def patch(self, request, intent):
+        examples_serializer = serializers.IntentExamplesSerializer(data=request.data)
+
+        if not examples_serializer.is_valid():
+            return Response(examples_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        examples = examples_serializer.validated_data['examples']
+        conflitos = await training_index.check_examples(intent, examples)
+
+        if _has_duplicates(conflitos):
+            return Response({'conflitos': conflitos}, status=status.HTTP_409_CONFLICT)
+
+        intent_manipulation = AsyncIntentManipulation()
+        res = await intent_manipulation.edit_intent_examples(intent, {'examples': examples})
 
         if res.status_code != 200:
             return Response({}, status=res.status_code)
 
-        return Response({}, status=200)
+        await training_index.record_changes([(training_index.INTENT, intent, examples)])
+
+        return Response({'conflitos': conflitos}, status=200)
 
-class ResponseRetrieveCreate(views.APIView):
-    authentication_classes = (JWTAuthentication, )
+class ResponseRetrieveCreate(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
     @swagger_auto_schema(manual_parameters=(page_query,))
-    def get(self, request):
+    async def get(self, request):
         page = int(request.GET.get('page'))
 
         if not page:
             page = 1
 
-        res_manipulation = ResponseManipulation()
-        responses = res_manipulation.get_all_responses(page)
+        res_manipulation = AsyncResponseManipulation()
+        responses = await res_manipulation.get_all_responses(page)
+
+        if responses.status_code in CONNECTOR_UNAVAILABLE_STATUSES:
+            return _connector_unavailable(responses.status_code, responses)
+
         res_json = responses.json()
 
-        response_serializer = serializers.UtterSerializer(data=res_json['data'])
+        response_serializer = serializers.UtterSerializer(data=res_json.get('data'))
 
         if response_serializer.is_valid():
             return Response(response_serializer.data, status=200)
@@ -286,30 +612,34 @@ class ResponseRetrieveCreate(views.APIView):
     @swagger_auto_schema(
         request_body=serializers.DynamicResponseSerializer
     )
-    def post(self, request):
+    async def post(self, request):
         response_serializer = serializers.DynamicResponseSerializer(data=request.data)
 
         if response_serializer.is_valid():
             serialized = response_serializer.data
-            response_manipulation = ResponseManipulation()
-            res_json = response_manipulation.create_response(serialized)
+            response_manipulation = AsyncResponseManipulation()
+            res_json = await response_manipulation.create_response(serialized)
 
             if res_json.status_code == status.HTTP_201_CREATED:
+                await training_index.record_changes(
+                    [(training_index.RESPONSE, name, texts) for name, texts in serialized.items()]
+                )
+
                 return Response({}, status=res_json.status_code)
 
         return Response({}, status=400)
 
 
-class ResponseNamesRetrieve(views.APIView):
+class ResponseNamesRetrieve(AsyncAPIView):
     @swagger_auto_schema(responses={
         status.HTTP_200_OK: openapi.Response(
             description='Success Response',
             schema=serializers.ResponseNamesSerializer
         )
     })
-    def get(self, request):
-        response_manipulation = ResponseManipulation()
-        res = response_manipulation.get_all_responses_names()
+    async def get(self, request):
+        response_manipulation = AsyncResponseManipulation()
+        res = await response_manipulation.get_all_responses_names()
 
         match res.status_code:
             case status.HTTP_400_BAD_REQUEST | \
@@ -323,34 +653,45 @@ class ResponseNamesRetrieve(views.APIView):
                 return Response({}, status=res.status_code)
 
 
-class ResponsesUpdateTexts(views.APIView):
-    authentication_classes = (JWTAuthentication,)
+class ResponsesUpdateTexts(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
     @swagger_auto_schema(request_body=serializers.ResponseTextsSerializer)
-    def patch(self, request, response_name):
-        response_manipulation = ResponseManipulation()
+    async def patch(self, request, response_name):
+        response_manipulation = AsyncResponseManipulation()
         response_text_serializer = serializers.ResponseTextsSerializer(data=request.data)
 
         if response_text_serializer.is_valid():
-            res = response_manipulation.edit_response_examples(response_name, request.data)
+            res = await response_manipulation.edit_response_examples(response_name, request.data)
 
             if res.status_code == status.HTTP_200_OK:
+                await training_index.record_changes(
+                    [(training_index.RESPONSE, response_name, request.data.get('texts') or [])]
+                )
+
                 return Response({}, status=res.status_code)
         
         return Response({}, status=400)
 
 
-class StoriesListCreate(views.APIView):
+STORY_CHECKS_DESCRIPTION = '''
+Os passos são verificados antes do envio ao conector. A requisição é recusada com 400
+e a lista em `problemas` se um passo cita intent ou resposta `utter_` inexistente, se a
+story não começa por uma intent ou se alguma intent fica sem ação depois dela.
+'''
+
+
+class StoriesListCreate(AsyncAPIView):
     @swagger_auto_schema(responses={
         status.HTTP_200_OK: openapi.Response(
             description='Success Response',
             schema=serializers.StoriesSerializer
         )
     })
-    def get(self, request):
-        stories_manipulation = StoriesManipulation()
-        res = stories_manipulation.get_all_stories()
+    async def get(self, request):
+        stories_manipulation = AsyncStoriesManipulation()
+        res = await stories_manipulation.get_all_stories()
 
         match res.status_code:
             case status.HTTP_400_BAD_REQUEST | \
@@ -362,10 +703,21 @@ class StoriesListCreate(views.APIView):
             case _:
                 return Response({}, status=res.status_code)
     
-    @swagger_auto_schema(request_body=serializers.StoryCreateSerializer)
-    def post(self, request):
-        stories_manipulation = StoriesManipulation()
-        result = stories_manipulation.create_story(request.data)
+    @swagger_auto_schema(request_body=serializers.StoryCreateSerializer, operation_description=STORY_CHECKS_DESCRIPTION)
+    async def post(self, request):
+        story_serializer = serializers.StoryCreateSerializer(data=request.data)
+
+        if not story_serializer.is_valid():
+            return Response(story_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        story = story_serializer.data['data']
+        problemas = await training_index.check_story(story['steps'])
+
+        if problemas:
+            return Response({'problemas': problemas}, status=status.HTTP_400_BAD_REQUEST)
+
+        stories_manipulation = AsyncStoriesManipulation()
+        result = await stories_manipulation.create_story(story_serializer.data)
 
         match result.status_code:
             case status.HTTP_400_BAD_REQUEST | \
@@ -374,24 +726,31 @@ class StoriesListCreate(views.APIView):
                 
                 return Response({}, status=result.status_code)
             case status.HTTP_201_CREATED:
+                await training_index.record_changes([(training_index.STORY, story['story'], story['steps'])])
+
                 return Response({}, status=result.status_code)
 
         return Response({}, status=418)
 
 
-class StoriesStepsUpdate(views.APIView):
-    authentication_classes = (JWTAuthentication,)
+class StoriesStepsUpdate(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
     permission_classes = (IsAuthenticated, permissions.IsAdmin)
 
-    @swagger_auto_schema(request_body=serializers.StoryStepsSerializer)
-    def patch(self, request, story):
+    @swagger_auto_schema(request_body=serializers.StoryStepsSerializer, operation_description=STORY_CHECKS_DESCRIPTION)
+    async def patch(self, request, story):
         stories_steps_serializer = serializers.StoryStepsSerializer(data=request.data)
 
         if not stories_steps_serializer.is_valid():
-            return Response({}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(stories_steps_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        problemas = await training_index.check_story(stories_steps_serializer.data['steps'])
 
-        stories_manipulation = StoriesManipulation()
-        res = stories_manipulation.change_story_steps(story, stories_steps_serializer.data)
+        if problemas:
+            return Response({'problemas': problemas}, status=status.HTTP_400_BAD_REQUEST)
+
+        stories_manipulation = AsyncStoriesManipulation()
+        res = await stories_manipulation.change_story_steps(story, stories_steps_serializer.data)
 
         match res.status_code:
             case status.HTTP_400_BAD_REQUEST | \
@@ -400,30 +759,196 @@ class StoriesStepsUpdate(views.APIView):
 
                 return Response({}, status=res.status_code)
             case status.HTTP_200_OK:
+                await training_index.record_changes(
+                    [(training_index.STORY, story, stories_steps_serializer.data['steps'])]
+                )
+
                 return Response({}, status=res.status_code)
             case _:
                 return Response({}, status=res.status_code)
 
 
-class MessageToBotSender(views.APIView):
-    authentication_classes = (JWTAuthentication,)
+class StoriesGraphRetrieve(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(
+        operation_summary='Retorna o grafo das stories',
+        operation_description='''
+        Nós são as intents e ações; cada par de passos seguidos de uma story é uma aresta.
+        `problemas` traz, por story, os passos com referência inexistente, início sem intent
+        ou intent sem resposta.
+        ''',
+    )
+    async def get(self, request):
+        try:
+            index = await training_index.get_index()
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(index.graph.as_dict(), status=status.HTTP_200_OK)
+
+
+class TrainingBundleImport(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(
+        operation_summary='Importa intents, respostas e stories em lote',
+        operation_description='''
+        Recebe um pacote no formato da exportação. Cada item é validado e enviado ao
+        conector (criado ou, se já existir, atualizado); o resultado de cada um sai em `itens`.
+        Intents com exemplos iguais aos de outra intent (já existente ou do próprio pacote)
+        não são enviadas e saem com status 409 e a lista em `conflitos`.
+        ''',
+        request_body=serializers.TrainingBundleSerializer,
+    )
+    async def post(self, request):
+        bundle_serializer = serializers.TrainingBundleSerializer(data=request.data)
+
+        if not bundle_serializer.is_valid():
+            return Response(bundle_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = await bot_bundle.import_bundle(
+                bundle_serializer.validated_data, check_examples=training_index.check_examples,
+            )
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        await training_index.record_changes(report.changes)
+
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
 
-    @swagger_auto_schema(request_body=serializers.RestInputSendMessageSerializer)
-    def post(self, request):
-        print(request)
 
+class TrainingBundleExport(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(
+        operation_summary='Baixa todas as intents, respostas e stories em um único arquivo',
+        operation_description='''
+        O arquivo é gerado à medida que as páginas chegam do conector. Se o conector falhar
+        no meio, o JSON termina com a chave `erro` (e sem `stories`): o arquivo está incompleto.
+        ''',
+    )
+    async def get(self, request):
+        try:
+            content = await bot_bundle.open_export()
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return StreamingHttpResponse(
+            content,
+            content_type='application/json',
+            headers={'Content-Disposition': 'attachment; filename="treinamento.json"'},
+        )
+
+
+search_query = openapi.Parameter('q', openapi.IN_QUERY, description='Texto buscado', type=openapi.TYPE_STRING, required=True)
+search_tipo_query = openapi.Parameter(
+    'tipo', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=[training_index.INTENT, training_index.RESPONSE, training_index.STORY],
+)
+search_limit_query = openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=training_index.DEFAULT_LIMIT)
+
+
+class TrainingSearch(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(
+        operation_summary='Busca em intents, exemplos, respostas e stories',
+        operation_description='''
+        Todas as palavras de `q` precisam aparecer; a última também vale como prefixo
+        ("matri" encontra "matrícula"). A busca usa um índice local, sem chamar o conector.
+        ''',
+        manual_parameters=(search_query, search_tipo_query, search_limit_query),
+    )
+    async def get(self, request):
+        tipo = request.GET.get('tipo') or None
+
+        if tipo not in (None, training_index.INTENT, training_index.RESPONSE, training_index.STORY):
+            return Response({'tipo': ['Tipo inválido.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(int(request.GET.get('limit') or training_index.DEFAULT_LIMIT), 100)
+            index = await training_index.get_index()
+        except ValueError:
+            return Response({'limit': ['Deve ser um número.']}, status=status.HTTP_400_BAD_REQUEST)
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(index.search(request.GET.get('q', ''), tipo, limit), status=status.HTTP_200_OK)
+
+
+class IntentStoriesList(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdmin)
+
+    @swagger_auto_schema(operation_summary='Retorna as stories que usam a intent ou action')
+    async def get(self, request, intent):
+        try:
+            index = await training_index.get_index()
+        except bot_bundle.ConnectorUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({'data': index.stories_using(intent)}, status=status.HTTP_200_OK)
+
+
+class StudentContextRetrieve(views.APIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.IsAdminOrOwner)
+    owner_url_kwarg = 'sender'
+
+    @swagger_auto_schema(
+        operation_summary='Retorna o contexto do aluno usado pelas actions do bot',
+        operation_description='''
+        Turma, turno, calendário, disciplinas, notas e pendências abertas do aluno
+        identificado pelo `sender` enviado ao bot, lidos de um documento pré-calculado.
+        ''',
+    )
+    def get(self, request, sender):
+        context = student_context.get_context(str(sender))
+
+        if context is None:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(context, status=status.HTTP_200_OK)
+
+
+class MessageToBotSender(AsyncAPIView):
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, )
+
+    @swagger_auto_schema(request_body=serializers.RestInputSendMessageSerializer)
+    async def post(self, request):
         rest_input_send_message_serializer = serializers.RestInputSendMessageSerializer(data=request.data)
 
         if not rest_input_send_message_serializer.is_valid():
             return Response({}, status=status.HTTP_400_BAD_REQUEST)
         
-        rest_input = RestInput()
-        res = rest_input.send_message_to_bot(rest_input_send_message_serializer.data)
+        message = dict(rest_input_send_message_serializer.data)
+
+        # Alunos falam com o bot apenas em seu próprio nome, como em PendenciasEnqueue:
+        # o sender vira o contexto do aluno e a autoria da pendência de fallback
+        if request.user.role == models.CustomUser.ALUNO:
+            message['sender'] = str(request.user.uuid)
+
+        rest_input = AsyncRestInput()
+        res = await rest_input.send_message_to_bot(message)
 
         match res.status_code:
             case status.HTTP_400_BAD_REQUEST:
                 return Response({}, status=res.status_code)
+            case status.HTTP_503_SERVICE_UNAVAILABLE | status.HTTP_504_GATEWAY_TIMEOUT:
+                return _connector_unavailable(res.status_code, res)
             case status.HTTP_200_OK:
-                return Response(res.json(), status=res.status_code)
+                replies = res.json()
+                # Roda antes da resposta sair, mas é só um RPUSH: a gravação fica com o flush_pendencias
+                await sync_to_async(pendencias.capture_fallback, thread_sensitive=False)(
+                    message['sender'], message['message'], replies,
+                )
+
+                return Response(replies, status=res.status_code)
 
         return Response({'valid': rest_input_send_message_serializer.is_valid()}, status=418)
@@ -1,3 +1,12 @@
 from django.contrib import admin
 
+from . import models
+
 # Register your models here.
+
+
+@admin.register(models.Mensagem)
+class MensagemAdmin(admin.ModelAdmin):
+    list_display = ('sala', 'remetente', 'origem', 'criado_em', 'uuid')
+    list_filter = ('origem',)
+    search_fields = ('sala', 'remetente')
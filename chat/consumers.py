@@ -1,31 +1,125 @@
+import asyncio
 import json
+import logging
+from urllib.parse import parse_qs
 
+import httpx
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from api import pendencias
+from services.bot_connector import AsyncRestInput
+from . import history
+from .models import Mensagem
+
+
+logger = logging.getLogger(__name__)
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
+        self.bot_tasks = set()
+
+        # Quem entra na sala recebe as mensagens dela ao vivo: mesma regra do histórico
+        if not await sync_to_async(history.can_read_room)(self.scope.get('user'), self.room_name):
+            await self.close()
+            return
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
-    
+
+        replay = self.get_replay_size()
+
+        if replay:
+            for message in await history.recent_messages(self.room_name, replay):
+                await self.send(text_data=json.dumps({
+                    'history': True,
+                    'bot': message['origem'] == Mensagem.ORIGEM_BOT,
+                    'message': message['conteudo'],
+                    'criado_em': message['criado_em'],
+                }))
+
     async def disconnect(self, code):
+        for task in self.bot_tasks:
+            task.cancel()
+
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def receive(self, text_data=None, bytes_data=None):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
+        sender = self.get_sender()
 
+        await history.record_message(self.room_name, sender, message)
         await self.channel_layer.group_send(self.room_group_name, {
             'type': 'chat_message',
             'message': message
         })
-    
+
+        # A chamada ao bot roda em uma task separada para que o consumer continue
+        # recebendo mensagens enquanto o Rasa responde.
+        task = asyncio.create_task(self.send_message_to_bot(sender, message))
+        self.bot_tasks.add(task)
+        task.add_done_callback(self.bot_tasks.discard)
+
     async def chat_message(self, event):
         message = event['message']
 
         await self.send(text_data=json.dumps({
             'message': message
         }))
+
+    async def bot_message(self, event):
+        await self.send(text_data=json.dumps({
+            'bot': True,
+            'message': event['message'],
+        }))
+
+    def get_replay_size(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+
+        try:
+            return int(query.get('replay', ['0'])[0])
+        except ValueError:
+            return 0
+
+    def get_sender(self):
+        # Nunca o remetente enviado pelo cliente nem o nome da sala: ele vira o
+        # contexto do aluno e a autoria das pendências. `connect` só aceita
+        # usuários autenticados.
+        return str(self.scope['user'].uuid)
+
+    async def send_message_to_bot(self, sender, message):
+        rest_input = AsyncRestInput()
+
+        try:
+            res = await rest_input.send_message_to_bot({'sender': sender, 'message': message})
+        except httpx.HTTPError:
+            logger.exception('Falha ao enviar mensagem da sala %s para o bot', self.room_name)
+            return
+
+        if res.status_code != 200:
+            logger.warning('Bot respondeu %s para a sala %s', res.status_code, self.room_name)
+            return
+
+        try:
+            replies = res.json()
+        except ValueError:
+            logger.warning('Bot respondeu com um corpo que não é JSON para a sala %s', self.room_name)
+            return
+
+        if not isinstance(replies, list):
+            logger.warning('Bot respondeu com um formato inesperado para a sala %s', self.room_name)
+            return
+
+        for reply in replies:
+            await history.record_message(self.room_name, sender, reply, origem=Mensagem.ORIGEM_BOT)
+            await self.channel_layer.group_send(self.room_group_name, {
+                'type': 'bot_message',
+                'message': reply,
+            })
+
+        # Depois das respostas, para não atrasar o aluno; a pendência só vai para a fila
+        await sync_to_async(pendencias.capture_fallback, thread_sensitive=False)(sender, message, replies)
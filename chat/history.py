@@ -0,0 +1,187 @@
+"""
+Histórico do chat com escrita adiada (write-behind).
+
+Cada mensagem é gravada apenas no Redis do cache `chat_history`, em um único
+pipeline: uma lista `pending` por sala, drenada periodicamente para o banco via
+`bulk_create` (comando `flush_chat_history`), e uma lista `recent` por sala,
+limitada a `CHAT_HISTORY_REPLAY_MAX` itens, usada para reenviar as últimas
+mensagens quando um cliente reconecta.
+
+Se o flush parar, a lista `pending` é cortada em `CHAT_HISTORY_BUFFER_MAX`
+mensagens; as descartadas são registradas no log e somadas em `DROPPED_KEY`.
+"""
+import asyncio
+import json
+import logging
+import uuid
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from .models import Mensagem
+
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE = 'chat_history'
+ROOMS_KEY = 'chat_history:rooms'
+DROPPED_KEY = 'chat_history:dropped'
+
+_async_connections = weakref.WeakKeyDictionary()
+
+
+def pending_key(sala):
+    return f'chat_history:{sala}:pending'
+
+
+def recent_key(sala):
+    return f'chat_history:{sala}:recent'
+
+
+async def _close_with_loop(connection):
+    try:
+        yield
+    finally:
+        await connection.aclose()
+
+
+def get_async_connection():
+    loop = asyncio.get_running_loop()
+    connection = _async_connections.get(loop)
+
+    if connection is None:
+        connection = redis.asyncio.from_url(settings.CACHES[HISTORY_CACHE]['LOCATION'])
+        _async_connections[loop] = connection
+
+        # Fechada pelo `loop.shutdown_asyncgens()`, como os clientes do conector
+        connection.closer = _close_with_loop(connection)
+        asyncio.ensure_future(connection.closer.__anext__())
+
+    return connection
+
+
+def can_read_room(user, sala):
+    """Admins leem qualquer sala; os demais, a própria (o uuid) ou uma em que já escreveram."""
+    if user is None or not user.is_authenticated:
+        return False
+
+    if user.role == user.ADMIN or sala in (str(user.uuid), user.uuid.hex):
+        return True
+
+    return Mensagem.objects.filter(sala=sala, remetente=str(user.uuid)).exists()
+
+
+def build_message(sala, remetente, conteudo, origem=Mensagem.ORIGEM_USUARIO):
+    return {
+        'uuid': str(uuid.uuid4()),
+        'sala': sala,
+        'remetente': remetente,
+        'origem': origem,
+        'conteudo': conteudo,
+        'criado_em': timezone.now().isoformat(),
+    }
+
+
+async def record_message(sala, remetente, conteudo, origem=Mensagem.ORIGEM_USUARIO):
+    message = build_message(sala, remetente, conteudo, origem)
+    payload = json.dumps(message)
+
+    connection = get_async_connection()
+
+    async with connection.pipeline(transaction=False) as pipe:
+        pipe.rpush(pending_key(sala), payload)
+        pipe.ltrim(pending_key(sala), -settings.CHAT_HISTORY_BUFFER_MAX, -1)
+        pipe.lpush(recent_key(sala), payload)
+        pipe.ltrim(recent_key(sala), 0, settings.CHAT_HISTORY_REPLAY_MAX - 1)
+        pipe.sadd(ROOMS_KEY, sala)
+        pending, *_ = await pipe.execute()
+
+    dropped = pending - settings.CHAT_HISTORY_BUFFER_MAX
+
+    if dropped > 0:
+        await connection.incrby(DROPPED_KEY, dropped)
+        logger.warning(
+            'Buffer do histórico da sala %s cheio: %s mensagem(ns) antiga(s) descartada(s) sem gravar', sala, dropped
+        )
+
+    return message
+
+
+def dropped_count():
+    """Total de mensagens descartadas do buffer sem chegar ao banco."""
+    return int(get_redis_connection(HISTORY_CACHE).get(DROPPED_KEY) or 0)
+
+
+async def recent_messages(sala, limit):
+    limit = min(limit, settings.CHAT_HISTORY_REPLAY_MAX)
+
+    if limit <= 0:
+        return []
+
+    payloads = await get_async_connection().lrange(recent_key(sala), 0, limit - 1)
+
+    return [json.loads(payload) for payload in reversed(payloads)]
+
+
+def _pop_pending(connection, sala, batch_size):
+    with connection.pipeline(transaction=True) as pipe:
+        pipe.lrange(pending_key(sala), 0, batch_size - 1)
+        pipe.ltrim(pending_key(sala), batch_size, -1)
+        payloads, _ = pipe.execute()
+
+    return payloads
+
+
+def _to_model(payload):
+    message = json.loads(payload)
+
+    return Mensagem(
+        uuid=message['uuid'],
+        sala=message['sala'],
+        remetente=message['remetente'],
+        origem=message['origem'],
+        conteudo=message['conteudo'],
+        criado_em=parse_datetime(message['criado_em']),
+    )
+
+
+def flush_pending(batch_size=500):
+    """
+    Drena as listas `pending` de todas as salas para o banco.
+
+    Os uuids são gerados no momento do envio, então um lote reenviado após uma
+    falha é ignorado pelo `ignore_conflicts` em vez de duplicado.
+    """
+    connection = get_redis_connection(HISTORY_CACHE)
+    flushed = 0
+
+    for sala in connection.smembers(ROOMS_KEY):
+        sala = sala.decode()
+
+        while True:
+            payloads = _pop_pending(connection, sala, batch_size)
+
+            if not payloads:
+                connection.srem(ROOMS_KEY, sala)
+
+                # Uma mensagem pode ter chegado entre o último lote e o `srem`.
+                if connection.llen(pending_key(sala)):
+                    connection.sadd(ROOMS_KEY, sala)
+                break
+
+            try:
+                Mensagem.objects.bulk_create([_to_model(payload) for payload in payloads], ignore_conflicts=True)
+            except Exception:
+                connection.lpush(pending_key(sala), *reversed(payloads))
+                raise
+
+            flushed += len(payloads)
+
+            if len(payloads) < batch_size:
+                break
+
+    return flushed
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import history
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco as mensagens do chat acumuladas no Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Segundos entre cada gravação. Se omitido, grava uma única vez.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = history.flush_pending(options['batch_size'])
+            self.stdout.write(f'{flushed} mensagens gravadas')
+
+            dropped = history.dropped_count()
+
+            if dropped:
+                self.stderr.write(f'{dropped} mensagens descartadas com o buffer cheio (CHAT_HISTORY_BUFFER_MAX)')
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:57
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mensagem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('sala', models.CharField(max_length=255)),
+                ('remetente', models.CharField(max_length=255)),
+                ('origem', models.PositiveSmallIntegerField(choices=[(1, 'Usuário'), (2, 'Bot')], default=1)),
+                ('conteudo', models.JSONField()),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sala', '-criado_em'], name='chat_mensagem_sala_criado_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,31 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
+
+
+class Mensagem(models.Model):
+    ORIGEM_USUARIO = 1
+    ORIGEM_BOT = 2
+
+    ORIGEM_CHOICES = (
+        (ORIGEM_USUARIO, 'Usuário'),
+        (ORIGEM_BOT, 'Bot'),
+    )
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    sala = models.CharField(max_length=255)
+    remetente = models.CharField(max_length=255)
+    origem = models.PositiveSmallIntegerField(choices=ORIGEM_CHOICES, default=ORIGEM_USUARIO)
+    conteudo = models.JSONField()
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sala', '-criado_em'], name='chat_mensagem_sala_criado_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.sala} - {self.remetente}'
@@ -0,0 +1,10 @@
+from rest_framework import permissions
+
+from . import history
+
+
+class CanReadRoom(permissions.BasePermission):
+    """Libera o histórico da sala `room_name` da URL segundo `history.can_read_room`."""
+
+    def has_permission(self, request, view):
+        return history.can_read_room(request.user, view.kwargs['room_name'])
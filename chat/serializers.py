@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from . import models
+
+
+class MensagemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Mensagem
+        fields = ['uuid', 'sala', 'remetente', 'origem', 'conteudo', 'criado_em']
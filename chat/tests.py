@@ -1,3 +1,173 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock, skipUnless
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import CustomUser
+from services import bot_connector
+from services.bot_stub import StubConfig, start_stub
+
+from . import history
+from . import routing
+from .models import Mensagem
 
 # Create your tests here.
+
+HISTORY_LOCATION = 'redis://localhost:6379/15'
+
+CHAT_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chat-tests'},
+    history.HISTORY_CACHE: {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': HISTORY_LOCATION,
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+    },
+}
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(HISTORY_LOCATION).ping()
+    except redis.RedisError:
+        return False
+
+
+@skipUnless(redis_available(), 'O histórico do chat precisa de um Redis')
+@override_settings(CACHES=CHAT_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, BOT_FALLBACK_RESPONSES=[])
+class ChatConsumerTests(SimpleTestCase):
+    """Ida e volta de mensagens entre o WebSocket e o stub do conector do bot."""
+
+    def setUp(self):
+        redis.Redis.from_url(HISTORY_LOCATION).flushdb()
+        self.addCleanup(bot_connector.reset_clients, bot_connector.CONNECTOR_URL)
+
+        server = start_stub(config=StubConfig())
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        bot_connector.reset_clients(server.url)
+
+    async def connect(self, room, user):
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), f'/ws/chat/{room}/')
+        communicator.scope['user'] = user
+
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        return communicator
+
+    async def test_bot_reply_goes_to_the_authenticated_sender(self):
+        aluno = CustomUser(username='aluno', role=CustomUser.ALUNO)
+        communicator = await self.connect(aluno.uuid.hex, aluno)
+
+        # O remetente enviado pelo cliente é ignorado
+        await communicator.send_json_to({'message': 'oi', 'sender': 'outro-aluno'})
+
+        self.assertEqual(await communicator.receive_json_from(), {'message': 'oi'})
+        reply = await communicator.receive_json_from(timeout=5)
+        await communicator.disconnect()
+
+        self.assertTrue(reply['bot'])
+        self.assertEqual(reply['message']['recipient_id'], str(aluno.uuid))
+        self.assertEqual(
+            [(message['remetente'], message['origem']) for message in await history.recent_messages(aluno.uuid.hex, 10)],
+            [(str(aluno.uuid), 1), (str(aluno.uuid), 2)],
+        )
+
+    async def test_anonymous_sockets_are_refused(self):
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), '/ws/chat/sala2/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+
+        self.assertFalse(connected)
+
+    async def test_non_json_bot_reply_is_ignored(self):
+        res = mock.Mock(status_code=200, json=mock.Mock(side_effect=ValueError('corpo vazio')))
+        aluno = CustomUser(username='aluno', role=CustomUser.ALUNO)
+        communicator = await self.connect(aluno.uuid.hex, aluno)
+
+        with (
+            mock.patch('chat.consumers.AsyncRestInput.send_message_to_bot', new=mock.AsyncMock(return_value=res)),
+            self.assertLogs('chat.consumers', 'WARNING'),
+        ):
+            await communicator.send_json_to({'message': 'oi'})
+            await communicator.receive_json_from()
+            await asyncio.sleep(0.1)
+
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+@skipUnless(redis_available(), 'O histórico do chat precisa de um Redis')
+@override_settings(CACHES=CHAT_CACHES)
+class ChatHistoryTests(TestCase):
+    """Buffer no Redis, gravação em lote e acesso ao histórico de cada sala."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(username='admin', password='x', role=CustomUser.ADMIN)
+        cls.aluno = CustomUser.objects.create(username='aluno', password='x', role=CustomUser.ALUNO)
+        cls.outro = CustomUser.objects.create(username='outro', password='x', role=CustomUser.ALUNO)
+
+    def setUp(self):
+        redis.Redis.from_url(HISTORY_LOCATION).flushdb()
+
+    def record(self, sala, remetente, conteudo):
+        return async_to_sync(history.record_message)(sala, remetente, conteudo)
+
+    def get_history(self, user, sala):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        return client.get(f'/api/chat/{sala}/history/')
+
+    def test_flush_moves_pending_messages_to_the_database(self):
+        for index in range(3):
+            self.record('sala1', 'aluno', f'mensagem {index}')
+
+        self.assertEqual(history.flush_pending(batch_size=2), 3)
+        self.assertEqual(history.flush_pending(), 0)
+        self.assertEqual(
+            list(Mensagem.objects.order_by('criado_em').values_list('conteudo', flat=True)),
+            ['mensagem 0', 'mensagem 1', 'mensagem 2'],
+        )
+
+    @override_settings(CHAT_HISTORY_BUFFER_MAX=3)
+    def test_full_buffer_counts_dropped_messages(self):
+        with self.assertLogs('chat.history', 'WARNING'):
+            for index in range(5):
+                self.record('sala1', 'aluno', f'mensagem {index}')
+
+        self.assertEqual(history.dropped_count(), 2)
+        self.assertEqual(history.flush_pending(), 3)
+
+    def test_history_is_limited_to_room_members(self):
+        self.record('sala1', str(self.aluno.uuid), 'oi')
+        history.flush_pending()
+
+        self.assertEqual(len(self.get_history(self.aluno, 'sala1').data['results']), 1)
+        self.assertEqual(len(self.get_history(self.admin, 'sala1').data['results']), 1)
+        self.assertEqual(self.get_history(self.outro, 'sala1').status_code, 403)
+        self.assertEqual(self.get_history(self.outro, self.outro.uuid.hex).status_code, 200)
+
+    async def test_socket_is_limited_to_room_members(self):
+        async def connects(user, sala):
+            communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), f'/ws/chat/{sala}/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+
+            return connected
+
+        sala = self.aluno.uuid.hex
+
+        self.assertTrue(await connects(self.aluno, sala))
+        self.assertTrue(await connects(self.admin, sala))
+        self.assertFalse(await connects(self.outro, sala))
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+
+urlpatterns = [
+    path('chat/<str:room_name>/history/', view=views.MensagemHistoryList.as_view(), name='chat_history_list'),
+]
@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from rest_framework import generics, pagination
+from rest_framework.permissions import IsAuthenticated
+from drf_yasg.utils import swagger_auto_schema
+
+from api.authentication import CachedJWTAuthentication
+
+from . import models
+from . import permissions
+from . import serializers
 
 # Create your views here.
+
+
+class MensagemCursorPagination(pagination.CursorPagination):
+    ordering = '-criado_em'
+    page_size = 50
+
+
+class MensagemHistoryList(generics.ListAPIView):
+    serializer_class = serializers.MensagemSerializer
+    pagination_class = MensagemCursorPagination
+    authentication_classes = (CachedJWTAuthentication, )
+    permission_classes = (IsAuthenticated, permissions.CanReadRoom)
+
+    @swagger_auto_schema(
+        operation_summary='Retorna o histórico de mensagens de uma sala',
+        operation_description='''
+        Mensagens ordenadas da mais recente para a mais antiga, paginadas por cursor.
+        As mensagens são gravadas no banco em lote, então os últimos segundos de conversa
+        podem ainda não aparecer aqui; use `?replay=N` no WebSocket para recebê-las.
+        Admins leem qualquer sala; os demais, a própria (o seu uuid) ou uma em que já escreveram.
+        '''
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return models.Mensagem.objects.filter(sala=self.kwargs['room_name'])
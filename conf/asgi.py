@@ -14,12 +14,18 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
 
-import chat.routing
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
 django_asgi_application = get_asgi_application()
+
+# As rotas importam models, então só podem ser carregadas depois do setup do Django
+import api.routing
+import chat.routing
+from api.authentication import JWTQueryStringAuthMiddleware
+
 application = ProtocolTypeRouter({
     'http': django_asgi_application,
-    'websocket': AllowedHostsOriginValidator(AuthMiddlewareStack(chat.routing.websocket_urlpatterns))
+    'websocket': AllowedHostsOriginValidator(AuthMiddlewareStack(JWTQueryStringAuthMiddleware(URLRouter(
+        chat.routing.websocket_urlpatterns + api.routing.websocket_urlpatterns
+    ))))
 })
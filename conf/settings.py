@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.PasswordHashingBusyMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -139,6 +141,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# O PooledPBKDF2PasswordHasher usa o mesmo algoritmo (pbkdf2_sha256) do
+# PBKDF2PasswordHasher padrão, que por isso não pode estar na lista também.
+PASSWORD_HASHERS = [
+    'api.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Valores vazios no .env (como no .env.example) valem como não definidos
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS') or os.cpu_count() or 1)
+PASSWORD_HASHING_MAX_PENDING = int(os.environ.get('PASSWORD_HASHING_MAX_PENDING') or PASSWORD_HASHING_WORKERS * 8)
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASHING_QUEUE_TIMEOUT') or 5)
+PASSWORD_HASHING_RESULT_TIMEOUT = float(os.environ.get('PASSWORD_HASHING_RESULT_TIMEOUT') or 30)
+
+# Consultas ao banco e comandos Redis por requisição no cabeçalho Server-Timing
+SERVER_TIMING_METRICS = os.environ.get('SERVER_TIMING_METRICS', 'false').lower() == 'true'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -171,7 +193,7 @@ AUTH_USER_MODEL = 'api.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -212,13 +234,21 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.tokens.CachedBlacklistTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
-    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "api.tokens.CachedBlacklistTokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+# Cache do usuário autenticado (api.authentication.CachedJWTAuthentication)
+
+AUTH_USER_CACHE = {
+    'TIMEOUT': 60 * 10,
+    'LRU_TIMEOUT': 5,
+    'LRU_MAXSIZE': 2048,
+}
+
 # Swagger
 
 SWAGGER_SETTINGS = {
@@ -240,6 +270,7 @@ CACHES = {
         "LOCATION": "redis://localhost:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "REDIS_CLIENT_CLASS": "api.metrics.CountingRedis",
         },
     },
     'chat_history': {
@@ -247,10 +278,39 @@ CACHES = {
         "LOCATION": "redis://localhost:6379/2",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "REDIS_CLIENT_CLASS": "api.metrics.CountingRedis",
         },
     },
 }
 
+# Chat History
+
+CHAT_HISTORY_REPLAY_MAX = 50
+CHAT_HISTORY_BUFFER_MAX = 5000
+
+# Bot Fallback
+
+# Textos de resposta de fallback do bot, separados por "|"; respostas iguais
+# (após normalização) viram pendências
+BOT_FALLBACK_RESPONSES = [
+    text for text in os.environ.get('BOT_FALLBACK_RESPONSES', '').split('|') if text.strip()
+]
+BOT_FALLBACK_CONFIDENCE = float(os.environ.get('BOT_FALLBACK_CONFIDENCE', 0.4))
+
+# Bot Training Bundle
+
+# Chamadas simultâneas ao conector na importação e exportação em lote
+BOT_BUNDLE_CONCURRENCY = int(os.environ.get('BOT_BUNDLE_CONCURRENCY', 8))
+# Páginas de intents buscadas ao mesmo tempo pelo snapshot completo; acima de
+# BOT_CONNECTOR_POOL_MAXSIZE as requisições esperam uma conexão livre
+BOT_INTENT_PREFETCH_CONCURRENCY = int(os.environ.get('BOT_INTENT_PREFETCH_CONCURRENCY', 50))
+# Similaridade (0 a 1, Jaccard dos trigramas) a partir da qual um exemplo novo
+# é apontado como parecido com o de outra intent
+BOT_EXAMPLE_SIMILARITY = float(os.environ.get('BOT_EXAMPLE_SIMILARITY', 0.8))
+# Idade máxima (segundos) do índice de treinamento de cada processo, para que
+# intents, respostas e stories criadas direto no Rasa apareçam
+BOT_TRAINING_INDEX_MAX_AGE = int(os.environ.get('BOT_TRAINING_INDEX_MAX_AGE') or 600)
+
 # Cors Headers
 
 CORS_ALLOW_ALL_ORIGINS = True
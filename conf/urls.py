@@ -40,6 +40,7 @@ media_files = static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 urlpatterns = [
     path('sa/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('api/', include('chat.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ] + static_files + media_files
@@ -1,123 +1,371 @@
+import asyncio
 import os
+import threading
+import time
+import weakref
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+
+from services.connector_cache import cached_listing, invalidates
+from services.connector_resilience import (
+    CONNECTOR_RETRIES,
+    RETRY_STATUSES,
+    AsyncSingleFlight,
+    CircuitBreaker,
+    SingleFlight,
+    UnavailableResponse,
+    backoff,
+)
 
 
 CONNECTOR_URL = os.environ.get('BOT_CONNECTOR_URL')
+CONNECTOR_CONNECT_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_CONNECT_TIMEOUT', 3.05))
+CONNECTOR_READ_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_READ_TIMEOUT', 30))
+CONNECTOR_POOL_MAXSIZE = int(os.environ.get('BOT_CONNECTOR_POOL_MAXSIZE', 20))
+# Limite de leitura por tipo de endpoint; o de conexão é sempre CONNECTOR_CONNECT_TIMEOUT
+LISTING_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_LISTING_TIMEOUT', 10))
+WRITE_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_WRITE_TIMEOUT', CONNECTOR_READ_TIMEOUT))
+MESSAGE_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_MESSAGE_TIMEOUT', 15))
 WEBHOOK = '/webhooks/training_model'
 
-class IntentManipulation:
+# Compartilhado pelos clientes síncrono e assíncronos: é o mesmo conector
+circuit_breaker = CircuitBreaker()
+
+CIRCUIT_OPEN_DETAIL = 'Conector do bot indisponível (circuito aberto)'
+
+
+def _coalescing_key(path, kwargs):
+    return path, tuple(sorted((kwargs.get('params') or {}).items()))
+
+
+class ConnectorClient:
+    """
+    Cliente síncrono do conector do bot.
+
+    Mantém uma única `requests.Session` com pool de conexões keep-alive,
+    evitando um novo handshake TCP/TLS a cada chamada ao `BOT_CONNECTOR_URL`.
+    GETs são repetidos em falhas transitórias e coalescidos entre threads;
+    toda chamada passa pelo circuit breaker (ver `services.connector_resilience`).
+    """
+
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None, pool_maxsize=None, breaker=None):
+        self.base_url = base_url or CONNECTOR_URL
+        self.timeout = (
+            connect_timeout or CONNECTOR_CONNECT_TIMEOUT,
+            read_timeout or CONNECTOR_READ_TIMEOUT,
+        )
+        self.breaker = breaker or circuit_breaker
+        self.inflight = SingleFlight()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize or CONNECTOR_POOL_MAXSIZE)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+
+    def request(self, method, path, timeout=None, **kwargs):
+        kwargs['timeout'] = (self.timeout[0], timeout) if timeout else self.timeout
+
+        if method != 'GET':
+            return self._attempt(method, path, **kwargs)
+
+        return self.inflight.do(_coalescing_key(path, kwargs), lambda: self._get_with_retries(path, **kwargs))
+
+    def _get_with_retries(self, path, **kwargs):
+        for attempt in range(CONNECTOR_RETRIES + 1):
+            res = self._attempt('GET', path, **kwargs)
+
+            if res.status_code not in RETRY_STATUSES or attempt == CONNECTOR_RETRIES or self.breaker.is_open:
+                return res
+
+            time.sleep(backoff(attempt))
+
+    def _attempt(self, method, path, **kwargs):
+        if not self.breaker.allow_request():
+            return UnavailableResponse(503, CIRCUIT_OPEN_DETAIL)
+
+        try:
+            res = self.session.request(method, f'{self.base_url}{path}', **kwargs)
+        except requests.Timeout:
+            self.breaker.record_failure()
+            return UnavailableResponse(504, 'Tempo esgotado aguardando o conector do bot')
+        except requests.ConnectionError:
+            self.breaker.record_failure()
+            return UnavailableResponse(503, 'Falha de conexão com o conector do bot')
+
+        self.breaker.record(res.status_code)
+
+        return res
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncConnectorClient:
+    """
+    Cliente assíncrono do conector do bot, para views `async` e consumers.
+
+    Um `httpx.AsyncClient` fica preso ao event loop em que foi criado, por isso
+    use `get_async_client()` em vez de instanciar diretamente. Novas tentativas,
+    coalescência e circuit breaker seguem o `ConnectorClient`.
+    """
+
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None, pool_maxsize=None, breaker=None):
+        self.base_url = base_url or CONNECTOR_URL
+        self.connect_timeout = connect_timeout or CONNECTOR_CONNECT_TIMEOUT
+        self.breaker = breaker or circuit_breaker
+        self.inflight = AsyncSingleFlight()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout or CONNECTOR_READ_TIMEOUT, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_maxsize or CONNECTOR_POOL_MAXSIZE,
+                max_keepalive_connections=pool_maxsize or CONNECTOR_POOL_MAXSIZE,
+            ),
+            headers={'Accept': 'application/json'},
+        )
+
+    async def request(self, method, path, timeout=None, **kwargs):
+        if timeout:
+            kwargs['timeout'] = httpx.Timeout(timeout, connect=self.connect_timeout)
+
+        if method != 'GET':
+            return await self._attempt(method, path, **kwargs)
+
+        return await self.inflight.do(_coalescing_key(path, kwargs), lambda: self._get_with_retries(path, **kwargs))
+
+    async def _get_with_retries(self, path, **kwargs):
+        for attempt in range(CONNECTOR_RETRIES + 1):
+            res = await self._attempt('GET', path, **kwargs)
+
+            if res.status_code not in RETRY_STATUSES or attempt == CONNECTOR_RETRIES or self.breaker.is_open:
+                return res
+
+            await asyncio.sleep(backoff(attempt))
+
+    async def _attempt(self, method, path, **kwargs):
+        if not self.breaker.allow_request():
+            return UnavailableResponse(503, CIRCUIT_OPEN_DETAIL)
+
+        try:
+            res = await self.client.request(method, f'{self.base_url}{path}', **kwargs)
+        except httpx.TimeoutException:
+            self.breaker.record_failure()
+            return UnavailableResponse(504, 'Tempo esgotado aguardando o conector do bot')
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            return UnavailableResponse(503, 'Falha de conexão com o conector do bot')
+
+        self.breaker.record(res.status_code)
+
+        return res
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request('PATCH', path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ConnectorClient()
+
+    return _client
+
+
+def reset_clients(base_url=None):
+    """
+    Descarta os clientes compartilhados, fecha o circuito e, se informado,
+    troca o `BOT_CONNECTOR_URL` (ex.: para apontar para o stub em benchmarks).
+    """
+    global CONNECTOR_URL, _client
+
+    with _client_lock:
+        if base_url is not None:
+            CONNECTOR_URL = base_url
+
+        if _client is not None:
+            _client.close()
+
+        _client = None
+        _async_clients.clear()
+
+    circuit_breaker.reset()
+
+
+async def _close_with_loop(client):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+
+    if client is None:
+        client = AsyncConnectorClient()
+        _async_clients[loop] = client
+
+        # O gerador fica suspenso no loop; `loop.shutdown_asyncgens()` (chamado
+        # por asyncio.run e async_to_sync ao encerrar o loop) o fecha, e com ele
+        # o cliente e suas conexões
+        client.closer = _close_with_loop(client)
+        asyncio.ensure_future(client.closer.__anext__())
+
+    return client
+
+
+class ConnectorResource:
+    is_async = False
+
+    def __init__(self, client=None):
+        self.client = client or get_client()
+        self.last_status_code = None
+
+    def _send(self, method, path, as_json=False, **kwargs):
+        res = self.client.request(method, path, **kwargs)
+        self.last_status_code = res.status_code
+
+        return res.json() if as_json else res
+
+
+class AsyncConnectorResource:
+    is_async = True
+
+    def __init__(self, client=None):
+        self.client = client or get_async_client()
+        self.last_status_code = None
+
+    async def _send(self, method, path, as_json=False, **kwargs):
+        res = await self.client.request(method, path, **kwargs)
+        self.last_status_code = res.status_code
+
+        return res.json() if as_json else res
+
+
+# As classes `*Requests` descrevem os endpoints do conector uma única vez; a
+# variante síncrona ou assíncrona vem do `*ConnectorResource` combinado a elas.
+
+class IntentRequests:
+    @cached_listing('intents')
     def get_all_intents(self, page):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/intent?page={page}', headers={
-            'Accept': 'application/json'
-        })
-    
-        return res.json()
-    
+        return self._send('GET', f'{WEBHOOK}/intent', params={'page': page}, as_json=True, timeout=LISTING_TIMEOUT)
+
+    @cached_listing('intents')
     def get_all_intents_names(self):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/intent/names', headers={
-            'Accept': 'application/json'
-        })
+        return self._send('GET', f'{WEBHOOK}/intent/names', as_json=True, timeout=LISTING_TIMEOUT)
 
-        return res.json()
-    
+    @cached_listing('intents.available')
     def get_all_available_intents_names(self):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/intent/names/available', headers={
-            'Accept': 'application/json'
-        })
+        return self._send('GET', f'{WEBHOOK}/intent/names/available', timeout=LISTING_TIMEOUT)
 
-        return res
-    
+    @cached_listing('intents')
     def get_intent_by_name(self, intent):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/intent/{intent}', headers={
-            'Accept': 'application/json',
-        })
+        return self._send('GET', f'{WEBHOOK}/intent/{intent}', as_json=True, timeout=LISTING_TIMEOUT)
 
-        return res.json()
-    
+    @invalidates('intents', 'intents.available')
     def create_intent(self, intent):
-        res = requests.post(f'{CONNECTOR_URL}{WEBHOOK}/intent', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=intent)
+        return self._send('POST', f'{WEBHOOK}/intent', json=intent, timeout=WRITE_TIMEOUT)
 
-        return res
-    
+    @invalidates('intents')
     def edit_intent_examples(self, intent, examples):
-        res = requests.patch(f'{CONNECTOR_URL}{WEBHOOK}/intent/{intent}/change/examples', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=examples)
-
-        return res
+        return self._send('PATCH', f'{WEBHOOK}/intent/{intent}/change/examples', json=examples, timeout=WRITE_TIMEOUT)
 
 
-class ResponseManipulation:
+class ResponseRequests:
+    @cached_listing('responses')
     def get_all_responses(self, page):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/response?page={page}', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        })
+        return self._send('GET', f'{WEBHOOK}/response', params={'page': page}, timeout=LISTING_TIMEOUT)
 
-        return res
-    
+    @cached_listing('responses')
     def get_all_responses_names(self):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/response/names', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        })
+        return self._send('GET', f'{WEBHOOK}/response/names', timeout=LISTING_TIMEOUT)
 
-        return res
-    
+    @invalidates('responses', 'intents.available')
     def create_response(self, response):
-        res = requests.post(f'{CONNECTOR_URL}{WEBHOOK}/response', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=response)
+        return self._send('POST', f'{WEBHOOK}/response', json=response, timeout=WRITE_TIMEOUT)
 
-        return res
-    
+    @invalidates('responses')
     def edit_response_examples(self, response_name, texts):
-        res = requests.patch(f'{CONNECTOR_URL}{WEBHOOK}/response/{response_name}/change/texts', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=texts)
-
-        return res
+        return self._send('PATCH', f'{WEBHOOK}/response/{response_name}/change/texts', json=texts, timeout=WRITE_TIMEOUT)
 
 
-class StoriesManipulation:
+class StoriesRequests:
+    @cached_listing('stories')
     def get_all_stories(self):
-        res = requests.get(f'{CONNECTOR_URL}{WEBHOOK}/stories', headers={
-            'Accept': 'application/json',
-        })
+        return self._send('GET', f'{WEBHOOK}/stories', timeout=LISTING_TIMEOUT)
 
-        return res
-    
+    @invalidates('stories')
     def create_story(self, story):
-        res = requests.post(f'{CONNECTOR_URL}{WEBHOOK}/stories', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=story)
+        return self._send('POST', f'{WEBHOOK}/stories', json=story, timeout=WRITE_TIMEOUT)
 
-        return res
-    
+    @invalidates('stories')
     def change_story_steps(self, story, step):
-        res = requests.patch(f'{CONNECTOR_URL}{WEBHOOK}/stories/{story}/change/steps', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-        }, json=step)
-
-        return res
+        return self._send('PATCH', f'{WEBHOOK}/stories/{story}/change/steps', json=step, timeout=WRITE_TIMEOUT)
 
 
-class RestInput:
+class RestInputRequests:
     REST_INPUT_WEBHOOK = '/webhooks/rest'
 
     def send_message_to_bot(self, message_info):
-        res = requests.post(f'{CONNECTOR_URL}{RestInput.REST_INPUT_WEBHOOK}/webhook', headers={
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',           
-        }, json=message_info)
+        return self._send('POST', f'{self.REST_INPUT_WEBHOOK}/webhook', json=message_info, timeout=MESSAGE_TIMEOUT)
 
-        return res
+
+class IntentManipulation(IntentRequests, ConnectorResource):
+    pass
+
+
+class ResponseManipulation(ResponseRequests, ConnectorResource):
+    pass
+
+
+class StoriesManipulation(StoriesRequests, ConnectorResource):
+    pass
+
+
+class RestInput(RestInputRequests, ConnectorResource):
+    pass
+
+
+class AsyncIntentManipulation(IntentRequests, AsyncConnectorResource):
+    pass
+
+
+class AsyncResponseManipulation(ResponseRequests, AsyncConnectorResource):
+    pass
+
+
+class AsyncStoriesManipulation(StoriesRequests, AsyncConnectorResource):
+    pass
+
+
+class AsyncRestInput(RestInputRequests, AsyncConnectorResource):
+    pass
@@ -0,0 +1,265 @@
+"""
+Stub do conector do bot para rodar, testar e medir a API sem o Rasa.
+
+Implementa os contratos usados por `services.bot_connector`:
+
+* `/webhooks/training_model/intent`, `/intent/names`, `/intent/names/available`,
+  `/intent/<nome>` e `/intent/<nome>/change/examples`;
+* `/webhooks/training_model/response`, `/response/names` e
+  `/response/<nome>/change/texts`;
+* `/webhooks/training_model/stories` e `/stories/<nome>/change/steps`;
+* `/webhooks/rest/webhook`.
+
+Os dados ficam em memória (criações e edições aparecem nas listagens) e são
+gerados a partir de uma semente, assim como a latência e os erros simulados,
+para que duas execuções com a mesma `StubConfig` se comportem igual.
+"""
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from services.bot_connector import WEBHOOK
+
+
+REST_WEBHOOK = '/webhooks/rest/webhook'
+
+
+class StubConfig:
+    """
+    Comportamento do stub. Latências em milissegundos; `error_rate` e
+    `fallback_rate` são frações (0 a 1) das chamadas.
+    """
+
+    def __init__(
+        self,
+        latency_ms=0,
+        latency_jitter_ms=0,
+        error_rate=0,
+        error_status=500,
+        fallback_rate=0,
+        fallback_text='Desculpe, não entendi.',
+        intents=20,
+        examples_per_intent=5,
+        page_size=10,
+        seed=0,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fallback_rate = fallback_rate
+        self.fallback_text = fallback_text
+        self.intents = intents
+        self.examples_per_intent = examples_per_intent
+        self.page_size = page_size
+        self.seed = seed
+
+
+class StubState:
+    """Intents, respostas e stories do stub, mais a contagem de chamadas por rota."""
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.hits = {}
+        self.intents = {
+            f'intent_{index}': '\n'.join(
+                f'- exemplo {example} da intent {index}' for example in range(config.examples_per_intent)
+            )
+            for index in range(config.intents)
+        }
+        self.responses = {f'utter_{name}': [{'text': f'Resposta de {name}'}] for name in self.intents}
+        self.stories = {
+            name: [{'intent': name}, {'action': f'utter_{name}'}] for name in self.intents
+        }
+
+    def hit(self, method, route):
+        with self.lock:
+            key = f'{method} {route}'
+            self.hits[key] = self.hits.get(key, 0) + 1
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay(self, config):
+        with self.lock:
+            jitter = self.random.uniform(-config.latency_jitter_ms, config.latency_jitter_ms)
+
+        return max(0.0, config.latency_ms + jitter) / 1000
+
+
+def _page(items, page, page_size):
+    total_pages = max(1, math.ceil(len(items) / page_size))
+    start = (page - 1) * page_size
+
+    return total_pages, items[start:start + page_size]
+
+
+class BotStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def config(self):
+        return self.server.config
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def send_json(self, status_code, body):
+        payload = json.dumps(body).encode()
+
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        body = self.read_json() if method in ('POST', 'PATCH') else None
+
+        if url.path == REST_WEBHOOK:
+            route = url.path
+        elif url.path.startswith(WEBHOOK):
+            route = url.path.removeprefix(WEBHOOK)
+        else:
+            self.send_json(404, {})
+            return
+
+        self.state.hit(method, route)
+        time.sleep(self.state.delay(self.config))
+
+        if self.state.roll(self.config.error_rate):
+            self.send_json(self.config.error_status, {'error': 'erro simulado pelo stub'})
+            return
+
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        status_code, payload = self.route(method, [unquote(part) for part in route.strip('/').split('/')], page, body)
+        self.send_json(status_code, payload)
+
+    def route(self, method, parts, page, body):
+        state = self.state
+
+        with state.lock:
+            match method, parts:
+                case 'POST', ['webhooks', 'rest', 'webhook']:
+                    return 200, self.rest_reply(body or {})
+
+                case 'GET', ['intent']:
+                    names = list(state.intents)
+                    total_pages, names = _page(names, page, self.config.page_size)
+                    nlu = [{'intent': name, 'examples': state.intents[name]} for name in names]
+
+                    return 200, {'data': {'total_pages': total_pages, 'nlu': {'nlu': nlu}}}
+                case 'GET', ['intent', 'names']:
+                    return 200, {'data': list(state.intents)}
+                case 'GET', ['intent', 'names', 'available']:
+                    return 200, {'data': [name for name in state.intents if f'utter_{name}' not in state.responses]}
+                case 'GET', ['intent', name]:
+                    if name not in state.intents:
+                        return 404, {}
+
+                    return 200, {'intent': name, 'examples': state.intents[name]}
+                case 'POST', ['intent']:
+                    state.intents[body['intent']] = body.get('examples', '')
+
+                    return 201, body
+                case 'PATCH', ['intent', name, 'change', 'examples']:
+                    if name not in state.intents:
+                        return 404, {}
+
+                    state.intents[name] = body.get('examples', '')
+
+                    return 200, {}
+
+                case 'GET', ['response']:
+                    names = list(state.responses)
+                    total_pages, names = _page(names, page, self.config.page_size)
+
+                    return 200, {'data': {'total_pages': total_pages, 'responses': {name: state.responses[name] for name in names}}}
+                case 'GET', ['response', 'names']:
+                    return 200, {'data': list(state.responses)}
+                case 'POST', ['response']:
+                    state.responses.update(body)
+
+                    return 201, {}
+                case 'PATCH', ['response', name, 'change', 'texts']:
+                    if name not in state.responses:
+                        return 404, {}
+
+                    state.responses[name] = body.get('texts', [])
+
+                    return 200, {}
+
+                case 'GET', ['stories']:
+                    return 200, {'data': [{'story': name, 'steps': steps} for name, steps in state.stories.items()]}
+                case 'POST', ['stories']:
+                    # A API documenta a story dentro de "data"
+                    story = body.get('data', body)
+                    state.stories[story['story']] = story.get('steps', [])
+
+                    return 201, {}
+                case 'PATCH', ['stories', name, 'change', 'steps']:
+                    if name not in state.stories:
+                        return 404, {}
+
+                    state.stories[name] = body.get('steps', [])
+
+                    return 200, {}
+
+        return 404, {}
+
+    def rest_reply(self, body):
+        # Chamado com state.lock já adquirido
+        if self.state.random.random() < self.config.fallback_rate:
+            text = self.config.fallback_text
+        else:
+            text = f'Você disse: {body.get("message")}'
+
+        return [{'recipient_id': body.get('sender'), 'text': text}]
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BotStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None):
+        super().__init__(address, BotStubHandler)
+        self.config = config or StubConfig()
+        self.state = StubState(self.config)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+
+def start_stub(host='127.0.0.1', port=0, config=None):
+    """Sobe o stub em uma thread e devolve o servidor (`server.url`, `server.state.hits`)."""
+    server = BotStubServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -0,0 +1,281 @@
+"""
+Cache de leitura (read-through) para as listagens do conector do bot.
+
+As respostas 200 ficam no cache padrão do Django por `CONNECTOR_CACHE_TTL`
+segundos como frescas e, depois disso, continuam sendo servidas (stale) enquanto
+uma única atualização roda em segundo plano. Cada chave pertence a um
+namespace versionado; os métodos de escrita decorados com `invalidates` trocam
+a versão do namespace, o que descarta de uma vez todas as páginas em cache.
+
+Cada listagem guarda também a última resposta 200 fora do namespace
+versionado. Ela só é usada quando o conector está fora do ar (5xx, timeout ou
+circuito aberto) e não há entrada na versão atual: dado possivelmente anterior
+à última escrita é melhor do que nenhum, e a resposta conta como 200 para quem
+chamou. As montagens de `aget_or_build` não usam esse fallback. Com o circuito
+aberto as entradas vencidas também deixam de disparar atualização.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+
+
+CONNECTOR_CACHE_TTL = int(os.environ.get('BOT_CONNECTOR_CACHE_TTL', 300))
+CONNECTOR_CACHE_STALE_TTL = int(os.environ.get('BOT_CONNECTOR_CACHE_STALE_TTL', 60 * 60 * 24))
+REFRESH_LOCK_TIMEOUT = 30
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='bot-connector-refresh')
+_refresh_tasks = set()
+
+# Ligado enquanto `aget_or_build` monta um valor: páginas vencidas são buscadas de novo
+_fresh_only = contextvars.ContextVar('connector_cache_fresh_only', default=False)
+
+
+class CachedResponse:
+    """Substituto mínimo de `requests.Response` para respostas vindas do cache."""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def _version_key(namespace):
+    return f'bot_connector:{namespace}:version'
+
+
+def _entry_key(namespace, version, name, args):
+    return f'bot_connector:{namespace}:{version}:{name}:{":".join(str(arg) for arg in args)}'
+
+
+def _last_key(namespace, name, args):
+    return f'bot_connector:{namespace}:last:{name}:{":".join(str(arg) for arg in args)}'
+
+
+def _pack(result):
+    if hasattr(result, 'status_code'):
+        return {'response': True, 'status_code': result.status_code, 'data': result.json(), 'fresh_until': time.time() + CONNECTOR_CACHE_TTL}
+
+    return {'response': False, 'data': result, 'fresh_until': time.time() + CONNECTOR_CACHE_TTL}
+
+
+def _unpack(entry):
+    if entry['response']:
+        return CachedResponse(entry['status_code'], entry['data'])
+
+    return entry['data']
+
+
+def _is_stale(entry):
+    return entry['fresh_until'] < time.time()
+
+
+def invalidate(*namespaces):
+    cache.set_many({_version_key(namespace): uuid.uuid4().hex for namespace in namespaces}, timeout=None)
+
+
+async def ainvalidate(*namespaces):
+    await cache.aset_many({_version_key(namespace): uuid.uuid4().hex for namespace in namespaces}, timeout=None)
+
+
+def _current_key(namespace, name, args):
+    version = cache.get_or_set(_version_key(namespace), uuid.uuid4().hex, timeout=None)
+
+    return _entry_key(namespace, version, name, args)
+
+
+async def _acurrent_key(namespace, name, args):
+    version = await cache.aget_or_set(_version_key(namespace), uuid.uuid4().hex, timeout=None)
+
+    return _entry_key(namespace, version, name, args)
+
+
+def _unavailable(resource):
+    return resource.last_status_code is not None and resource.last_status_code >= 500
+
+
+def _refresh(resource_class, client, func, key, last_key, args):
+    try:
+        resource = resource_class(client)
+        result = func(resource, *args)
+
+        if resource.last_status_code == 200:
+            entry = _pack(result)
+            cache.set_many({key: entry, last_key: entry}, timeout=CONNECTOR_CACHE_STALE_TTL)
+    finally:
+        cache.delete(f'{key}:refreshing')
+
+
+async def _arefresh(resource_class, client, func, key, last_key, args):
+    try:
+        resource = resource_class(client)
+        result = await func(resource, *args)
+
+        if resource.last_status_code == 200:
+            entry = _pack(result)
+            await cache.aset_many({key: entry, last_key: entry}, timeout=CONNECTOR_CACHE_STALE_TTL)
+    finally:
+        await cache.adelete(f'{key}:refreshing')
+
+
+def _read_through(resource, func, namespace, args):
+    key = _current_key(namespace, func.__name__, args)
+    last_key = _last_key(namespace, func.__name__, args)
+    entry = cache.get(key)
+
+    if entry is not None:
+        if (
+            _is_stale(entry)
+            and not resource.client.breaker.is_open
+            and cache.add(f'{key}:refreshing', 1, timeout=REFRESH_LOCK_TIMEOUT)
+        ):
+            _refresh_executor.submit(_refresh, type(resource), resource.client, func, key, last_key, args)
+
+        # Só respostas 200 vão para o cache
+        resource.last_status_code = 200
+
+        return _unpack(entry)
+
+    result = func(resource, *args)
+
+    if resource.last_status_code == 200:
+        entry = _pack(result)
+        cache.set_many({key: entry, last_key: entry}, timeout=CONNECTOR_CACHE_STALE_TTL)
+    elif _unavailable(resource) and (entry := cache.get(last_key)) is not None:
+        resource.last_status_code = 200
+
+        return _unpack(entry)
+
+    return result
+
+
+async def _aread_through(resource, func, namespace, args):
+    key = await _acurrent_key(namespace, func.__name__, args)
+    last_key = _last_key(namespace, func.__name__, args)
+    entry = await cache.aget(key)
+
+    if entry is not None and _fresh_only.get() and _is_stale(entry):
+        entry = None
+
+    if entry is not None:
+        if (
+            _is_stale(entry)
+            and not resource.client.breaker.is_open
+            and await cache.aadd(f'{key}:refreshing', 1, timeout=REFRESH_LOCK_TIMEOUT)
+        ):
+            task = asyncio.create_task(_arefresh(type(resource), resource.client, func, key, last_key, args))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+
+        resource.last_status_code = 200
+
+        return _unpack(entry)
+
+    result = await func(resource, *args)
+
+    if resource.last_status_code == 200:
+        entry = _pack(result)
+        await cache.aset_many({key: entry, last_key: entry}, timeout=CONNECTOR_CACHE_STALE_TTL)
+    elif _unavailable(resource) and not _fresh_only.get() and (entry := await cache.aget(last_key)) is not None:
+        # Montagens (`aget_or_build`) falham em vez de guardar dado antigo como fresco
+        resource.last_status_code = 200
+
+        return _unpack(entry)
+
+    return result
+
+
+async def _abuild(key, build):
+    token = _fresh_only.set(True)
+
+    try:
+        value = await build()
+    finally:
+        _fresh_only.reset(token)
+
+    if value is not None:
+        await cache.aset(key, {'data': value, 'fresh_until': time.time() + CONNECTOR_CACHE_TTL}, timeout=CONNECTOR_CACHE_STALE_TTL)
+
+    return value
+
+
+async def _arebuild(key, build):
+    try:
+        await _abuild(key, build)
+    finally:
+        await cache.adelete(f'{key}:refreshing')
+
+
+async def aget_or_build(namespace, name, build):
+    """
+    Cache de valores montados a partir de várias chamadas ao conector (ex.: o
+    conjunto de todas as páginas). Segue as listagens: fresco por
+    `CONNECTOR_CACHE_TTL`, depois servido vencido enquanto uma única remontagem
+    roda em segundo plano, e descartado na próxima escrita no namespace. A
+    montagem ignora páginas vencidas do cache, para que alterações feitas
+    direto no Rasa apareçam. `build` devolve `None` quando não deve ser guardado.
+    """
+    key = await _acurrent_key(namespace, name, ())
+    entry = await cache.aget(key)
+
+    if entry is None:
+        return await _abuild(key, build)
+
+    if _is_stale(entry) and await cache.aadd(f'{key}:refreshing', 1, timeout=REFRESH_LOCK_TIMEOUT):
+        task = asyncio.create_task(_arebuild(key, build))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+    return entry['data']
+
+
+def cached_listing(namespace):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            if self.is_async:
+                return _aread_through(self, func, namespace, args)
+
+            return _read_through(self, func, namespace, args)
+
+        return wrapper
+
+    return decorator
+
+
+def _succeeded(result):
+    return getattr(result, 'status_code', 500) < 400
+
+
+def invalidates(*namespaces):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            if self.is_async:
+                async def run():
+                    result = await func(self, *args)
+
+                    if _succeeded(result):
+                        await ainvalidate(*namespaces)
+
+                    return result
+
+                return run()
+
+            result = func(self, *args)
+
+            if _succeeded(result):
+                invalidate(*namespaces)
+
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,160 @@
+"""
+Proteções das chamadas ao conector do bot.
+
+* `CircuitBreaker`: depois de `BOT_CONNECTOR_CIRCUIT_FAILURES` falhas seguidas
+  (erro de rede, timeout ou status 5xx) as chamadas passam a falhar na hora,
+  sem tocar na rede, por `BOT_CONNECTOR_CIRCUIT_RESET` segundos;
+* `backoff`: espera com jitter entre as novas tentativas dos GETs;
+* `SingleFlight` / `AsyncSingleFlight`: GETs idênticos em andamento
+  compartilham uma única requisição ao conector.
+
+Falhas viram um `UnavailableResponse` (503 ou 504) em vez de exceção, para que
+as views e o cache de listagens tratem o conector fora do ar como qualquer
+outra resposta de erro.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+
+CONNECTOR_RETRIES = int(os.environ.get('BOT_CONNECTOR_RETRIES', 2))
+CONNECTOR_RETRY_BACKOFF = float(os.environ.get('BOT_CONNECTOR_RETRY_BACKOFF', 0.2))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('BOT_CONNECTOR_CIRCUIT_FAILURES', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('BOT_CONNECTOR_CIRCUIT_RESET', 30))
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class UnavailableResponse:
+    """Substituto de `requests.Response` para chamadas que não chegaram a ter resposta."""
+
+    def __init__(self, status_code, detail):
+        self.status_code = status_code
+        self.detail = detail
+
+    def json(self):
+        return {'detail': self.detail}
+
+
+def backoff(attempt):
+    # Full jitter: espera aleatória até o limite exponencial da tentativa
+    return random.uniform(0, CONNECTOR_RETRY_BACKOFF * 2 ** attempt)
+
+
+class CircuitBreaker:
+    """
+    Fechado, conta as falhas seguidas; aberto, recusa as chamadas até passar
+    `reset_timeout`; meio aberto, deixa passar uma única chamada de teste, que
+    fecha o circuito se der certo ou o reabre se falhar.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or CIRCUIT_RESET_TIMEOUT
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = 0.0
+            self.probing = False
+
+    @property
+    def is_open(self):
+        """Se as chamadas estão sendo recusadas sem chegar ao conector."""
+        with self.lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probing = False
+
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+            return False
+
+    def record(self, status_code):
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class SingleFlight:
+    """Chamadas concorrentes com a mesma chave esperam e recebem o resultado da primeira."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+
+            if leader:
+                future = self.calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+class AsyncSingleFlight:
+    """Versão de `SingleFlight` para um único event loop."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    async def do(self, key, func):
+        task = self.tasks.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.tasks[key] = task
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+
+        # shield: o cancelamento de quem espera não cancela a requisição dos demais
+        return await asyncio.shield(task)
@@ -8,9 +8,12 @@ EMAIL_SENDER_SMTP_SSL = os.getenv('EMAIL_SENDER_SMTP_SSL')
 EMAIL_SENDER_NAME = os.getenv('EMAIL_SENDER_NAME')
 EMAIL_SENDER_PASSWORD = os.getenv('EMAIL_SENDER_PASSWORD')
 EMAIL_SENDER_PORT = os.getenv('EMAIL_SENDER_PORT')
+# Desative para apontar para um servidor SMTP local sem TLS (ex.: aiosmtpd)
+EMAIL_SENDER_USE_SSL = os.getenv('EMAIL_SENDER_USE_SSL', 'true').lower() == 'true'
+EMAIL_SENDER_TIMEOUT = float(os.getenv('EMAIL_SENDER_TIMEOUT', 30))
 
 
-def send_email(subject, msg_to, content):
+def build_message(subject, msg_to, content):
     msg = MIMEMultipart()
     msg['subject'] = subject
     msg['From'] = EMAIL_SENDER_NAME
@@ -19,7 +22,58 @@ def send_email(subject, msg_to, content):
     html_part = MIMEText(content, 'html')
     msg.attach(html_part)
 
-    with smtplib.SMTP_SSL(EMAIL_SENDER_SMTP_SSL, EMAIL_SENDER_PORT) as smtp:
-       smtp.login(EMAIL_SENDER_NAME, EMAIL_SENDER_PASSWORD)
-       smtp.send_message(msg)
+    return msg
+
+
+class SMTPSession:
+    """
+    Conexão SMTP autenticada reaproveitada para vários envios.
+
+        with SMTPSession() as smtp:
+            for email in emails:
+                smtp.send(email.assunto, email.destinatario, email.conteudo)
+    """
+
+    def __init__(self, host=None, port=None, use_ssl=None):
+        self.host = host or EMAIL_SENDER_SMTP_SSL
+        self.port = port or EMAIL_SENDER_PORT
+        self.use_ssl = EMAIL_SENDER_USE_SSL if use_ssl is None else use_ssl
+        self.smtp = None
+
+    def open(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        self.smtp = smtp_class(self.host, self.port, timeout=EMAIL_SENDER_TIMEOUT)
+
+        if EMAIL_SENDER_PASSWORD:
+            try:
+                self.smtp.login(EMAIL_SENDER_NAME, EMAIL_SENDER_PASSWORD)
+            except smtplib.SMTPException:
+                self.close()
+                raise
+
+    def close(self):
+        if self.smtp is None:
+            return
 
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        finally:
+            self.smtp = None
+
+    def send(self, subject, msg_to, content):
+        self.smtp.send_message(build_message(subject, msg_to, content))
+
+    def __enter__(self):
+        self.open()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def send_email(subject, msg_to, content):
+    with SMTPSession() as smtp:
+        smtp.send(subject, msg_to, content)